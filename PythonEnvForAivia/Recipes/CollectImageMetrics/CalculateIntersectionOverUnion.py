@@ -3,6 +3,15 @@ import numpy as np
 from skimage.io import imread, imsave
 from skimage.exposure import rescale_intensity
 import ctypes
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Calculates Intersection over Union value considering intensity above or equal 1 as a positive mask
@@ -33,6 +42,7 @@ Pressing CTRL+C after the popup window appears allow you to copy the text in the
 # [INPUT Name:inputGTImagePath Type:string DisplayName:'Input Ground Truth Mask']
 # [INPUT Name:inputRTImagePath Type:string DisplayName:'Input Mask']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Intersection Mask']
+@profiled
 def run(params):
     RTimageLocation = params['inputRTImagePath']
     GTimageLocation = params['inputGTImagePath']
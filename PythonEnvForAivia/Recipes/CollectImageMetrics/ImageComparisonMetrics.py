@@ -4,6 +4,15 @@ from skimage.io import imread, imsave
 from skimage.metrics import mean_squared_error, structural_similarity
 from skimage.exposure import match_histograms, rescale_intensity
 import ctypes
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Calculates SSIM map as a result of the comparison of 2 channels and metrics values (in the log file). 
@@ -42,6 +51,7 @@ Second output: reference image transformed with histogram matching
 # [INPUT Name:inputRTImagePath Type:string DisplayName:'Input Image To Compare']
 # [OUTPUT Name:resultPathAdj Type:string DisplayName:'GT Hist match image']
 # [OUTPUT Name:resultPath Type:string DisplayName:'SSIM image']
+@profiled
 def run(params):
     RTimageLocation = params['inputRTImagePath']
     GTimageLocation = params['inputGTImagePath']
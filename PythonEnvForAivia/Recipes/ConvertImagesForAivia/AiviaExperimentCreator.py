@@ -24,8 +24,16 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 
-import wx
+wx = lazy_import('wx')
 from tifffile import TiffFile
 import numpy as np
 import math
@@ -80,6 +88,7 @@ Aiviaexperiment file with automated format picked from the number of image group
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     global DEFAULT_FOLDER, LAYOUTS, PREFIX, WELL_PREFIX, TAGS, WELL_TAGS, SUFFIX
 
@@ -1,7 +1,16 @@
 import os.path
-from numpy import empty_like
-from skimage.io import imread, imsave
-from skimage.exposure import adjust_gamma
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.point_ops import gamma_curve, map_planes
+# ---------------------------------------------------------------
 
 """
 See: https://scikit-image.org/docs/dev/api/skimage.exposure.html#skimage.exposure.adjust_gamma
@@ -31,6 +40,8 @@ Aivia channel
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [INPUT Name:gamma Type:double DisplayName:'Gamma' Default:0.75 Min:0.0 Max:2.0]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Gamma Adjusted']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -40,10 +51,9 @@ def run(params):
         print(f'Error: {image_location} does not exist')
         return;
         
-    image_data = imread(image_location)
-    output_data = empty_like(image_data)
-    output_data = adjust_gamma(image_data, gamma, 1)
-    imsave(result_location, output_data)
+    # adjust_gamma as a lookup table for 8 and 16-bit images, planes read and written one at a time
+    image_data = open_image(image_location)
+    write_frames(result_location, map_planes(gamma_curve(gamma, 1), image_data), image_data.shape, image_data.dtype)
 
 
 if __name__ == '__main__':
@@ -54,3 +64,6 @@ if __name__ == '__main__':
     
     run(params)
 
+# CHANGELOG
+#   v1_10: - Lookup table of adjust_gamma for 8 and 16-bit images, applied plane by plane without float copy
+
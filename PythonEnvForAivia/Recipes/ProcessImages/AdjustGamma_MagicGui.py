@@ -23,8 +23,15 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
-from skimage.io import imread, imsave
-from skimage.exposure import adjust_gamma
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.point_ops import gamma_curve, map_planes
+# ---------------------------------------------------------------
+
 from magicgui import magicgui
 
 """
@@ -57,6 +64,7 @@ Aivia channel
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Gamma Adjusted']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -65,15 +73,16 @@ def run(params):
         print(f'Error: {image_location} does not exist')
         return
         
-    image_data = imread(image_location)
+    image_data = open_image(image_location)
     
     # collect gamma with GUI
     get_gamma.show(run=True)
     # get_gamma.called.connect(lambda x: get_gamma.close()) # Generate a warning, callback defined as a function below
 
     gamma_value = get_gamma.gamma.value
-    output_data = adjust_gamma(image_data, gamma_value, 1)
-    imsave(result_location, output_data)
+    # adjust_gamma as a lookup table for 8 and 16-bit images, planes read and written one at a time
+    write_frames(result_location, map_planes(gamma_curve(gamma_value, 1), image_data), image_data.shape,
+                 image_data.dtype)
 
 
 # decorate your function with the @magicgui decorator
@@ -96,3 +105,4 @@ if __name__ == '__main__':
     run(params)
 
 # v1.01: - New virtual env code for auto-activation
+# v1.10: - Lookup table of adjust_gamma for 8 and 16-bit images, applied plane by plane without float copy
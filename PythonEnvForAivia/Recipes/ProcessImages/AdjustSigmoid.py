@@ -1,8 +1,18 @@
 import os.path
 import numpy as np
-from skimage.io import imread, imsave
-from skimage.exposure import adjust_sigmoid
 from skimage.util import img_as_uint, img_as_ubyte
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.point_ops import sigmoid_curve, map_planes
+# ---------------------------------------------------------------
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -44,6 +54,8 @@ Aivia channel
 # [INPUT Name:cutoff Type:double DisplayName:'Cutoff [0-1]' Default:0.5 Min:0.0 Max:1.0]
 # [INPUT Name:gain Type:double DisplayName:'Gain' Default:10.0 Min:0.0 Max:20.0]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Sigmoid']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -54,14 +66,19 @@ def run(params):
         print(f'Error: {image_location} does not exist')
         return;
         
-    image_data = imread(image_location)
-    output_data = np.empty_like(image_data)
-    sigmoid_image = adjust_sigmoid(image_data, cutoff=cutoff, gain=gain, inv=False)
+    image_data = open_image(image_location)
+    sigmoid = sigmoid_curve(cutoff, gain, inv=False)
     if image_data.dtype == np.uint16:
-        output_data = img_as_uint(sigmoid_image)
+        out_dtype, convert = np.uint16, img_as_uint
     else:
-        output_data = img_as_ubyte(sigmoid_image)
-    imsave(result_location, output_data)
+        out_dtype, convert = np.uint8, img_as_ubyte
+
+    # adjust_sigmoid keeps the input type: for 8 and 16-bit images, the conversion is the identity
+    # and both are one lookup table, applied plane by plane
+    def sigmoid_plane(plane):
+        return convert(sigmoid(plane))
+
+    write_frames(result_location, map_planes(sigmoid_plane, image_data), image_data.shape, out_dtype)
 
 
 if __name__ == '__main__':
@@ -73,3 +90,6 @@ if __name__ == '__main__':
     
     run(params)
 
+# CHANGELOG
+#   v1_10: - Lookup table of adjust_sigmoid for 8 and 16-bit images, applied plane by plane without float copy
+
@@ -23,7 +23,15 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
-from magicgui import magicgui
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
+magicgui = lazy_import('magicgui', 'magicgui')
 import numpy as np
 from skimage.io import imread, imsave
 from skimage import draw
@@ -55,6 +63,7 @@ Channel in Aivia
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Shape mask']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -4,6 +4,14 @@ import sys
 import numpy as np
 from skimage.io import imread, imsave
 from skimage import draw
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Create Sholl circles on 2D or 2D+t images.
@@ -38,6 +46,7 @@ selected_shape = 0              # 0 = draw_circle or 1 = draw_circle_aa (anti-al
 # [INPUT Name:centerY Type:int DisplayName:'Y coordinate of soma center' Default:0 Min:0 Max:65535]
 # [INPUT Name:centerX Type:int DisplayName:'X coordinate of soma center' Default:0 Min:0 Max:65535]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Sholl Circles']
+@profiled
 def run(params):
     global selected_shape
     image_location = params['inputImagePath']
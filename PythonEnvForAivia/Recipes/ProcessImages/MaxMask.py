@@ -1,6 +1,16 @@
 import os.path
 import numpy as np
 from skimage.io import imread, imsave
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Given an input image (I) and a mask image (M), returns (O) the input image only where
@@ -34,6 +44,8 @@ Aivia channel
 # [INPUT Name:inputMaskImagePath Type:string DisplayName:'Input Mask']
 # [INPUT Name:threshold Type:int DisplayName:'Masking Threshold' Default:128 Min:0 Max:65535]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Masked Image']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     mask_location = params['inputMaskImagePath']
@@ -1,8 +1,18 @@
 import os.path
-import numpy as np
-from skimage.io import imread, imsave
+from skimage.io import imsave
 import ctypes
 import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+from Recipes.utils.sliding_window import sliding_z_filter
+# ---------------------------------------------------------------
 
 """
 Performs a slicewise maximum intensity projection through Z with a given
@@ -14,6 +24,9 @@ slices before and after that slice.
 
 Works only in 3D.
 
+The running maximum is computed with the van Herk / Gil-Werman algorithm (see
+Recipes/utils/sliding_window.py): its cost does not depend on the width.
+
 Requirements
 ------------
 numpy (comes with Aivia installer)
@@ -27,6 +40,12 @@ Input Image : Aivia channel
 Width : int
     Number of slices around the current slice to consider for the MIP.
 
+step : int, optional (not shown in Aivia)
+    Only every n-th slice is written (1 = all slices, the default). With a step equal
+    to the width, the output is a stack of non-overlapping thick slab projections. The
+    output then has fewer slices than the input, which Aivia cannot add as a channel:
+    give it with Recipes/utils/batch_run.py (--param step=n) only.
+
 Returns
 -------
 Aivia channel
@@ -37,40 +56,34 @@ Aivia channel
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [INPUT Name:width Type:int DisplayName:'Width' Default:3 Min:2 Max:1000]
 # [OUTPUT Name:resultPath Type:string DisplayName:'MaximumZ']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
     width = int(params['width'])
+    step = int(params.get('step', 1))
     tCount = int(params['TCount'])
     if not os.path.exists(image_location):
         print(f"Error: {image_location} does not exist")
         return;
         
-    image_data = imread(image_location)
+    image_data = open_image(image_location)
     dims = image_data.shape
-    output_data = np.empty_like(image_data)
     
     if len(dims) == 2 or (len(dims) == 3 and tCount > 1):
         error_mes = "Error: Maximum intensity projection cannot be applied to 2D images."
         ctypes.windll.user32.MessageBoxW(0, error_mes, 'Error', 0)
         sys.exit(error_mes)
     
-    if tCount == 1:
-        max_slice = int(dims[0])
-        width_eff = min(int(width/2), max_slice)
-        for i in np.arange(0, max_slice):
-            output_data[i, :, :] = np.amax(
-                image_data[i-min(width_eff,i):i+min(width_eff,max_slice-i), :, :], axis=0
-            )
-    else:
-        max_slice = int(dims[1])
+    with stage('compute'):
+        # Window of slice i: slices i - width // 2 to i + width // 2 - 1, clipped to the stack
+        max_slice = int(dims[1] if tCount > 1 else dims[0])
         width_eff = min(int(width/2), max_slice)
-        for i in np.arange(0, max_slice):
-            output_data[:, i, :, :] = np.amax(
-                image_data[:, i-min(width_eff,i):i+min(width_eff,max_slice-i), :, :], axis=1
-            )
+        output_data = sliding_z_filter(image_data, width_eff, max(width_eff - 1, 0), 'max', tCount, step)
             
-    imsave(result_location, output_data)
+    with stage('write'):
+        imsave(result_location, output_data)
 
 
 if __name__ == '__main__':
@@ -1,8 +1,21 @@
 import os.path
 import numpy as np
-from skimage.io import imread, imsave
-from skimage.filters import meijering
-from skimage.util import img_as_uint, img_as_ubyte
+from tifffile import imsave
+import sys
+from functools import partial
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image
+from Recipes.utils.frames import run_per_frame
+from Recipes.utils.hessian import meijering
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+from Recipes.utils.dtype_policy import as_compute_float, to_dtype
+# ---------------------------------------------------------------
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -21,10 +34,16 @@ For example, if the user specifies min and max sigmas of 0.1 and 0.6, respective
 the transform is performed for Gaussian sigma values of 0.1, 0.2, 0.3, 0.4, 0.5.
 The maximum values from all of the transforms is output at every voxel.
 
+The filter is the one of skimage.filters.meijering, computed by Recipes/utils/hessian.py
+(shared Gaussian derivative passes, float32 eigenvalues) with reflected borders. Time
+series are processed frame by frame (each 2D or 3D frame normalized on its own), in
+parallel.
+
 Requirements
 ------------
 numpy (comes with Aivia installer)
-scikit-image (comes with Aivia installer)
+scipy (installed with scikit-image)
+tifffile (comes with Aivia installer)
 
 Parameters
 ----------
@@ -47,6 +66,8 @@ Aivia channel
 # [INPUT Name:sigma_max Type:double DisplayName:'Max Sigma' Default:1.5 Min:0.0 Max:25.0]
 # [INPUT Name:sigma_min Type:double DisplayName:'Min Sigma' Default:0.5 Min:0.0 Max:25.0]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Neuriteness']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -59,40 +80,36 @@ def run(params):
         print(f'Error: {image_location} does not exist')
         return;
         
-    image_data = imread(image_location)
-    dims = image_data.shape
-    meijering_image = np.empty_like(image_data)
-    output_data = np.empty_like(image_data)
+    with stage('read'):
+        image_data = open_image(image_location)
     
     sigmas = np.arange(sigma_min, sigma_max, round((sigma_max-sigma_min)/5, 1))
     
-    if tCount > 1:
-        print('Time series are currently not supported.')
-        return
-            
-    meijering_image = meijering(image_data, sigmas=sigmas, black_ridges=False)
-    
-    # Cropping is performed in 2D to get rid of bright pixels at edges of the image.
-    
-    if zCount > 1:
-        crop_size = max(int(max(list(dims[1:]))/100), 4)
-        meijering_image[:, 0:crop_size, 0:crop_size] = 0
-        meijering_image[: ,0:crop_size, -crop_size:] = 0
-        meijering_image[: ,-crop_size:, 0:crop_size] = 0
-        meijering_image[: ,-crop_size:, -crop_size:] = 0
+    # 3D+T
+    if tCount > 1 and zCount > 1:
+        print(f"Applying to 3D+T case with dims: {image_data.shape}")
+        axes = 'TZYX'
+    # 2D+T or 3D
+    elif tCount > 1 or zCount > 1:
+        print(f"Applying to 2D+T or 3D case with dims: {image_data.shape}")
+        axes = 'TYX' if tCount > 1 else 'ZYX'
+    # 2D
     else:
-        crop_size = max(int(max(list(dims))/100), 4)
-        meijering_image[0:crop_size, 0:crop_size] = 0
-        meijering_image[0:crop_size, -crop_size:] = 0
-        meijering_image[-crop_size:, 0:crop_size] = 0
-        meijering_image[-crop_size:, -crop_size:] = 0
-    
-    if image_data.dtype == np.uint16:
-        output_data = img_as_uint(meijering_image)
-    else:
-        output_data = img_as_ubyte(meijering_image)
+        print(f"Applying to 2D case with dims: {image_data.shape}")
+        axes = 'YX'
+            
+    with stage('compute'):
+        output_data = np.empty(image_data.shape, dtype=np.uint16 if image_data.dtype == np.uint16 else np.uint8)
+        kernel = partial(neuriteness, sigmas=sigmas, dtype=output_data.dtype)
+        run_per_frame(kernel, image_data, output_data, tCount, zCount, frame_ndim=3 if zCount > 1 else 2)
+
+    with stage('write'):
+        imsave(result_location, output_data, metadata={'axes': axes})
+
 
-    imsave(result_location, output_data)
+def neuriteness(frame, sigmas, dtype):
+    # Integer values are given as float32 without rescaling, as to skimage before
+    return to_dtype(meijering(as_compute_float(frame, normalize=False), sigmas, black_ridges=False), dtype)
 
 
 if __name__ == '__main__':
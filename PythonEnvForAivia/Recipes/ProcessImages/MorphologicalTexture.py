@@ -1,9 +1,24 @@
 import os.path
+import sys
+from functools import partial
+from pathlib import Path
+import shlex, subprocess
 import numpy as np
-from skimage.io import imread, imsave
-from skimage.morphology import closing, opening
-from skimage.morphology import disk, ball
+from skimage.io import imsave
 from skimage.util import img_as_uint, img_as_ubyte
+from tifffile import imwrite
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image
+from Recipes.utils.tiling import run_tiled
+from Recipes.utils.frames import run_per_frame
+from Recipes.utils.morphology import dilation, erosion, dilations, erosions
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
 
 """
 See: https://scikit-image.org/docs/dev/api/skimage.filters.html#skimage.filters.meijering
@@ -23,10 +38,14 @@ voxel, resulting in a darker image.
 The opening result is then subtracted from the closing result to create
 the final output.
 
+Disks and balls are decomposed into lines (see Recipes/utils/morphology.py): the
+cost grows linearly with the size in 2D, as its square in 3D.
+
 Requirements
 ------------
 numpy (comes with Aivia installer)
 scikit-image (comes with Aivia installer)
+tifffile (comes with Aivia installer)
 
 Parameters
 ----------
@@ -36,54 +55,113 @@ Input Image : Aivia channel
 Size : double
     Size of the disk or ball morphological kernel in pixels.
 
+Number of Sizes : int
+    If more than 1, the texture is also computed for multiples of the size (size,
+    2 x size, ...), sharing the dilations and erosions between sizes.
+
 Returns
 -------
 Aivia channel
     Result of the transform
+
+New image (Number of Sizes > 1 only):
+    Opens Aivia (again) to display the textures for all sizes as a new image, one
+    channel per size.
 """
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [INPUT Name:size Type:int DisplayName:'Size (px)' Default:3 Min:0 Max:100]
+# [INPUT Name:sizeCount Type:int DisplayName:'Number of Sizes' Default:1 Min:1 Max:20]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Texture']
+@profiled
+@cached_run(bypass=lambda params: int(params.get('sizeCount', 1)) > 1)
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
     size = int(params['size'])
+    sizes = [size * k for k in range(1, int(params.get('sizeCount', 1)) + 1)]
     tCount = int(params['TCount'])
     zCount = int(params['ZCount'])
     if not os.path.exists(image_location):
         print(f'Error: {image_location} does not exist')
         return;
         
-    image_data = imread(image_location)
-    texture_image = np.empty_like(image_data)
-    output_data = np.empty_like(image_data)
-    
+    image_data = open_image(image_location)
     print(f"z {zCount} t {tCount} shape {image_data.shape}")
     
-    if zCount == 1:
-        structure = disk(size)
-    else:
-        structure = ball(size)
-    if tCount > 1 and zCount > 1:
-        for t in range(0, image_data.shape[0]):
-            texture_image[t,:,:,:] = closing(
-                image_data[t,:,:,:], footprint=structure) - opening(image_data[t,:,:,:], footprint=structure
-            )
-    elif tCount > 1 and zCount == 1:
-        for t in range(0, image_data.shape[0]):
-            texture_image[t,:,:] = closing(
-                image_data[t,:,:], footprint=structure) - opening(image_data[t,:,:], footprint=structure
-            )
-    else:
-        texture_image = closing(image_data, footprint=structure) - opening(image_data, footprint=structure)
+    if len(sizes) > 1:
+        run_multi_size(params, image_data, sizes, tCount, zCount)
+        return
     
-    if image_data.dtype == np.uint16:
-        output_data = img_as_uint(texture_image)
-    else:
-        output_data = img_as_ubyte(texture_image)
+    with stage('compute'):
+        texture_image = np.empty(image_data.shape, dtype=image_data.dtype)
+
+        # Closing and opening each reach 2 * size pixels around a voxel. Temporaries are the
+        # dilated, closed and opened tiles and the lines of the decomposition, in the input
+        # bit depth.
+        run_tiled(partial(texture, size=size), image_data, texture_image, tCount, zCount,
+                  halo=2 * size, frame_ndim=3, bytes_per_voxel=6 * image_data.dtype.itemsize)
     
-    imsave(result_location, output_data)
+    with stage('convert'):
+        if image_data.dtype == np.uint16:
+            output_data = img_as_uint(texture_image)
+        else:
+            output_data = img_as_ubyte(texture_image)
+    
+    with stage('write'):
+        imsave(result_location, output_data)
+
+
+def run_multi_size(params, image_data, sizes, tCount, zCount):
+    # Not cached: the textures of all sizes are written next to the result and opened in Aivia
+    result_location = params['resultPath']
+    with stage('compute'):
+        # Frames are not tiled: the halo would be twice the largest size
+        lead_ndim = image_data.ndim - (3 if zCount > 1 else 2)
+        textures_image = np.empty(image_data.shape[:lead_ndim] + (len(sizes),) + image_data.shape[lead_ndim:],
+                                  dtype=image_data.dtype)
+        run_per_frame(partial(textures, sizes=sizes), image_data, textures_image, tCount, zCount,
+                      frame_ndim=3)
+
+    if 'fileOutputPath_2' in params.keys():     # test mode
+        temp_location = params['fileOutputPath_2']
+    else:
+        temp_location = result_location.replace('.tif', 'tmp.tif')
+
+    with stage('write'):
+        # Texture for the first size in the result channel, all sizes as channels of a new image
+        imsave(result_location, textures_image[(slice(None),) * lead_ndim + (0,)])
+        axes = ('T' if tCount > 1 else '') + ('ZC' if zCount > 1 else 'C') + 'YX'
+        if zCount > 1:
+            # ImageJ order: channels after Z
+            textures_image = np.moveaxis(textures_image, lead_ndim, lead_ndim + 1)
+        imwrite(temp_location, textures_image, imagej=True, metadata={'axes': axes})
+
+    aivia_path = params.get('CallingExecutable', 'None')
+    # Added for handling testing without opening aivia
+    if aivia_path == "None":
+        return
+    if not os.path.exists(aivia_path):
+        print(f"Error: {aivia_path} does not exist")
+        return
+    # Run external program
+    cmdLine = 'start \"\" \"' + aivia_path + '\" \"' + temp_location + '\"'
+
+    args = shlex.split(cmdLine)
+    subprocess.run(args, shell=True)
+
+
+def texture(image, size):
+    closed = erosion(dilation(image, size), size)
+    opened = dilation(erosion(image, size), size)
+    return closed - opened
+
+
+def textures(image, sizes):
+    # Dilations and erosions of the input image are computed for all sizes at once
+    closed = [erosion(dilated, size) for dilated, size in zip(dilations(image, sizes), sizes)]
+    opened = [dilation(eroded, size) for eroded, size in zip(erosions(image, sizes), sizes)]
+    return np.stack([c - o for c, o in zip(closed, opened)])
 
 
 if __name__ == '__main__':
@@ -1,8 +1,24 @@
 import os.path
+import sys
+from functools import partial
+from pathlib import Path
+import shlex, subprocess
 import numpy as np
-from tifffile import imread, imsave
+from tifffile import imsave, imwrite
 from skimage.feature import shape_index
-from skimage.util import img_as_ubyte, img_as_uint
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image
+from Recipes.utils.tiling import run_tiled
+from Recipes.utils.frames import run_per_frame
+from Recipes.utils import hessian
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+from Recipes.utils.dtype_policy import as_compute_float, to_dtype
+# ---------------------------------------------------------------
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -24,6 +40,11 @@ training a pixel classifier.
 
 For more information, see Koenderink & van Doorn as linked in the skimage documentation.
 
+By default the shape index is computed plane by plane with skimage. The 3D Hessian
+option computes it from the Hessian of the whole 3D frame instead (Z context included,
+see Recipes/utils/hessian.py), and several scales can be combined, the Gaussian
+smoothing of each scale starting from the previous one.
+
 Requirements
 ------------
 numpy (comes with Aivia installer)
@@ -38,41 +59,56 @@ Input Image : Aivia channel
 Gaussian Sigma : double
     Gaussian smoothing size to use to determine local shape.
 
+3D Hessian : int
+    0 = plane by plane, 1 = 3D Hessian (3D and 3D+T images only).
+
+Number of Scales : int
+    Number of sigmas (Gaussian Sigma x sqrt(2)^k) to compute the shape index at.
+
+Scales : int
+    With several scales, 0 = shape index of the scale of highest curvedness at each
+    pixel, 1 = all scales (the result channel receives the first scale).
+
 Returns
 -------
 Aivia channel
     Result of the transform normalized to 8bit or 16bit space according to the input.
+
+New image (several scales stacked only):
+    Opens Aivia (again) to display the shape index at all scales as a new image, one
+    channel per scale.
 """
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [INPUT Name:sigma Type:double DisplayName:'Gaussian Sigma' Default:3.0 Min:0.0 Max:50.0]
+# [INPUT Name:hessian3D Type:int DisplayName:'3D Hessian (0=No, 1=Yes)' Default:0 Min:0 Max:1]
+# [INPUT Name:scaleCount Type:int DisplayName:'Number of Scales' Default:1 Min:1 Max:10]
+# [INPUT Name:scaleCombination Type:int DisplayName:'Scales (0=Max curvedness, 1=Stack)' Default:0 Min:0 Max:1]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Shape Index']
+@profiled
+@cached_run(bypass=lambda params: stacks_scales(params))
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
     sigma = float(params['sigma'])
     tCount = int(params['TCount'])
     zCount = int(params['ZCount'])
+    use_3d = int(params.get('hessian3D', 0)) == 1 and zCount > 1
+    sigmas = hessian.scale_sigmas(sigma, int(params.get('scaleCount', 1)))
+    stack_scales = stacks_scales(params)
     if not os.path.exists(image_location):
         print(f"Error: {image_location} does not exist")
         return
         
-    image_data = imread(image_location)
-    dims = image_data.shape
-    shape_image = np.empty(image_data.shape, dtype=np.float32)
-    
+    image_data = open_image(image_location)
+
     # 3D+T
     if tCount > 1 and zCount > 1:
         print(f"Applying to 3D+T case with dims: {image_data.shape}")
-        for t in range(0, dims[0]):
-            for z in range(0, dims[1]):
-                shape_image[t,z,:,:] = shape_index(image_data[t,z,:,:], sigma=sigma, mode='reflect').astype(np.float32)
         axes = 'YXZT'
     # 2D+T or 3D
     elif (tCount > 1 and zCount == 1) or (tCount == 1 and zCount > 1):
         print(f"Applying to 2D+T or 3D case with dims: {image_data.shape}")
-        for d in range(0, dims[0]):
-            shape_image[d,:,:] = shape_index(image_data[d,:,:], sigma=sigma, mode='reflect').astype(np.float32)
         if tCount > 1:
             axes = 'YXT'
         else:
@@ -80,18 +116,94 @@ def run(params):
     # 2D
     else:
         print(f"Applying to 2D case with dims: {image_data.shape}")
-        shape_image = shape_index(image_data, sigma=sigma, mode='reflect')
         axes = 'YX'
+
+    frame_ndim = 3 if use_3d else 2
+    output_dtype = np.uint16 if image_data.dtype == np.uint16 else np.uint8
+    if stack_scales:
+        run_scale_stack(params, image_data, sigmas, tCount, zCount, frame_ndim, axes, output_dtype)
+        return
+
+    if use_3d or len(sigmas) > 1:
+        # Cascaded Gaussian smoothing and the two finite difference stencils; the smoothed
+        # image, Hessian elements and eigenvalues are float32 temporaries.
+        kernel = partial(hessian.shape_index, sigmas=sigmas)
+        halo = hessian.smoothing_reach(sigmas) + 2
+        bytes_per_voxel = 48
+    else:
+        # Shape index is computed plane by plane. It reaches the Gaussian truncation radius
+        # plus the two finite difference stencils around a pixel, and the Gaussian, its
+        # gradients, the Hessian and its eigenvalues are float temporaries (float64 for
+        # 16-bit images, see plane_shape_index).
+        kernel = partial(plane_shape_index, sigma=sigma)
+        halo = int(4 * sigma + 0.5) + 2
+        bytes_per_voxel = 64 if image_data.dtype == np.uint16 else 32
+
+    with stage('compute'):
+        shape_image = np.empty(image_data.shape, dtype=np.float32)
+        run_tiled(kernel, image_data, shape_image, tCount, zCount, halo=halo, frame_ndim=frame_ndim,
+                  bytes_per_voxel=bytes_per_voxel)
     
-    # NaNs are usually returned - convert these to possible pixel values
-    shape_image = np.nan_to_num(shape_image)
-    
-    if image_data.dtype == np.uint16:
-        shape_image = img_as_uint(shape_image)
+    with stage('convert'):
+        # NaNs are usually returned - convert these to possible pixel values
+        np.nan_to_num(shape_image, copy=False)
+        shape_image = to_dtype(shape_image, output_dtype)
+
+    with stage('write'):
+        imsave(result_location, shape_image, metadata={'axes': axes})
+
+
+def stacks_scales(params):
+    # The stack of all scales is written next to the result and opened in Aivia: not cached
+    return int(params.get('scaleCount', 1)) > 1 and int(params.get('scaleCombination', 0)) == 1
+
+
+def run_scale_stack(params, image_data, sigmas, tCount, zCount, frame_ndim, axes, output_dtype):
+    result_location = params['resultPath']
+    with stage('compute'):
+        # Frames are not tiled: all scales are kept for the whole frame
+        lead_ndim = image_data.ndim - frame_ndim
+        stack = np.empty(image_data.shape[:lead_ndim] + (len(sigmas),) + image_data.shape[lead_ndim:],
+                         dtype=np.float32)
+        run_per_frame(partial(hessian.shape_index, sigmas=sigmas, stack=True), image_data, stack,
+                      tCount, zCount, frame_ndim=frame_ndim)
+
+    with stage('convert'):
+        np.nan_to_num(stack, copy=False)
+        stack = to_dtype(stack, output_dtype)
+
+    if 'fileOutputPath_2' in params.keys():     # test mode
+        temp_location = params['fileOutputPath_2']
     else:
-        shape_image = img_as_ubyte(shape_image)
+        temp_location = result_location.replace('.tif', 'tmp.tif')
+
+    with stage('write'):
+        # First scale in the result channel, all scales as channels of a new image
+        imsave(result_location, np.take(stack, 0, axis=lead_ndim), metadata={'axes': axes})
+        # ImageJ order: channels after T and Z
+        stack = np.moveaxis(stack, lead_ndim, -3)
+        imagej_axes = ('T' if tCount > 1 else '') + ('Z' if zCount > 1 else '') + 'CYX'
+        imwrite(temp_location, stack, imagej=True, metadata={'axes': imagej_axes})
+
+    aivia_path = params.get('CallingExecutable', 'None')
+    # Added for handling testing without opening aivia
+    if aivia_path == "None":
+        return
+    if not os.path.exists(aivia_path):
+        print(f"Error: {aivia_path} does not exist")
+        return
+    # Run external program
+    cmdLine = 'start \"\" \"' + aivia_path + '\" \"' + temp_location + '\"'
+
+    args = shlex.split(cmdLine)
+    subprocess.run(args, shell=True)
 
-    imsave(result_location, shape_image, metadata={'axes': axes})
+def plane_shape_index(image, sigma):
+    # 16-bit images are computed in float64 as skimage does: in their dim, flat regions the
+    # eigenvalue ratio is so ill-conditioned that float32 changes results by several grey levels
+    if image.dtype == np.uint16:
+        return shape_index(image, sigma=sigma, mode='reflect')
+    return shape_index(as_compute_float(image), sigma=sigma, mode='reflect')
 
 
 if __name__ == '__main__':
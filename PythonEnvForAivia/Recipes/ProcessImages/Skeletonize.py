@@ -1,8 +1,20 @@
 import os.path
+import sys
+from functools import partial
+from pathlib import Path
 import numpy as np
 from skimage.io import imread, imsave
 from skimage.morphology import skeletonize, skeletonize_3d
-from skimage.morphology import closing, disk, ball
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.frames import run_per_frame
+from Recipes.utils.morphology import closing
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -45,6 +57,8 @@ Aivia channel
 # [INPUT Name:threshold Type:int DisplayName:'Threshold' Default:100 Min:0 Max:65535]
 # [INPUT Name:radius Type:int DisplayName:'Closing Radius' Default:0 Min:0 Max:100]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Skeleton']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -56,47 +70,33 @@ def run(params):
         print(f'Error: {image_location} does not exist')
         return;
         
-    image_data = imread(image_location)
-    dims = image_data.shape
-    temp_array = np.empty_like(image_data)
-    output_data = np.empty_like(image_data)
-    
-    temp_array = np.where(image_data>threshold, 1, 0)
+    with stage('read'):
+        image_data = imread(image_location)
+    temp_array = np.empty(image_data.shape, dtype=np.uint8)
 
-    if radius != 0:
-        if zCount > 1:
-            structure = ball(radius)
-        else:
-            structure = disk(radius)
-    
-    # 3D+T
-    if tCount > 1 and zCount > 1:
-        for t in range(0, dims[0]):
-            temp_array[t, :, :, :] = skeletonize_3d(temp_array[t, :, :, :])
-            if radius != 0:
-                temp_array[t, :, :, :] = closing(temp_array[t, :, :, :], footprint=structure)
-    # 2D+T
-    elif tCount > 1 and zCount == 1:
-        for t in range(0, dims[0]):
-            temp_array[t, :, :] = skeletonize(temp_array[t, :, :])
-            if radius != 0:
-                temp_array[t, :, :] = closing(temp_array[t, :, :], footprint=structure)
-    # 3D
-    elif tCount ==1 and zCount > 1:
-        temp_array = skeletonize_3d(temp_array)
-        if radius != 0:
-            temp_array = closing(temp_array, footprint=structure)
-    # 2D
-    else:
-        temp_array = skeletonize(temp_array)
-        if radius != 0:
-            temp_array = closing(temp_array, footprint=structure)
+    with stage('compute'):
+        # 3D frames are skeletonized in 3D, 2D frames (2D or 2D+T) in 2D
+        kernel = partial(skeletonize_frame, threshold=threshold, radius=radius)
+        run_per_frame(kernel, image_data, temp_array, tCount, zCount, frame_ndim=3)
 
+    with stage('convert'):
+        temp_array = np.where(temp_array.astype(image_data.dtype)>0, image_data.max(), 0)
+        output_data = temp_array.astype(image_data.dtype)
 
-    temp_array = np.where(temp_array.astype(image_data.dtype)>0, image_data.max(), 0)
-    
-    output_data = temp_array.astype(image_data.dtype)
-    imsave(result_location, output_data)
+    with stage('write'):
+        imsave(result_location, output_data)
+
+
+def skeletonize_frame(frame, threshold, radius=0):
+    binary = np.where(frame > threshold, 1, 0)
+    if frame.ndim == 3:
+        skeleton = skeletonize_3d(binary)
+    else:
+        skeleton = skeletonize(binary)
+    if radius != 0:
+        # Disk for 2D frames, ball for 3D frames
+        skeleton = closing(skeleton, radius)
+    return skeleton
 
 
 if __name__ == '__main__':
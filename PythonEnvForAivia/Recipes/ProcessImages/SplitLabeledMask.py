@@ -4,6 +4,14 @@ import os.path
 import numpy as np
 from skimage.io import imread, imsave
 from skimage import segmentation
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Separates labeled objects in a mask (2D or 3D).
@@ -34,6 +42,7 @@ New mask with separated labeled objects
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Labeled Mask']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Split Labeled Mask']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
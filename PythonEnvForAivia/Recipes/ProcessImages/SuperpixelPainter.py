@@ -23,6 +23,13 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 import numpy as np
 from skimage.io import imread, imsave
 from skimage.filters import sobel
@@ -74,6 +81,7 @@ Aivia objects
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [OUTPUT Name:resultMaskPath Type:string DisplayName:'Mask Image']
 # [OUTPUT Name:resultObjectPath Type:string DisplayName:'Mask Objects' Objects:2D MinSize:0.0 MaxSize:1000000000.0]
+@profiled
 def run(params):
     print('reading')
     image_location = params['inputImagePath']
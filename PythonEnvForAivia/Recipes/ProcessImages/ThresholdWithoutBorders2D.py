@@ -4,6 +4,16 @@ from tifffile import imread, imsave
 from skimage.segmentation import clear_border
 from skimage.morphology import closing, disk
 from skimage.util import img_as_ubyte, img_as_uint
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 See: https://scikit-image.org/docs/dev/api/skimage.segmentation.html#skimage.segmentation.clear_border
@@ -40,6 +50,8 @@ Aivia objects
 # [INPUT Name:threshold Type:int DisplayName:'Threshold' Default:100 Min:0 Max:65535]
 # [INPUT Name:radius Type:int DisplayName:'Closing Radius' Default:0 Min:0 Max:100]
 # [OUTPUT Name:resultObjectPath Type:string DisplayName:'Objects' Objects:2D MinSize:0.0 MaxSize:1000000000.0]
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_object_location = params['resultObjectPath']
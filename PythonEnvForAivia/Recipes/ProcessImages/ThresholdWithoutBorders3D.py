@@ -1,12 +1,23 @@
 import os.path
+from functools import partial
 import numpy as np
-from tifffile import imread, imsave
 from skimage.segmentation import clear_border
 from skimage.measure import label
-from skimage.morphology import closing, ball
 from skimage.util import img_as_ubyte, img_as_uint
 import sys
 import ctypes
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.frames import map_frames
+from Recipes.utils.morphology import closing
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
 
 """
 See: https://scikit-image.org/docs/dev/api/skimage.segmentation.html#skimage.segmentation.clear_border
@@ -49,6 +60,8 @@ Aivia objects
 # [INPUT Name:threshold Type:int DisplayName:'Threshold' Default:128 Min:0 Max:65535]
 # [INPUT Name:radius Type:int DisplayName:'Closing Radius' Default:2 Min:0 Max:100]
 # [OUTPUT Name:resultObjectPath Type:string DisplayName:'Objects' Objects:3D MinSize:0.0 MaxSize:1000000000.0]
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_object_location = params['resultObjectPath']
@@ -66,43 +79,55 @@ def run(params):
         print('Try using ThresholdWithoutBorders2D.py instead.')
         return
         
-    image_data = imread(image_location)
-    dims = image_data.shape
-    mask = np.empty(image_data.shape, dtype=image_data.dtype)
-    if radius != 0:
-        structure = ball(radius)
+    image_data = open_image(image_location)
     
     # 3D+T
     if tCount > 1 and zCount > 1:
         print(f"Applying to 3D+T case with dims: {image_data.shape}")
-        for t in range(0, dims[0]):
-            mask[t,:,:,:] = np.where(image_data[t,:,:,:] > threshold, 1, 0)
-            if radius != 0:
-                mask[t,:,:,:] = closing(mask[t,:,:,:], footprint=structure)
-            mask[t,:,:,:] = label(clear_border(mask[t,:,:,:]))
         axes = 'YXZT'
     # 3D
     elif tCount == 1 and zCount > 1:
         print(f"Applying to 3D case with dims: {image_data.shape}")
-        mask = np.where(image_data > threshold, 1, 0)
-        if radius != 0:
-            mask = closing(mask, footprint=structure)
-        mask = label(clear_border(mask))
         axes = 'YXZ'
-    
-    print(f"Max before conversion: {np.max(mask)}")
-    
-    if image_data.dtype == np.uint16:
-        mask = img_as_uint(mask)
-    else:
-        if np.max(mask) > 255:
-            mess = f"Found {np.max(mask)} objects but image is 8-bit. Consider converting to 16-bit before."
-            ctypes.windll.user32.MessageBoxW(0, mess, 'Error', 0)
-            sys.exit(mess)
-        mask = img_as_ubyte(mask)
-    print(f"Max after conversion: {np.max(mask)}")
-
-    imsave(result_object_location, mask, metadata={'axes': axes})
+
+    with stage('compute and write'):
+        # Each timepoint is written as soon as it is labeled
+        kernel = partial(label_without_borders, threshold=threshold, radius=radius)
+        labels = map_frames(kernel, image_data, tCount, zCount, frame_ndim=3)
+        output_dtype = np.uint16 if image_data.dtype == np.uint16 else np.uint8
+        max_labels = {'before': 0, 'after': 0}
+        try:
+            write_frames(result_object_location, convert_labels(labels, output_dtype, max_labels),
+                         image_data.shape, output_dtype, metadata={'axes': axes})
+        except OverflowError as e:
+            os.remove(result_object_location)
+            ctypes.windll.user32.MessageBoxW(0, str(e), 'Error', 0)
+            sys.exit(str(e))
+
+    print(f"Max before conversion: {max_labels['before']}")
+    print(f"Max after conversion: {max_labels['after']}")
+
+
+def convert_labels(labels, dtype, max_labels):
+    # Labels are kept in int32 until the number of objects is checked against the output bit depth
+    for mask in labels:
+        max_labels['before'] = max(max_labels['before'], np.max(mask))
+        if dtype == np.uint16:
+            mask = img_as_uint(mask)
+        else:
+            if np.max(mask) > 255:
+                raise OverflowError(f"Found {np.max(mask)} objects but image is 8-bit. "
+                                    f"Consider converting to 16-bit before.")
+            mask = img_as_ubyte(mask)
+        max_labels['after'] = max(max_labels['after'], np.max(mask))
+        yield mask
+
+
+def label_without_borders(frame, threshold, radius=0):
+    mask = np.where(frame > threshold, 1, 0)
+    if radius != 0:
+        mask = closing(mask, radius)
+    return label(clear_border(mask)).astype(np.int32)
 
 
 if __name__ == '__main__':
@@ -6,6 +6,16 @@ from scipy.ndimage import distance_transform_edt, label
 from skimage.segmentation import watershed
 from skimage.feature import peak_local_max
 from skimage.filters import gaussian
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 
 # FIXED PARAMETERS
@@ -34,6 +44,8 @@ Channel in Aivia
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Binary Mask']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Watershed Result']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
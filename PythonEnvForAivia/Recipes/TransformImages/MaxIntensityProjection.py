@@ -1,85 +1,118 @@
 import os.path
 import numpy as np
-from skimage.io import imread, imsave
+from tifffile import imwrite
 import shlex, subprocess
 import sys
 from os.path import dirname as up
 from os.path import isfile
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.projection import project_stack
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
 
 """
-Performs a maximum intensity projection through Z for a single channel.
+Performs an intensity projection through Z for a single channel (maximum by default).
 
-Works only in 3D (not 3D+t yet).
+Works in 3D and 3D+T. The stack is read one Z plane at a time (see
+Recipes/utils/projection.py): memory use does not depend on the number of slices.
 
 Requirements
 ------------
 numpy (comes with Aivia installer)
-scikit-image (comes with Aivia installer)
+scipy (comes with Aivia installer), for the extended depth of field projection
 
 Parameters
 ----------
 Input channel:
     Input channel to use for the projection.
 
+Projection:
+    0 = maximum, 1 = minimum, 2 = mean, 3 = sum (clipped to the bit depth of the input),
+    4 = standard deviation, 5 = extended depth of field (value of the slice in best
+    focus, focus being the local energy of the Laplacian).
+
 Returns
 -------
 New channel in original 3D image:
-    Returns a binary map of the location of max values detected in volume.
+    Returns a binary map of the location of max values detected in volume (min values
+    for the minimum projection, slice in best focus for the extended depth of field).
 
 New 2D image:
-    Opens Aivia (again) to display the 2D projection as a new image.
+    Opens Aivia (again) to display the 2D projection as a new image (2D+T for 3D+T inputs).
 
 """
 
+PROJECTION_TYPES = ['max', 'min', 'mean', 'sum', 'std', 'edf']
+
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
+# [INPUT Name:projectionType Type:int DisplayName:'Projection (0=Max, 1=Min, 2=Mean, 3=Sum, 4=Std, 5=EDF)' Default:0 Min:0 Max:5]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Max Intensity Location']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
     tCount = int(params['TCount'])
+    projection_type = PROJECTION_TYPES[int(params.get('projectionType', 0))]
     
     if not os.path.exists(image_location):
         print(f"Error: {image_location} does not exist")
         return
 
         
-    image_data = imread(image_location)
+    image_data = open_image(image_location)
     dims = image_data.shape
-    print('-- Input dimensions (expected Z, Y, X): ', np.asarray(dims), ' --')
+    print('-- Input dimensions (expected (T), Z, Y, X): ', np.asarray(dims), ' --')
     
     # Checking image is not 2D or 2D+t
     if len(dims) == 2 or (len(dims) == 3 and tCount > 1):
         print('Error: Maximum intensity projection cannot be applied to 2D images.')
         return
     
-    output_data = np.empty_like(image_data)
-    proj_output = output_data[0, :, :]
-    
     # Value for binary map
     int_info = np.iinfo(image_data.dtype)
     vbin = int_info.max
     
-    if tCount == 1:     # (image is not 3D+t)
-        # Generate 2D max projection
-        proj_output = np.amax(image_data, axis = 0)
-        
-        for z in np.arange(0, dims[0]):
-            current_z = image_data[z, :, :]
-            curr_z_nozeros = np.where(current_z > 0, current_z, -1)
-            output_data[z, :, :] = np.where(curr_z_nozeros < proj_output, 0, vbin)
-            
-    else:           # (image is 3D+t)
-        pass
-        
+    # Projection of interest and the one the location map is made from, in one pass over Z
+    location_type = {'min': 'min', 'edf': 'argedf'}.get(projection_type, 'max')
+    with stage('project'):
+        projections = project_stack(image_data, {projection_type, location_type}, tCount)
+    
+    proj_output = projections[projection_type]
+    if proj_output.dtype != image_data.dtype:
+        proj_output = np.clip(np.rint(proj_output), int_info.min, int_info.max).astype(image_data.dtype)
+    
+    def location_planes():
+        # Slices where each pixel of the projection comes from (zero pixels excluded)
+        for t in range(dims[0]) if tCount > 1 else [None]:
+            stack = image_data if t is None else image_data[t]
+            reference = projections[location_type] if t is None else projections[location_type][t]
+            for z in range(stack.shape[0]):
+                if location_type == 'argedf':
+                    yield np.where(reference == z, vbin, 0)
+                else:
+                    current_z = np.asarray(stack[z])
+                    yield np.where((current_z == reference) & (current_z > 0), vbin, 0)
+    
     if 'fileOutputPath_2' in params.keys():
         temp_location = params['fileOutputPath_2']
     else:
         temp_location = result_location.replace('.tif', 'tmp.tif')
-    imsave(temp_location, proj_output)
     
-    # Dummy save to avoid error in Aivia
-    imsave(result_location, output_data)
+    with stage('write'):
+        if tCount > 1:
+            imwrite(temp_location, proj_output, imagej=True, metadata={'axes': 'TYX'})
+        else:
+            imwrite(temp_location, proj_output)
+        
+        # Location map, written slice by slice
+        write_frames(result_location, location_planes(), dims, image_data.dtype)
     
     aivia_path = params['CallingExecutable']
     # Added for handling testing without opening aivia
@@ -106,3 +139,4 @@ if __name__ == '__main__':
 
 # CHANGELOG
 # v1.01: - Added an extra key in params for Unit test output
+# v1.10: - Projection in a single streaming pass over Z, 3D+T support, min / mean / sum / std / EDF projections
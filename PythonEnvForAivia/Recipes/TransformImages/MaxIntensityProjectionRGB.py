@@ -1,21 +1,34 @@
 import os.path
 import numpy as np
-from skimage.io import imread, imsave
+from tifffile import imwrite
 import shlex, subprocess
 import sys
 from os.path import dirname as up
 from os.path import isfile
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.projection import project_channels, composite_rgb
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
 
 """
 Performs a maximum intensity projection through Z for a single channel. 
 Repeats the operation for the two other channels of the RGB image.
 
-Works only in 3D (not 3D+t yet).
+Works in 3D and 3D+T. The three channels are read concurrently, one Z plane at a time
+(see Recipes/utils/projection.py): memory use does not depend on the number of slices.
+Each channel is displayed with its colour (CHANNEL_COLORS) in the RGB result, which
+keeps the bit depth of the input (8 or 16 bits).
 
 Requirements
 ------------
 numpy (comes with Aivia installer)
-scikit-image (comes with Aivia installer)
+tifffile (comes with Aivia installer)
 
 Parameters
 ----------
@@ -28,15 +41,19 @@ New channels in original 3D image:
     Returns a binary map of the location of max values detected in volume.
 
 New 3-channel 2D image:
-    Opens Aivia (again) to display the 2D projection as a new image.
+    Opens Aivia (again) to display the 2D projection as a new image (2D+T for 3D+T
+    inputs). Channels are saved in blue, green, red order.
 
 """
 
+CHANNEL_COLORS = ['red', 'green', 'blue']
+
 
 # [INPUT Name:inputRedPath Type:string DisplayName:'Red channel']
 # [INPUT Name:inputGreenPath Type:string DisplayName:'Green channel']
 # [INPUT Name:inputBluePath Type:string DisplayName:'Blue channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Empty channel']
+@profiled
 def run(params):
     image_location = []
     image_location.append(params['inputRedPath'])
@@ -49,32 +66,31 @@ def run(params):
     for c in range(0, 3):
         if not os.path.exists(image_location[c]):
             print(f"Error: {image_location[c]} does not exist")
-            return;
-    
-    
-    first_ch = imread(image_location[0])
-    input_dims = np.asarray(first_ch.shape)
-    print('-- Input dimensions (expected Z, Y, X): ', input_dims, ' --')
+            return
     
-    new_input_dims = np.insert(input_dims, 0, 3)
-    image_data = np.zeros(new_input_dims).astype(first_ch.dtype)
-    print('-- Combined input dimensions (expected C, Z, Y, X): ', new_input_dims, ' --')
-    
-    for c in range(0, 3):
-        image_data[c] = imread(image_location[c])
+    channels = [open_image(location) for location in image_location]
+    dims = channels[0].shape
+    print('-- Input dimensions (expected (T), Z, Y, X): ', np.asarray(dims), ' --')
     
     # Checking image is not 2D or 2D+t
-    if input_dims.size == 2 or (input_dims.size == 3 and tCount > 1):
+    if len(dims) == 2 or (len(dims) == 3 and tCount > 1):
         print('Error: Maximum intensity projection cannot be applied to 2D images.')
-        return;
+        return
     
-    output_data = np.empty_like(first_ch)
-    proj_output = np.zeros([3, input_dims[1], input_dims[2]])       # TO CHECK
+    if any(channel.shape != dims or channel.dtype != channels[0].dtype for channel in channels):
+        print('Error: The 3 channels must have the same dimensions and bit depth.')
+        return
     
-    for c in range(0, 3):
-        if tCount == 1:     # (image is not 3D+t)
-            # Generate 2D max projection for each channel
-            proj_output[2-c, :, :] = np.amax(image_data[c], axis = 0)
+    if channels[0].dtype not in (np.uint8, np.uint16):
+        print('Error: Only 8-bit and 16-bit images are supported.')
+        return
+    
+    with stage('project'):
+        projections = project_channels(channels, 'max', tCount)
+        rgb = composite_rgb(projections, CHANNEL_COLORS)
+    
+    # Blue, green, red planes, as in previous versions
+    proj_output = np.ascontiguousarray(rgb[..., ::-1, :, :])
     
     # Saving 3 channel image as single tif
     if 'fileOutputPath_2' in params.keys():     # test mode
@@ -82,12 +98,17 @@ def run(params):
     else:
         temp_location = result_location.replace('.tif', 'tmp.tif')
         
-        # Dummy save to avoid error in Aivia
-        imsave(result_location, output_data)
+        # Dummy save to avoid error in Aivia, written slice by slice
+        empty_planes = (np.zeros(dims[-2:], dtype=channels[0].dtype) for _ in range(int(np.prod(dims[:-2]))))
+        write_frames(result_location, empty_planes, dims, channels[0].dtype)
 
     # Saving real output
-    print('-- Output dimensions (expected C, Y, X): ', proj_output.shape, ' --')
-    imsave(temp_location, proj_output.astype(np.uint8), metadata={'axes': 'XYC'})
+    print('-- Output dimensions (expected (T), C, Y, X): ', proj_output.shape, ' --')
+    with stage('write'):
+        if tCount > 1:
+            imwrite(temp_location, proj_output, imagej=True, metadata={'axes': 'TCYX'})
+        else:
+            imwrite(temp_location, proj_output)
   
     aivia_path = params['CallingExecutable']
     # Added for handling testing without opening aivia
@@ -117,3 +138,4 @@ if __name__ == '__main__':
 # CHANGELOG
 # v1.01: - Added an extra key in params for Unit test output
 # v1.10: - Changed output format to be as GT during tests (CYX order)
+# v1.20: - Channels read concurrently and projected one plane at a time, 3D+T support, output in the input bit depth
@@ -23,9 +23,17 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 import os.path
 import numpy as np
-import matplotlib.pyplot as plt
+plt = lazy_import('matplotlib.pyplot')
 from skimage.io import imread, imsave
 
 """
@@ -74,6 +82,7 @@ Aivia channel
 # [INPUT Name:red_c Type:string DisplayName:'Red Channel']
 # [INPUT Name:histogram Type:int DisplayName:'Show Histogram (0=no, 1=yes)' Default:0 Min:0 Max:1]
 # [OUTPUT Name:gray_c Type:string DisplayName:'Luminance']
+@profiled
 def run(params):
     red_c = params['red_c']
     blue_c = params['blue_c']
@@ -5,9 +5,18 @@ import shlex
 import subprocess
 import imagecodecs
 import numpy as np
-from skimage import transform, img_as_uint, img_as_ubyte
+from skimage import transform
 from tifffile import imread, imwrite
 from os.path import dirname as up
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+from Recipes.utils.dtype_policy import as_compute_float, to_dtype
+# ---------------------------------------------------------------
 
 
 """
@@ -56,6 +65,7 @@ aivia_path = parentDir + '\\Aivia.exe'
 # [INPUT Name:resize Type:int DisplayName:'Resize image (0 = No, 1 = Yes)' Default:0 Min:0 Max:1]
 # [INPUT Name:rotAngle Type:int DisplayName:'Rotation Angle (-180 to 180)' Default:90 Min:0 Max:180]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Rotated channel']
+@profiled
 def run(params):
     global interpolation_mode
     # image_org = params['EntryPoint']
@@ -92,13 +102,13 @@ def run(params):
         sys.exit(error_mess)
 
     # Rotation
-    processed_data = transform.rotate(raw_data, rot_angle, resize=do_resize, order=interpolation_mode)
+    processed_data = transform.rotate(as_compute_float(raw_data), rot_angle, resize=do_resize, order=interpolation_mode)
 
     # Formatting result array
     if raw_data.dtype is np.dtype('u2'):
-        out_data = img_as_uint(processed_data)
+        out_data = to_dtype(processed_data, np.uint16)
     else:
-        out_data = img_as_ubyte(processed_data)
+        out_data = to_dtype(processed_data, np.uint8)
 
     if do_resize:
         # Defining axes for output metadata and scale factor variable
@@ -143,3 +153,4 @@ if __name__ == '__main__':
 
 # CHANGELOG
 # v1_00: - Including isotropic scaling and proper export to Aivia
+# v1_10: - Rotation in float32 instead of float64 (output may differ by one grey level)
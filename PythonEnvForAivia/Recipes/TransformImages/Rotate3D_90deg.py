@@ -24,6 +24,14 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 import shlex
 import subprocess
 import imagecodecs
@@ -31,7 +39,7 @@ import numpy as np
 from skimage import transform
 from skimage.util import img_as_uint, img_as_ubyte
 from tifffile import imread, imwrite
-from magicgui import magicgui
+magicgui = lazy_import('magicgui', 'magicgui')
 
 
 """
@@ -67,6 +75,7 @@ interpolation_mode = 1  # 0: Nearest-neighbor, 1: Bi-linear , 2: Bi-quadratic, 3
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Duplicate of input']
+@profiled
 def run(params):
     global axis_rot_options, interpolation_mode
     image_location = params['inputImagePath']
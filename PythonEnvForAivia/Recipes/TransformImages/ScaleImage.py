@@ -5,7 +5,16 @@ import imagecodecs
 import numpy as np
 from tifffile import imread, imwrite
 from skimage import transform
-from skimage.util import img_as_uint, img_as_ubyte
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+from Recipes.utils.dtype_policy import as_compute_float, to_dtype
+# ---------------------------------------------------------------
 
 
 """
@@ -49,6 +58,7 @@ IJTimeUnit = {'Minutes': 'min', 'Seconds': 's', 'Milliseconds': 'ms', 'Microseco
 # [INPUT Name:scaleFactorZ Type:double DisplayName:'Z scale factor' Default:1.5 Min:0.01 Max:20.0]
 # [INPUT Name:scaleFactorXY Type:double DisplayName:'XY scale factor' Default:2.0 Min:0.01 Max:20.0]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Duplicate of input']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -120,15 +130,16 @@ def run(params):
         axes = 'YX'
         final_scale = scale_factor_xy
 
-    scaled_img = transform.rescale(image_data, final_scale, interpolation_mode)
+    # Interpolation and anti-aliasing in float32 (float64 for a uint16 input would be 4x its size)
+    scaled_img = transform.rescale(as_compute_float(image_data), final_scale, interpolation_mode)
 
     # Formatting result array
     if image_data.dtype is np.dtype('u2'):
-        out_data = img_as_uint(scaled_img)
-        print('img_as_uint')
+        out_data = to_dtype(scaled_img, np.uint16)
+        print('Converting result to 16-bit')
     else:
-        out_data = img_as_ubyte(scaled_img)
-        print('img_as_ubyte')
+        out_data = to_dtype(scaled_img, np.uint8)
+        print('Converting result to 8-bit')
 
     # Output path depending on test mode or not
     if 'fileOutputPath_2' in params.keys():
@@ -192,3 +203,4 @@ if __name__ == '__main__':
 # v1_30: - Fusing with parallel version updating aivia_path using new API params value
 #        - Time increment is not recognized in Aivia at the moment
 # v1_31: - Added an extra key in params for Unit test output
+# v1_32: - Rescaling in float32 instead of float64 (output may differ by one grey level)
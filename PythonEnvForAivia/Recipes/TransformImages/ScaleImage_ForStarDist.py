@@ -8,6 +8,14 @@ from tifffile import imread, imwrite
 from skimage import transform
 from skimage.util import img_as_uint, img_as_ubyte
 import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 
 """
@@ -54,6 +62,7 @@ IJTimeUnit = {'Minutes': 'min', 'Seconds': 's', 'Milliseconds': 'ms', 'Microseco
 # [INPUT Name:performZscaling Type:int DisplayName:'Perform Z scaling (1=Yes)' Default:1 Min:0 Max:1]
 # [INPUT Name:typicalObjDiam Type:double DisplayName:'Typical Object Diameter' Default:10.0 Min:0.001 Max:1000.0]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Duplicate of input']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
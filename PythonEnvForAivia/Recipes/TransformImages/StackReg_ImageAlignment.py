@@ -25,16 +25,24 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
-from magicgui import magicgui
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 from skimage.io import imread, imsave
 import numpy as np
-from pystackreg import StackReg
-from pystackreg.util import to_uint16
 import imagecodecs
+magicgui = lazy_import('magicgui', 'magicgui')
+StackReg = lazy_import('pystackreg', 'StackReg')
+to_uint16 = lazy_import('pystackreg.util', 'to_uint16')
 
 # Manual input parameters (only used if 'use' is True below)
 noGUI_params = {'use': False,
-                'reg_type': 'Rigid Body',
+                'reg_type': 'RIGID_BODY',
                 'reg_method': 'previous'
                 }
 
@@ -71,15 +79,17 @@ reg_methods = {
     'First image is the reference': 'first',
     'Mean of all images is the reference': 'mean'
     }
+# Names of the StackReg constants (read when registering, so that pystackreg is only loaded then)
 reg_types = {
-    'Translation only': StackReg.TRANSLATION,
-    'Rigid Body (translation + rotation)': StackReg.RIGID_BODY,
-    'Affine (translation + rotation + scaling + shearing)': StackReg.AFFINE,
-    'Bilinear (non-linear transformation; does not preserve straight lines)': StackReg.BILINEAR
+    'Translation only': 'TRANSLATION',
+    'Rigid Body (translation + rotation)': 'RIGID_BODY',
+    'Affine (translation + rotation + scaling + shearing)': 'AFFINE',
+    'Bilinear (non-linear transformation; does not preserve straight lines)': 'BILINEAR'
 }
 
 # [INPUT Name:inputRawImagePath Type:string DisplayName:'Unregistered stack']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Registered stack']
+@profiled
 def run(params):
     global reg_methods, reg_types
 
@@ -117,6 +127,13 @@ def run(params):
         reg_method = noGUI_params['reg_method']
 
     else:  # Choose csv/xlsx table (Aivia format) with GUI
+        @magicgui(layout='vertical',
+                  reg_typ={'label': 'Registration type: ', 'choices': reg_types.keys()},
+                  reg_meth={'label': 'Registration reference: ', 'choices': reg_methods.keys()},
+                  call_button="Continue")
+        def gui(reg_typ=[*reg_types][0], reg_meth=[*reg_methods][0]):
+            pass
+
         gui.called.connect(lambda x: gui.close())
         gui.show(run=True)
 
@@ -125,7 +142,7 @@ def run(params):
         reg_method = reg_methods[gui.reg_meth.value]
 
     # Prepare parameters for registration
-    sr = StackReg(reg_type)
+    sr = StackReg(getattr(StackReg, reg_type))
 
     # Register 2D timelapse
     out_npimg = sr.register_transform_stack(raw_npimg, reference=reg_method)
@@ -143,14 +160,6 @@ def run(params):
     imsave(resultLocation, final_img)
 
 
-@magicgui(layout='vertical',
-          reg_typ={'label': 'Registration type: ', 'choices': reg_types.keys()},
-          reg_meth={'label': 'Registration reference: ', 'choices': reg_methods.keys()},
-          call_button="Continue")
-def gui(reg_typ=[*reg_types][0], reg_meth=[*reg_methods][0]):
-    pass
-
-
 def show_error(message):
     ctypes.windll.user32.MessageBoxW(0, message, 'Error', 0)
     sys.exit(message)
@@ -174,3 +183,4 @@ if __name__ == '__main__':
 # v1_01 PM: - New virtual env code for auto-activation
 # v1_10 PM: - Works in 15.0 but black pixels instead of white saturated ones are present in resulting image.
 # v1_11 PM: - Fixed black and white pixels in registered images for 8 bit images
+# v1_12 PM: - magicgui and pystackreg are only imported when the registration runs
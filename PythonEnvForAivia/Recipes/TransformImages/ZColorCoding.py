@@ -23,14 +23,29 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.recipe_worker import worker_enabled, submit
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.color_coding import coded_planes, coded_projection
+# ---------------------------------------------------------------
+
 # import time
-import matplotlib.pyplot as plt
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
-from skimage.io import imread, imsave
+import shlex, subprocess
+from tifffile import imwrite
 
 '''
 Uses matplotlib colormaps to retrieve colors used to create color gradients applied to individual Z planes in a 3D image.
 Can be used with timepoints too, but is not adapted to 4D/5D images.
+The input is read one plane at a time and each color channel is written as it is computed
+(see Recipes/utils/color_coding.py).
 
 Requirements
 ------------
@@ -44,10 +59,14 @@ Parameters
 - Input channel
 - Colormap choice (with index from 0 to ...)
 See maps here: https://matplotlib.org/stable/gallery/color/colormap_reference.html
+- Projection: 0 = none (color-coded stack), 1 = color-coded max projection (each pixel has the color of the
+  slice where its maximum is)
 
 Returns
 ----------
 - 3 new channels for Red, Green and Blue information for proper color-code
+- Color-coded max projection only: the 3-channel 2D (or 2D+t) projection is opened in Aivia (again)
+  as a new image, and the 3 channels are left empty
 
 Usage
 ----------
@@ -62,10 +81,17 @@ cmaps = ['viridis', 'plasma', 'inferno', 'magma', 'cividis', 'spring', 'summer',
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [INPUT Name:colorMapChoice Type:int DisplayName:'Color map index (see python code)' Default:0 Min:0 Max:100]
+# [INPUT Name:projectionMode Type:int DisplayName:'Projection (0=None, 1=Color-coded MIP)' Default:0 Min:0 Max:1]
 # [OUTPUT Name:resultPathBlue Type:string DisplayName:'Z Coloring - Blue']
 # [OUTPUT Name:resultPathGreen Type:string DisplayName:'Z Coloring - Green']
 # [OUTPUT Name:resultPathRed Type:string DisplayName:'Z Coloring - Red']
+@profiled
+@cached_run(bypass=lambda params: int(params.get('projectionMode', 0)) == 1)
 def run(params):
+    # Opt-in: runs in the warm recipe worker instead (see Recipes/utils/recipe_worker.py)
+    if worker_enabled():
+        return submit(__file__, params)
+
     image_location = params['inputImagePath']
     selected_map = cmaps[int(params['colorMapChoice'])]
     result_location_red = params['resultPathRed']
@@ -74,71 +100,75 @@ def run(params):
     # Extra parameters when dataset is 2D+extra dimensions
     tCount = int(params['TCount'])
     zCount = int(params['ZCount'])
+    projection_mode = int(params.get('projectionMode', 0))
 
     if tCount == 1 and zCount == 1:
         print(f'Error: image has no Z or T dimension detected.')
         return;
 
-    image_data = imread(image_location)
+    image_data = open_image(image_location)
     input_dims = np.asarray(image_data.shape)
     print('-- Input dimensions (expected Z, Y, X or T, Z, Y, X): ', input_dims, ' --')
     print('-- Selected color map is: ', selected_map)
 
-    output_dims = np.insert(input_dims, 0, 3)
-    output_data = np.zeros(output_dims).astype(image_data.dtype)
-    print(output_data.shape)
-
+    # Colors are spread over Z, or over T for 2D+t datasets
+    color_count = tCount if zCount == 1 else zCount
+    color_map = plt.get_cmap(selected_map, color_count)
+    if hasattr(color_map, 'colors'):
+        final_colors = np.asarray(color_map.colors)
+    else:
+        # Some colors have a different type > extracting color ranges is different
+        final_colors = color_map(np.linspace(0, 1, color_count))
 
     if zCount == 1 and tCount > 1:
-        color_map = plt.get_cmap(selected_map, tCount)
-        if hasattr(color_map, 'colors'):
-            final_colors = color_map.colors
-        else:
-            # Some colors have a different type > extracting color ranges is different
-            final_colors = color_map(np.linspace(0, 1, tCount))
         print('-- processing 2D+t dataset --')
-        for i in range(input_dims[0]):
-            # Collect color map for precise z-slice
-            current_col = final_colors[i, :3]
-            for c in range(3):
-                output_data[c, i, :, :] = image_data[i, :, :] * current_col[c]
-
-    elif zCount >1 and tCount == 1 :
-        color_map = plt.get_cmap(selected_map, zCount)
-        if hasattr(color_map, 'colors'):
-            final_colors = color_map.colors
-        else:
-            # Some colors have a different type > extracting color ranges is different
-            final_colors = color_map(np.linspace(0, 1, zCount))
+    elif zCount > 1 and tCount == 1:
         print('-- processing 3D dataset --')
-        for i in range(input_dims[0]):
-            # Collect color map for precise z-slice
-            current_col = final_colors[i, :3]
-            for c in range(3):
-                output_data[c, i, :, :] = image_data[i, :, :] * current_col[c]
-        pass
-    # T and Z > 1
     else:
-        color_map = plt.get_cmap(selected_map, zCount)
-        if hasattr(color_map, 'colors'):
-            final_colors = color_map.colors
-        else:
-            # Some colors have a different type > extracting color ranges is different
-            final_colors = color_map(np.linspace(0, 1, zCount))
         print('-- processing 3D+t dataset --')
-        for z in range(input_dims[1]):
-            # Collect color map for precise z-slice
-            current_col = final_colors[z, :3]
 
-            for t in range(input_dims[0]):
-                # print('Time: ', time.ctime(time.time()), ' T: ', t, ' Z: ', z)
-                for c in range(3):
-                    output_data[c, t, z, :, :] = image_data[t, z, :, :] * current_col[c]
-
-    imsave(result_location_red, output_data[0])
-    imsave(result_location_green, output_data[1])
-    imsave(result_location_blue, output_data[2])
+    result_locations = [result_location_red, result_location_green, result_location_blue]
+    if projection_mode == 1:
+        with stage('project'):
+            proj_output = coded_projection(image_data, final_colors, tCount, zCount)
 
+        if 'fileOutputPath_4' in params.keys():     # test mode
+            temp_location = params['fileOutputPath_4']
+        else:
+            temp_location = result_location_red.replace('.tif', 'tmp.tif')
+
+        with stage('write'):
+            print('-- Output dimensions (expected (T), C, Y, X): ', proj_output.shape, ' --')
+            if proj_output.ndim == 4:
+                imwrite(temp_location, proj_output, imagej=True, metadata={'axes': 'TCYX'})
+            else:
+                imwrite(temp_location, proj_output)
+
+            # Dummy channels to avoid error in Aivia, written slice by slice
+            for result_location in result_locations:
+                empty_planes = (np.zeros(input_dims[-2:], dtype=image_data.dtype)
+                                for _ in range(int(np.prod(input_dims[:-2]))))
+                write_frames(result_location, empty_planes, image_data.shape, image_data.dtype)
+
+        aivia_path = params.get('CallingExecutable', 'None')
+        # Added for handling testing without opening aivia
+        if aivia_path == "None":
+            return
+        if not os.path.exists(aivia_path):
+            print(f"Error: {aivia_path} does not exist")
+            return
+        # Run external program
+        cmdLine = 'start \"\" \"'+ aivia_path +'\" \"'+ temp_location +'\"'
+
+        args = shlex.split(cmdLine)
+        subprocess.run(args, shell=True)
+        return
+
+    # One color channel at a time, one plane at a time
+    with stage('write'):
+        for c, result_location in enumerate(result_locations):
+            write_frames(result_location, coded_planes(image_data, final_colors, c, tCount, zCount),
+                         image_data.shape, image_data.dtype)
 
 if __name__ == '__main__':
     params = {'inputImagePath': 'D:\\AIVIA working directory\\_Tests\\neuronimage_Crop_ML_resized_9.0_3D-TL.aivia.tif',
@@ -152,3 +182,4 @@ if __name__ == '__main__':
 
 # v2.01: - New virtual env code for auto-activation
 # v2.10: - changed imports for matplotlib colormaps, added logic for handling t and z series images separately
+# v2.20: - Input read plane by plane and channels written as computed (no 3 x input sized array), new color-coded max projection output
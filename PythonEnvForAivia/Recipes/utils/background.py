@@ -0,0 +1,133 @@
+import numpy as np
+
+"""
+Rolling paraboloid background of 2D and 3D images, with a cost independent of the
+radius.
+
+skimage.restoration.rolling_ball raises a ball under every pixel until it touches the
+image and takes the height of its top: the background is the grey-level erosion
+    background(x) = min over y of image(y) + g(y - x)
+by the ball's profile g(d) = r - sqrt(r^2 - |d|^2), which costs the area (volume in 3D)
+of the ball per pixel. Here the ball is replaced by the paraboloid of the same
+curvature at its top, g(d) = |d|^2 / (2 r). Its profile is a sum of one term per axis,
+so that the erosion is separable: one pass per axis, each the lower envelope of the
+parabolas rooted at every pixel of a line (Felzenszwalb and Huttenlocher), computed in
+linear time whatever the radius. Axes can have their own pixel size (e.g. Z steps
+larger than the XY pixels), which scales their term.
+
+Near its top the paraboloid is the ball; it is lower further away, and the ball's
+vertical walls stop at the radius: the two backgrounds are within a few grey levels
+for radii above about 50 pixels, while for small radii the paraboloid reaches further
+and gives a lower background.
+
+Lines are processed together, one position at a time, in blocks that keep the float64
+envelope temporaries small. Results are float32 before the conversion to the input
+type.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+BLOCK_BYTES = 64 * 1024 ** 2        # Size of the envelope temporaries of a block of lines
+
+
+def paraboloid_background(image, radius, spacing=None):
+    """
+    Background of an image under a rolling paraboloid, as skimage's rolling_ball.
+
+    Parameters
+    ----------
+    image : ndarray
+        2D or 3D image.
+    radius : float
+        Radius of the ball of the same top curvature, in pixels (and grey levels).
+    spacing : tuple of float, optional
+        Pixel size along each axis, relative to the pixel size of the radius (e.g.
+        (z_step / xy_pixel, 1, 1) for a 3D frame). 1 for all axes by default.
+
+    Returns
+    -------
+    ndarray
+        Background, of the input type (truncated as skimage does).
+    """
+    if radius <= 0:
+        raise ValueError('The radius must be positive')
+    if spacing is None:
+        spacing = (1.0,) * image.ndim
+    background = np.asarray(image, dtype=np.float32)
+    for axis, step in enumerate(spacing):
+        background = parabola_erosion(background, step ** 2 / (2.0 * radius), axis)
+    return background.astype(image.dtype, copy=False)
+
+
+def parabola_erosion(image, scale, axis):
+    """
+    Erosion along one axis by the parabola scale * d^2.
+
+    Parameters
+    ----------
+    image : ndarray
+        Image of any dimension.
+    scale : float
+        Curvature of the parabola, in grey levels per squared pixel (positive).
+    axis : int
+        Axis of the lines.
+
+    Returns
+    -------
+    ndarray
+        min over y of image(y) + scale * (x - y)^2 along the axis, float32.
+    """
+    moved = np.moveaxis(np.asarray(image), axis, 0)
+    n = moved.shape[0]
+    lines = moved.reshape(n, -1)
+    result = np.empty(lines.shape, dtype=np.float32)
+    if n == 1:
+        result[:] = lines
+        return np.moveaxis(result.reshape(moved.shape), 0, axis)
+    block = max(1, BLOCK_BYTES // (20 * n))
+    for start in range(0, lines.shape[1], block):
+        result[:, start:start + block] = _lower_envelope(lines[:, start:start + block], scale)
+    return np.moveaxis(result.reshape(moved.shape), 0, axis)
+
+
+def _lower_envelope(lines, scale):
+    # Lines along axis 0. Parabola y is rooted at (y, lines[y]); h = lines + scale * y^2
+    # makes the intersection of two of them a division. v[j] are the roots of the envelope
+    # and z[j], z[j + 1] the interval where root v[j] is the lowest; k is the last one.
+    n, count = lines.shape
+    columns = np.arange(count)
+    h = lines.astype(np.float64)
+    h += scale * np.arange(n, dtype=np.float64)[:, np.newaxis] ** 2
+    v = np.zeros((n, count), dtype=np.int32)
+    z = np.empty((n + 1, count))
+    z[0] = -np.inf
+    z[1] = np.inf
+    k = np.zeros(count, dtype=np.intp)
+    for q in range(1, n):
+        # Roots hidden by parabola q are removed, a few lines at a time
+        pending, last = columns, k.copy()
+        while pending.size:
+            root = v[last, pending]
+            s = (h[q, pending] - h[root, pending]) / (2 * scale * (q - root))
+            hidden = s <= z[last, pending]
+            kept = ~hidden
+            done, top = pending[kept], last[kept] + 1
+            v[top, done] = q
+            z[top, done] = s[kept]
+            z[top + 1, done] = np.inf
+            k[done] = top
+            pending, last = pending[hidden], last[hidden] - 1
+
+    result = np.empty((n, count), dtype=np.float32)
+    k[:] = 0
+    for x in range(n):
+        beyond = np.flatnonzero(z[k + 1, columns] < x)
+        while beyond.size:
+            k[beyond] += 1
+            beyond = beyond[z[k[beyond] + 1, beyond] < x]
+        root = v[k, columns]
+        # lines[root] + scale * (x - root)^2
+        result[x] = h[root, columns] - scale * (2.0 * x * root - x * x)
+    return result
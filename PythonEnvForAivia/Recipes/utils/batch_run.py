@@ -0,0 +1,350 @@
+import os
+import re
+import sys
+import csv
+import glob
+import time
+import argparse
+import traceback
+import contextlib
+import importlib.util
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+"""
+Headless batch runner: applies a recipe to every TIFF file of a folder (or glob
+pattern) outside Aivia, e.g. on Linux compute nodes.
+
+    python batch_run.py ../ProcessImages/ShapeIndex.py /data/stacks -o /data/results --param sigma=2
+    python batch_run.py ../ProcessImages/Watershed.py "/data/*_mask.tif" -o out --workers 8 --threads 2
+
+The recipe parameters come from the '# [INPUT ...]' / '# [OUTPUT ...]' header of the
+recipe, the same one Aivia reads:
+    - the first string input without default is the image the batch iterates over,
+    - other inputs take their default value, or the value given with --param name=value
+      (other input images need to be given that way too),
+    - each output is written as <output folder>/<input name>_<output display name>.tif,
+    - ZCount, TCount and Calibration are read from the TIFF metadata (axes, resolution
+      tags and ImageJ metadata). They can be overridden with --param as well.
+
+Images are processed by a pool of --workers processes, each one limited to --threads
+threads (numpy/BLAS/OpenMP threads and the recipes' shared per-frame executor). The
+output of each run goes to <output folder>/<input name>.log and a summary of the
+timings and failures to <output folder>/batch_summary.csv. The exit code is 1 when
+at least one image failed.
+
+Requirements
+------------
+tifffile (comes with Aivia installer)
+"""
+
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                    'AIVIA_RECIPE_WORKERS']
+SUMMARY_FILE_NAME = 'batch_summary.csv'
+
+# Aivia parameter names found in the recipe headers
+HEADER_FIELDS = ['Name', 'Type', 'DisplayName', 'Default']
+
+
+def parse_recipe_header(recipe_path):
+    """
+    Reads the inputs and outputs declared in a recipe header.
+
+    Parameters
+    ----------
+    recipe_path : str
+        Path of the recipe file.
+
+    Returns
+    -------
+    tuple
+        (inputs, outputs): lists of dicts with the 'Name', 'Type', 'DisplayName' and
+        'Default' (None if not given) fields, in the order of the header.
+    """
+    inputs, outputs = [], []
+    for line in Path(recipe_path).read_text(encoding='utf-8', errors='replace').splitlines():
+        line = line.strip()
+        for kind, target in [('# [INPUT ', inputs), ('# [OUTPUT ', outputs)]:
+            if line.startswith(kind) and line.endswith(']'):
+                target.append(_parse_fields(line[len(kind):-1]))
+    return inputs, outputs
+
+
+def _parse_fields(text):
+    # Name:resultPath Type:string DisplayName:'Shape Index' Default:3.0
+    fields = dict.fromkeys(HEADER_FIELDS)
+    for key, value in re.findall(r"(\w+):('[^']*'|\S+)", text):
+        fields[key] = value.strip("'")
+    return fields
+
+
+def image_counts_and_calibration(image_location):
+    """
+    Infers the ZCount, TCount and Calibration parameters Aivia would give for an image.
+
+    Parameters
+    ----------
+    image_location : str
+        Path of the TIFF file.
+
+    Returns
+    -------
+    dict
+        {'ZCount': int, 'TCount': int, 'Calibration': 'XYZT: <x> <unit>, <y> <unit>, <z> <unit>, <t> <unit>'}
+    """
+    import tifffile
+
+    with tifffile.TiffFile(image_location) as tif:
+        series = tif.series[0]
+        axes, shape = series.axes, series.shape
+        page = tif.pages[0]
+        imagej = tif.imagej_metadata or {}
+        x_resolution = page.tags['XResolution'].value if 'XResolution' in page.tags else None
+        y_resolution = page.tags['YResolution'].value if 'YResolution' in page.tags else None
+        resolution_unit = int(page.tags['ResolutionUnit'].value) if 'ResolutionUnit' in page.tags else 1
+
+    sizes = dict(zip(axes, shape))
+    z_count, t_count = sizes.get('Z', 1), sizes.get('T', 1)
+    # Generic leading axes (e.g. 'Q' or 'I' when the file has no axes metadata): first Z, then T
+    for axis in 'QI':
+        if axis in sizes and z_count == 1:
+            z_count = sizes[axis]
+        elif axis in sizes and t_count == 1:
+            t_count = sizes[axis]
+
+    if str(imagej.get('unit', '')).lower() in ('micron', 'microns', 'um', '\\u00b5m', 'µm'):
+        unit, scale = 'Micrometers', 1
+    elif resolution_unit == 2:
+        unit, scale = 'Micrometers', 25400         # Pixels per inch
+    elif resolution_unit == 3:
+        unit, scale = 'Micrometers', 10000         # Pixels per centimeter
+    else:
+        unit, scale = 'Default', 1
+
+    def pixel_size(resolution):
+        if not resolution or not resolution[0]:
+            return 1
+        return _format_number(scale * resolution[1] / resolution[0])
+
+    z_size = _format_number(imagej['spacing']) if 'spacing' in imagej else 1
+    z_unit = unit if 'spacing' in imagej else 'Default'
+    t_size = _format_number(imagej['finterval']) if 'finterval' in imagej else 1
+    t_unit = 'Seconds' if 'finterval' in imagej else 'Default'
+
+    calibration = f'XYZT: {pixel_size(x_resolution)} {unit}, {pixel_size(y_resolution)} {unit}, {z_size} {z_unit}, {t_size} {t_unit}'
+    return {'ZCount': int(z_count), 'TCount': int(t_count), 'Calibration': calibration}
+
+
+def _format_number(value):
+    value = round(float(value), 6)
+    return int(value) if value == int(value) else value
+
+
+def build_params(recipe_path, image_location, output_folder, overrides):
+    """
+    Builds the params dictionary of one run, as Aivia would.
+
+    Parameters
+    ----------
+    recipe_path : str
+        Path of the recipe file.
+    image_location : str
+        Path of the image processed by this run.
+    output_folder : str
+        Folder of the outputs.
+    overrides : dict
+        Parameter values given on the command line (strings).
+
+    Returns
+    -------
+    dict
+    """
+    inputs, outputs = parse_recipe_header(recipe_path)
+    main_input = main_input_name(inputs)
+    params = {}
+    for field in inputs:
+        if field['Name'] == main_input:
+            params[field['Name']] = os.path.abspath(image_location)
+        elif field['Default'] is not None:
+            params[field['Name']] = field['Default']
+    stem = image_stem(image_location)
+    for field in outputs:
+        file_name = f"{stem}_{field['DisplayName'] or field['Name']}.tif"
+        params[field['Name']] = os.path.join(os.path.abspath(output_folder), file_name)
+    params.update(image_counts_and_calibration(image_location))
+    params.update(overrides)
+
+    missing = [field['Name'] for field in inputs if field['Name'] not in params]
+    if missing:
+        raise ValueError(f'No value for the recipe inputs {missing}, give them with --param name=value')
+    return params
+
+
+def image_stem(image_location):
+    name = Path(image_location).name
+    for suffix in ('.aivia.tif', '.aivia.tiff', '.tif', '.tiff'):
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(name).stem
+
+
+def main_input_name(inputs):
+    for field in inputs:
+        if field['Type'] == 'string' and field['Default'] is None:
+            return field['Name']
+    raise ValueError('The recipe has no image input (string input without default)')
+
+
+def list_images(patterns):
+    images = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.tif')) + glob.glob(os.path.join(pattern, '*.tiff'))
+        else:
+            matches = glob.glob(pattern)
+        images.extend(sorted(matches))
+    # Same file given twice
+    return list(dict.fromkeys(os.path.abspath(path) for path in images))
+
+
+_modules = {}
+
+
+def _load_recipe(recipe_path):
+    if recipe_path not in _modules:
+        spec = importlib.util.spec_from_file_location('recipe_' + Path(recipe_path).stem, recipe_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[recipe_path] = module
+    return _modules[recipe_path]
+
+
+def run_one(recipe_path, params, outputs, log_path):
+    """
+    Runs a recipe once, in a pool process. Never raises: failures are reported in the
+    returned dict.
+    """
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    status, error = 'ok', ''
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            _load_recipe(recipe_path).run(params)
+        except BaseException as e:
+            # Including sys.exit() of the recipes' error messages
+            status, error = 'failed', f'{type(e).__name__}: {e}'
+            traceback.print_exc(file=log)
+    if status == 'ok' and not any(os.path.isfile(path) for path in outputs):
+        status, error = 'failed', 'No output written (see log)'
+    return {'status': status, 'wall_s': round(time.perf_counter() - wall_start, 3),
+            'cpu_s': round(time.process_time() - cpu_start, 3), 'error': error}
+
+
+def limit_threads(threads):
+    """Limits the threads of a pool process (before numpy is imported by the recipe)."""
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(threads)
+    # Runs stay in the pool processes
+    os.environ.pop('AIVIA_RECIPE_WORKER', None)
+
+
+def run_batch(recipe_path, images, output_folder, overrides=None, workers=None, threads=1, skip_existing=False):
+    """
+    Runs a recipe on a list of images with a process pool.
+
+    Parameters
+    ----------
+    recipe_path : str
+        Path of the recipe file.
+    images : list of str
+        Paths of the input images.
+    output_folder : str
+        Folder of the outputs, logs and summary.
+    overrides : dict
+        Parameter values replacing the defaults and inferred values.
+    workers : int
+        Number of pool processes, CPU count // threads by default.
+    threads : int
+        Number of threads of each process.
+    skip_existing : bool
+        Skips the images whose outputs already exist.
+
+    Returns
+    -------
+    list of dict
+        One summary row per image, also written to batch_summary.csv in output_folder.
+    """
+    recipe_path = os.path.abspath(recipe_path)
+    os.makedirs(output_folder, exist_ok=True)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    output_names = [field['Name'] for field in parse_recipe_header(recipe_path)[1]]
+
+    rows, jobs = [], []
+    for image_location in images:
+        row = {'input': image_location, 'status': '', 'wall_s': '', 'cpu_s': '', 'error': ''}
+        rows.append(row)
+        try:
+            params = build_params(recipe_path, image_location, output_folder, overrides or {})
+        except Exception as e:
+            row.update(status='failed', error=f'{type(e).__name__}: {e}')
+            continue
+        outputs = [params[name] for name in output_names]
+        if skip_existing and outputs and all(os.path.isfile(path) for path in outputs):
+            row['status'] = 'skipped'
+            continue
+        log_path = os.path.join(output_folder, image_stem(image_location) + '.log')
+        jobs.append((row, params, outputs, log_path))
+
+    # Fresh interpreters, so that the thread limits apply to numpy and BLAS
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(jobs), 1)),
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=limit_threads, initargs=(threads,)) as pool:
+        futures = {pool.submit(run_one, recipe_path, params, outputs, log_path): row
+                   for row, params, outputs, log_path in jobs}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                row.update(future.result())
+            except Exception as e:
+                # The pool process died (e.g. out of memory)
+                row.update(status='failed', error=f'{type(e).__name__}: {e}')
+            print(f"{row['status']:>7} {row['wall_s']:>8} s  {Path(row['input']).name}  {row['error']}")
+
+    with open(os.path.join(output_folder, SUMMARY_FILE_NAME), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['input'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs a recipe on a folder of TIFF files, outside Aivia.')
+    parser.add_argument('recipe', help='Path of the recipe file')
+    parser.add_argument('inputs', nargs='+', help='Folders or glob patterns of the input TIFF files')
+    parser.add_argument('-o', '--output', required=True, help='Output folder')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                        help='Value of a recipe parameter (repeatable)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes (CPU count / threads)')
+    parser.add_argument('--threads', type=int, default=1, help='Number of threads per process (1)')
+    parser.add_argument('--skip-existing', action='store_true', help='Skip images whose outputs exist')
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.param:
+        name, sep, value = item.partition('=')
+        if not sep:
+            parser.error(f'--param expects NAME=VALUE, got {item}')
+        overrides[name] = value
+
+    images = list_images(args.inputs)
+    if not images:
+        parser.error(f'No TIFF file found in {args.inputs}')
+    print(f'Running {Path(args.recipe).name} on {len(images)} images')
+    rows = run_batch(args.recipe, images, args.output, overrides, args.workers, args.threads, args.skip_existing)
+    failed = sum(row['status'] == 'failed' for row in rows)
+    print(f'{len(rows) - failed} done, {failed} failed. Summary: {os.path.join(args.output, SUMMARY_FILE_NAME)}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from Recipes.utils.frames import default_workers
+from Recipes.utils.histogram import has_histogram, histogram
+
+"""
+Contrast Limited Adaptive Histogram Equalization (CLAHE) of 8 and 16-bit 2D and 3D
+images, as skimage.exposure.equalize_adapthist, without its full-size temporaries.
+
+equalize_adapthist converts the image to 14-bit grey levels, pads it by reflection,
+computes the histogram of every contextual region (kernel) of the padded image, clips
+and equalizes it into a mapping, and interpolates the mappings of the 2^ndim nearest
+regions at every pixel. It holds the padded image, its regions and the 2^ndim mapped
+blocks in int64 and float64.
+
+Here the grey level and histogram bin of each pixel value come from a lookup table of
+all the values of the type (the same conversions as equalize_adapthist), so that the
+region histograms are counted straight from the integer image, a slab of padded rows
+at a time and in parallel threads. The interpolation only visits the pixels of the
+image (the padding is never built) and is done chunk by chunk of planes (2D: of rows),
+with the same float64 coefficients and float32 sums as equalize_adapthist, and the
+final rescaling to the output type is another lookup table. Results are identical to
+to_dtype(equalize_adapthist(image, kernel_size, clip_limit, nbins), dtype).
+
+The kernel can have any size along every axis, including a true 3D kernel spanning
+several planes of a volume.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+scikit-image (comes with Aivia installer)
+"""
+
+NR_OF_GRAY = 2 ** 14            # Grey levels of equalize_adapthist
+BLOCK_BYTES = 64 * 1024 ** 2    # Size of the temporaries of a slab of rows or a chunk of planes
+
+
+def clahe(image, kernel_size=None, clip_limit=0.01, nbins=256, dtype=None, max_workers=None):
+    """
+    Contrast Limited Adaptive Histogram Equalization of a 2D or 3D image.
+
+    Parameters
+    ----------
+    image : ndarray
+        2D or 3D image (uint8 and uint16 through lookup tables, other types with
+        skimage's equalize_adapthist).
+    kernel_size : int or tuple of int, optional
+        Shape of the contextual regions, 1/8 of the image along each axis by default.
+    clip_limit : float
+        Clipping limit, normalized between 0 and 1 (1 or 0: no clipping).
+    nbins : int
+        Number of histogram bins.
+    dtype : numpy dtype, optional
+        Output type, np.uint8 or np.uint16. The input type by default.
+    max_workers : int
+        Number of threads, default_workers() if None. 1 runs serially.
+
+    Returns
+    -------
+    ndarray
+        Equalized image, rescaled to the full range of the output type.
+    """
+    from skimage.util import img_as_uint
+    from skimage.exposure import equalize_adapthist, rescale_intensity
+    from Recipes.utils.dtype_policy import to_dtype
+
+    dtype = np.dtype(image.dtype if dtype is None else dtype)
+    kernel_size = _kernel_size(kernel_size, image.shape)
+    if not has_histogram(image.dtype):
+        return to_dtype(equalize_adapthist(image, kernel_size, clip_limit, nbins), dtype)
+    if max_workers is None:
+        max_workers = default_workers()
+
+    # Grey level and bin of every value, as equalize_adapthist converts the image
+    present = np.flatnonzero(histogram(image))
+    values = img_as_uint(np.arange(np.iinfo(image.dtype).max + 1, dtype=image.dtype))
+    levels = np.round(rescale_intensity(values, in_range=(values[present[0]], values[present[-1]]),
+                                        out_range=(0, NR_OF_GRAY - 1))).astype(np.uint16)
+    bins = levels // (1 + NR_OF_GRAY // nbins)
+
+    maps, counts = _region_mappings(image, bins, kernel_size, clip_limit, nbins, max_workers)
+    equalized = _interpolate(image, bins, maps, counts, kernel_size, max_workers)
+
+    # Final rescaling of equalize_adapthist (float64 for integer images) and to_dtype
+    low, high = equalized.min(), equalized.max()
+    lut = rescale_intensity(np.arange(low, high + 1, dtype=np.float64), in_range=(float(low), float(high)))
+    lut = to_dtype(lut, dtype)
+    equalized -= low
+    return np.take(lut, equalized)
+
+
+def _kernel_size(kernel_size, shape):
+    # As equalize_adapthist
+    if kernel_size is None:
+        return [max(s // 8, 1) for s in shape]
+    if np.isscalar(kernel_size):
+        return [int(kernel_size)] * len(shape)
+    if len(kernel_size) != len(shape):
+        raise ValueError(f'Incorrect value of `kernel_size`: {kernel_size}')
+    return [int(k) for k in kernel_size]
+
+
+def _padded_indices(size, k):
+    # Pixel of the image at each position of the padded axis (reflection, as np.pad)
+    pad_end = (k - size % k) % k + int(np.ceil(k / 2.0))
+    return np.pad(np.arange(size), (k // 2, pad_end), mode='reflect')
+
+
+def _region_mappings(image, bins, kernel_size, clip_limit, nbins, max_workers):
+    # Mappings of the contextual regions (flat region index, bin), float64 of integer
+    # values, and the number of regions along each axis
+    padded = [_padded_indices(s, k) for s, k in zip(image.shape, kernel_size)]
+    counts = [len(p) // k - 1 for p, k in zip(padded, kernel_size)]
+    # Pixels of the regions along each axis and their region index
+    pixels = [p[k // 2:k // 2 + n * k] for p, k, n in zip(padded, kernel_size, counts)]
+    inner_regions = 0
+    for axis in range(1, image.ndim):
+        inner_regions = inner_regions * counts[axis] + (np.arange(pixels[axis].size) // kernel_size[axis])
+        inner_regions = inner_regions[..., np.newaxis]
+    inner_regions = inner_regions[..., 0] * nbins
+    inner_count = math.prod(counts[1:])
+
+    k0 = kernel_size[0]
+    rows_per_slab = max(1, min(k0, BLOCK_BYTES // (16 * inner_regions.size)))
+    slabs = [(region, start) for region in range(counts[0]) for start in range(0, k0, rows_per_slab)]
+
+    def count_slab(slab):
+        region, start = slab
+        rows = pixels[0][region * k0 + start:region * k0 + min(k0, start + rows_per_slab)]
+        slab_bins = bins[image[np.ix_(rows, *pixels[1:])]]
+        return region, np.bincount((slab_bins + inner_regions).ravel(), minlength=inner_count * nbins)
+
+    hist = np.zeros((counts[0], inner_count * nbins), dtype=np.int64)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(slabs)))) as pool:
+        for region, slab_counts in pool.map(count_slab, slabs):
+            hist[region] += slab_counts
+    hist = hist.reshape(-1, nbins)
+
+    kernel_elements = math.prod(kernel_size)
+    if clip_limit > 0.0:
+        clim = int(np.clip(clip_limit * kernel_elements, 1, None))
+    else:
+        clim = kernel_elements
+    hist = _clip_histograms(hist, clim)
+
+    # map_histogram of equalize_adapthist
+    maps = np.cumsum(hist, axis=-1).astype(float)
+    maps *= (NR_OF_GRAY - 1) / kernel_elements
+    np.clip(maps, None, NR_OF_GRAY - 1, out=maps)
+    return np.floor(maps, out=maps).ravel(), counts
+
+
+def _clip_histograms(hist, clim):
+    # skimage's clip_histogram for every region (rows), vectorized but for the final
+    # redistribution of the remaining excess, rarely needed
+    excess = np.maximum(hist - clim, 0).sum(axis=1)
+    np.minimum(hist, clim, out=hist)
+    increment = (excess // hist.shape[1])[:, np.newaxis]
+    upper = clim - increment
+    low = hist < upper
+    excess -= low.sum(axis=1) * increment[:, 0]
+    hist += np.where(low, increment, 0)
+    mid = (hist >= upper) & (hist < clim)
+    excess += np.where(mid, hist - clim, 0).sum(axis=1)
+    hist[mid] = clim
+    for region in np.flatnonzero(excess > 0):
+        _redistribute(hist[region], clim, excess[region])
+    return hist
+
+
+def _redistribute(hist, clim, n_excess):
+    # End of skimage's clip_histogram, in place
+    while n_excess > 0:
+        prev_n_excess = n_excess
+        for index in range(hist.size):
+            under_mask = hist < clim
+            step_size = max(1, np.count_nonzero(under_mask) // n_excess)
+            under_mask = under_mask[index::step_size]
+            hist[index::step_size][under_mask] += 1
+            n_excess -= np.count_nonzero(under_mask)
+            if n_excess <= 0:
+                break
+        if prev_n_excess == n_excess:
+            break
+
+
+def _interpolate(image, bins, maps, counts, kernel_size, max_workers):
+    # Multilinear interpolation of the mappings of the 2^ndim nearest regions, chunk by
+    # chunk along the first axis. Returns the 14-bit result of equalize_adapthist (uint16).
+    ndim = image.ndim
+    nbins = maps.size // math.prod(counts)
+    # Along each axis: region strides, the regions before and after each pixel (the
+    # mappings are edge-padded by one region) and the interpolation coefficients
+    strides = [math.prod(counts[axis + 1:]) * nbins for axis in range(ndim)]
+    regions, coeffs = [], []
+    for axis, (size, k, n) in enumerate(zip(image.shape, kernel_size, counts)):
+        position = np.arange(size) + k // 2
+        block = position // k
+        shape = [1] * ndim
+        shape[axis] = size
+        regions.append([(np.clip(block + e - 1, 0, n - 1) * strides[axis]).reshape(shape) for e in (0, 1)])
+        coeff = (position % k) / k
+        coeffs.append([(1 - coeff).reshape(shape), coeff.reshape(shape)])
+
+    edges = list(np.ndindex(*([2] * ndim)))
+    equalized = np.empty(image.shape, dtype=np.uint16)
+    chunk = max(1, BLOCK_BYTES // (32 * max(1, math.prod(image.shape[1:]))))
+
+    def interpolate_chunk(start):
+        rows = slice(start, start + chunk)
+        chunk_bins = bins[image[rows]].astype(np.intp)
+        result = np.zeros(chunk_bins.shape, dtype=np.float32)
+        for edge in edges:
+            index = chunk_bins + regions[0][edge[0]][rows]
+            # Product of the coefficients from the last axis, as equalize_adapthist
+            weight = coeffs[-1][edge[-1]]
+            for axis in range(ndim - 2, -1, -1):
+                weight = weight * coeffs[axis][edge[axis]][rows if axis == 0 else slice(None)]
+            for axis in range(1, ndim):
+                index += regions[axis][edge[axis]]
+            result += (maps[index] * weight).astype(np.float32)
+        equalized[rows] = result
+        return start
+
+    starts = range(0, image.shape[0], chunk)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(starts)))) as pool:
+        list(pool.map(interpolate_chunk, starts))
+    return equalized
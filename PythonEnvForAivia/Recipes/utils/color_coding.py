@@ -0,0 +1,112 @@
+import numpy as np
+from Recipes.utils.projection import ZProjector
+
+"""
+Depth colour coding: each slice of a stack is multiplied by the colour of its position
+in a colormap (one float per red, green and blue component, from 0 to 1).
+
+The colour-coded stack is produced one plane and one component at a time
+(coded_planes(), to be written with tiff_io.write_frames()), never as a 3 x (T)ZYX
+array. 8-bit planes go through a 256-entry lookup table per slice and component,
+other types are multiplied by the colour in float64; both truncate to the input type
+as an assignment into an integer array does.
+
+coded_projection() gives the depth-coded maximum projection directly: for each pixel,
+the maximum intensity in the colour of the slice where it is reached (first one in
+case of ties), from a single streaming pass (see projection.ZProjector).
+
+Stacks are ZYX images (or TYX images coded along T) and TZYX images are coded along Z,
+one time point at a time.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+
+def colorize(plane, value, dtype, out=None):
+    """
+    Multiplies a plane by a colour component, truncated to dtype.
+
+    Parameters
+    ----------
+    plane : ndarray
+        Image plane.
+    value : float or ndarray
+        Colour component(s), from 0 to 1, broadcast against the plane.
+    dtype : numpy dtype
+        Output type.
+    out : ndarray, optional
+        Output array of the plane's shape.
+
+    Returns
+    -------
+    ndarray
+        Coloured plane.
+    """
+    if out is None:
+        out = np.empty(np.shape(plane), dtype=dtype)
+    if plane.dtype == np.uint8 and np.ndim(value) == 0:
+        lut = np.empty(256, dtype=np.uint8)
+        np.copyto(lut, np.arange(256) * value, casting='unsafe')
+        return np.take(lut, plane, out=out)
+    np.copyto(out, np.multiply(plane, value), casting='unsafe')
+    return out
+
+
+def coded_planes(image_data, colors, component, tCount=1, zCount=1):
+    """
+    Yields the planes of one colour component of the depth-coded image.
+
+    Parameters
+    ----------
+    image_data : array-like
+        ZYX, TYX or TZYX image. May be a memory-mapped image.
+    colors : ndarray
+        Colour of each slice (or time point for TYX images), N x 3 (or more) floats.
+    component : int
+        0 = red, 1 = green, 2 = blue.
+    tCount, zCount : int
+        Number of time points and slices.
+    """
+    for stack in _stacks(image_data, tCount, zCount):
+        for i in range(stack.shape[0]):
+            yield colorize(np.asarray(stack[i]), colors[i, component], image_data.dtype)
+
+
+def coded_projection(image_data, colors, tCount=1, zCount=1):
+    """
+    Depth-coded maximum projection.
+
+    Parameters
+    ----------
+    image_data : array-like
+        ZYX, TYX or TZYX image. May be a memory-mapped image.
+    colors : ndarray
+        Colour of each slice (or time point for TYX images), N x 3 (or more) floats.
+    tCount, zCount : int
+        Number of time points and slices.
+
+    Returns
+    -------
+    ndarray
+        CYX array (red, green, blue), or TCYX array for TZYX images, of the input type.
+    """
+    colors = np.asarray(colors, dtype=np.float64)[:, :3]
+    projections = []
+    for stack in _stacks(image_data, tCount, zCount):
+        projector = ZProjector(['max', 'argmax'])
+        for i in range(stack.shape[0]):
+            projector.add(stack[i])
+        maximum, argmax = projector.result('max'), projector.result('argmax')
+        rgb = np.empty((3,) + maximum.shape, dtype=image_data.dtype)
+        for c in range(3):
+            colorize(maximum, np.take(colors[:, c], argmax), image_data.dtype, out=rgb[c])
+        projections.append(rgb)
+    return np.stack(projections) if tCount > 1 and zCount > 1 else projections[0]
+
+
+def _stacks(image_data, tCount, zCount):
+    if tCount > 1 and zCount > 1:
+        return (image_data[t] for t in range(image_data.shape[0]))
+    return [image_data]
@@ -0,0 +1,143 @@
+import numpy as np
+
+"""
+Shared data type policy for the recipes' intermediate results.
+
+Most skimage filters convert integer images to float64, and the recipes then convert
+the float result back to the input bit depth with img_as_uint / img_as_ubyte. For a
+uint16 stack, every float64 temporary is 4x the size of the input and the conversion
+back allocates two more full-size arrays. The recipes instead:
+    - give the filters float32 images (compute_dtype), which skimage keeps in float32;
+    - convert the result back block by block into the output array (to_dtype), with
+      the same scaling and rounding as img_as_uint / img_as_ubyte;
+    - apply point operations block by block (map_blocks), so that whatever float
+      temporaries a function creates are the size of a block, not of the image.
+
+float32 keeps 24 bits of precision, enough for 8 and 16-bit data, but rounding of the
+intermediate results may differ from float64: outputs may differ from the float64
+results by one grey level. The tests of the recipes following this policy compare
+with a tolerance of 1 grey level (atol in their Config_*.json). Computations too
+ill-conditioned for float32 keep float64, e.g. the shape index of 16-bit images.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+BLOCK_BYTES = 16 * 1024 ** 2        # Size of the float temporaries of a block
+
+
+def compute_dtype(dtype):
+    """
+    Float type to compute with for images of the given type: float32 for 8 and 16-bit
+    data (and float32), float64 for 32 and 64-bit data.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'biu' and dtype.itemsize <= 2 or dtype == np.float32:
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def as_compute_float(image, normalize=True):
+    """
+    Converts an image to its compute float type.
+
+    Parameters
+    ----------
+    image : ndarray
+        Input image.
+    normalize : bool
+        Scale integer values to [0, 1] (or [-1, 1] for signed types) as img_as_float does.
+        Otherwise the values are kept, as filters such as meijering do with integer images.
+
+    Returns
+    -------
+    ndarray
+        Float image, the input itself if it already has the compute type.
+    """
+    dtype = compute_dtype(image.dtype)
+    if image.dtype == dtype:
+        return image
+    if normalize and image.dtype.kind in 'iu':
+        scale = dtype.type(1 / np.iinfo(image.dtype).max)
+        result = np.multiply(image, scale, dtype=dtype)
+        if image.dtype.kind == 'i':
+            np.maximum(result, -1, out=result)
+        return result
+    return image.astype(dtype)
+
+
+def to_dtype(image, dtype, out=None):
+    """
+    Converts a float image in [-1, 1] to an unsigned integer type block by block.
+
+    Results are identical to img_as_ubyte / img_as_uint (values scaled to the type's
+    range, rounded to the nearest integer, negative values clipped to 0), without their
+    full-size temporaries. Images already of the requested type are returned as is.
+
+    Parameters
+    ----------
+    image : ndarray
+        Float image (or image of the requested type).
+    dtype : numpy dtype
+        Output type, np.uint8 or np.uint16.
+    out : ndarray, optional
+        Output array of the image's shape, allocated if not given.
+
+    Returns
+    -------
+    ndarray
+        Converted image.
+    """
+    dtype = np.dtype(dtype)
+    if image.dtype == dtype:
+        if out is None:
+            return image
+        out[...] = image
+        return out
+    if image.dtype.kind != 'f' or dtype.kind != 'u':
+        raise ValueError(f'Cannot convert from {image.dtype} to {dtype}.')
+    if image.size and (np.min(image) < -1.0 or np.max(image) > 1.0):
+        raise ValueError('Images of type float must be between -1 and 1.')
+
+    if out is None:
+        out = np.empty(image.shape, dtype=dtype)
+    imax = np.iinfo(dtype).max
+
+    def convert_block(block):
+        block = np.multiply(block, imax, dtype=image.dtype)
+        np.rint(block, out=block)
+        return np.clip(block, 0, imax, out=block)
+
+    return map_blocks(convert_block, image, out)
+
+
+def map_blocks(func, image, out):
+    """
+    Applies a point operation to an image block by block, along its first axis.
+
+    Parameters
+    ----------
+    func : callable
+        Function of a block of the image, returning an array of the block's shape. It
+        must not depend on other blocks (no neighbourhood or whole-image statistics).
+    image : ndarray
+        Input image.
+    out : ndarray
+        Output array of the image's shape, may be the image itself. Results are cast
+        to its type (truncation for integer types, as astype does).
+
+    Returns
+    -------
+    ndarray
+        out
+    """
+    if image.ndim == 0:
+        out[...] = func(image)
+        return out
+    row_bytes = max(int(np.prod(image.shape[1:])) * 8, 1)
+    rows = max(BLOCK_BYTES // row_bytes, 1)
+    for start in range(0, image.shape[0], rows):
+        block = slice(start, start + rows)
+        np.copyto(out[block], func(image[block]), casting='unsafe')
+    return out
@@ -0,0 +1,196 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+import numpy as np
+
+"""
+Shared per-frame executor for the Aivia recipes.
+
+Most recipes apply a 2D or 3D kernel to every frame of the input image and used to
+repeat the same 3D+T / 2D+T / 3D / 2D branches, each one a serial Python loop.
+run_per_frame() takes the kernel and Aivia's TCount and ZCount parameters, slices the
+image into frames and fills a preallocated output, using a pool of workers when there
+is more than one frame.
+
+Images are expected in Aivia's (T, Z, Y, X) layout, with T and Z omitted when their
+count is 1.
+
+Threads are used by default: numpy, scipy.ndimage and most scikit-image filters
+release the GIL. Use processes for pure-Python kernels; the kernel then needs to be
+picklable (module-level function or functools.partial of one).
+
+map_frames() yields the results in order instead of filling an output array, for
+recipes writing each frame as soon as it is processed (see tiff_io.write_frames()).
+
+The number of workers defaults to the AIVIA_RECIPE_WORKERS environment variable, or
+to the number of CPUs if it is not set.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+
+def default_workers():
+    return int(os.environ.get('AIVIA_RECIPE_WORKERS', os.cpu_count() or 1))
+
+
+def frame_indices(tCount, zCount, frame_ndim=2):
+    """
+    Lists the indices of the leading axes to iterate over.
+
+    Parameters
+    ----------
+    tCount, zCount : int
+        Number of timepoints and Z planes, as given by Aivia.
+    frame_ndim : int
+        2 for a plane-by-plane kernel, 3 for a volumetric kernel (treated as 2 when
+        the image has no Z dimension).
+
+    Returns
+    -------
+    list of tuple
+        One index per frame. A single empty tuple means the whole image is one frame.
+    """
+    lead_shape = []
+    if tCount > 1:
+        lead_shape.append(tCount)
+    if zCount > 1 and frame_ndim == 2:
+        lead_shape.append(zCount)
+    return list(np.ndindex(*lead_shape))
+
+
+def run_per_frame(kernel, image_data, output_data, tCount, zCount, frame_ndim=2,
+                  max_workers=None, use_processes=False):
+    """
+    Applies kernel to every frame of image_data and writes the results into output_data.
+
+    Parameters
+    ----------
+    kernel : callable
+        Function taking a 2D or 3D frame and returning an array of the same shape.
+    image_data : array-like
+        Input image (numpy array, memmap or tiff_io.TiffPages).
+    output_data : numpy.ndarray
+        Preallocated output with the same leading axes as image_data.
+    tCount, zCount : int
+        Number of timepoints and Z planes, as given by Aivia.
+    frame_ndim : int
+        Dimensionality of the frames given to the kernel (2 or 3).
+    max_workers : int
+        Number of workers, default_workers() if None. 1 runs serially.
+    use_processes : bool
+        Use a process pool instead of a thread pool.
+
+    Returns
+    -------
+    numpy.ndarray
+        output_data
+    """
+    blocks = [(index, index, ()) for index in frame_indices(tCount, zCount, frame_ndim)]
+    return run_blocks(kernel, blocks, image_data, output_data, max_workers, use_processes)
+
+
+def map_frames(kernel, image_data, tCount, zCount, frame_ndim=2, max_workers=None, use_processes=False):
+    """
+    Applies kernel to every frame of image_data and yields the results in frame order.
+
+    At most two frames per worker are in flight, so memory stays bounded by the number
+    of workers whatever the number of frames.
+
+    Parameters
+    ----------
+    kernel : callable
+        Function taking a 2D or 3D frame and returning an array.
+    image_data : array-like
+        Input image (numpy array, memmap or tiff_io.TiffPages).
+    tCount, zCount : int
+        Number of timepoints and Z planes, as given by Aivia.
+    frame_ndim : int
+        Dimensionality of the frames given to the kernel (2 or 3).
+    max_workers : int
+        Number of workers, default_workers() if None. 1 runs serially.
+    use_processes : bool
+        Use a process pool instead of a thread pool.
+
+    Yields
+    ------
+    numpy.ndarray
+        kernel(frame) for every frame.
+    """
+    indices = frame_indices(tCount, zCount, frame_ndim)
+    if max_workers is None:
+        max_workers = default_workers()
+    max_workers = max(1, min(max_workers, len(indices)))
+
+    if max_workers == 1:
+        for index in indices:
+            yield kernel(np.asarray(image_data[index]))
+        return
+
+    pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool_class(max_workers=max_workers) as pool:
+        pending = deque()
+        for index in indices:
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+            pending.append(pool.submit(kernel, np.asarray(image_data[index])))
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_blocks(kernel, blocks, image_data, output_data, max_workers=None, use_processes=False):
+    """
+    Applies kernel to blocks of image_data and writes the results into output_data.
+
+    Parameters
+    ----------
+    kernel : callable
+        Function taking an array and returning an array.
+    blocks : list of tuple
+        (input index, output index, result index) for every block: the kernel is given
+        image_data[input index] and output_data[output index] is filled with
+        result[result index].
+    image_data : array-like
+        Input image (numpy array, memmap or tiff_io.TiffPages).
+    output_data : numpy.ndarray
+        Preallocated output.
+    max_workers : int
+        Number of workers, default_workers() if None. 1 runs serially.
+    use_processes : bool
+        Use a process pool instead of a thread pool.
+
+    Returns
+    -------
+    numpy.ndarray
+        output_data
+    """
+    if max_workers is None:
+        max_workers = default_workers()
+    max_workers = max(1, min(max_workers, len(blocks)))
+
+    if max_workers == 1:
+        for input_index, output_index, result_index in blocks:
+            output_data[output_index] = kernel(np.asarray(image_data[input_index]))[result_index]
+        return output_data
+
+    pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool_class(max_workers=max_workers) as pool:
+        # Blocks are read in this thread and only a few are in flight at a time,
+        # so memory stays bounded by the number of workers, not the number of blocks
+        pending = {}
+        for input_index, output_index, result_index in blocks:
+            if len(pending) >= 2 * max_workers:
+                _collect(pending, output_data, FIRST_COMPLETED)
+            future = pool.submit(kernel, np.asarray(image_data[input_index]))
+            pending[future] = (output_index, result_index)
+        _collect(pending, output_data)
+
+    return output_data
+
+
+def _collect(pending, output_data, return_when=ALL_COMPLETED):
+    done, _ = wait(pending, return_when=return_when)
+    for future in done:
+        output_index, result_index = pending.pop(future)
+        output_data[output_index] = future.result()[result_index]
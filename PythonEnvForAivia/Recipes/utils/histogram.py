@@ -0,0 +1,151 @@
+import numpy as np
+
+"""
+Exact percentiles and percentile-based rescaling of 8 and 16-bit images from their
+histogram.
+
+np.percentile sorts (partitions) a copy of the whole image. For uint8 and uint16
+images, the histogram (np.bincount, one plane at a time, so that memory-mapped or
+TiffPages images are read once and never held in memory) gives the same values: the
+k-th smallest pixel is the first value whose cumulative count exceeds k, and the
+interpolation between the two pixels around each percentile is np.percentile's
+('linear' method, same rounding). Other types fall back to np.percentile.
+
+rescale_to_range() maps the image through a lookup table of all the values of its
+type, computed as skimage.exposure.rescale_intensity(in_range=(low, high),
+out_range='dtype') computes each pixel (clipping, scaling in float64, truncation), so
+that the result is identical without any float64 copy of the image.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+HISTOGRAM_TYPES = (np.uint8, np.uint16)
+
+
+def has_histogram(dtype):
+    """True for the types whose percentiles are computed from the histogram."""
+    return np.dtype(dtype).type in HISTOGRAM_TYPES
+
+
+def histogram(image_data):
+    """
+    Number of pixels of every value of a uint8 or uint16 image.
+
+    Parameters
+    ----------
+    image_data : array-like
+        Image of any dimension. May be a memory-mapped image or tiff_io.TiffPages.
+
+    Returns
+    -------
+    ndarray
+        int64 counts, of length 256 or 65536.
+    """
+    if not has_histogram(image_data.dtype):
+        raise ValueError(f'Histograms are computed for uint8 and uint16 images, not {image_data.dtype}')
+    counts = np.zeros(np.iinfo(image_data.dtype).max + 1, dtype=np.int64)
+    for index in np.ndindex(image_data.shape[:-2]):
+        counts += np.bincount(np.asarray(image_data[index]).ravel(), minlength=counts.size)
+    return counts
+
+
+def histogram_percentiles(counts, q):
+    """
+    Percentiles of the pixels counted in a histogram, as np.percentile of the pixels.
+
+    Parameters
+    ----------
+    counts : ndarray
+        Number of pixels of each value (see histogram()).
+    q : float or sequence of float
+        Percentiles, from 0 to 100.
+
+    Returns
+    -------
+    float or ndarray
+        float64 percentile(s).
+    """
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    if total == 0:
+        raise ValueError('Percentiles of an empty histogram')
+    # Virtual index in the sorted pixels and the two pixels around it, as np.percentile
+    virtual = (total - 1) * (np.asarray(q, dtype=np.float64) / 100)
+    previous = np.clip(np.floor(virtual), 0, total - 1)
+    following = np.clip(previous + 1, 0, total - 1)
+    gamma = virtual - previous
+    a = np.searchsorted(cumulative, previous, side='right').astype(np.float64)
+    b = np.searchsorted(cumulative, following, side='right').astype(np.float64)
+    # numpy's lerp: from the nearest of the two pixels
+    result = np.where(gamma >= 0.5, b - (b - a) * (1 - gamma), a + (b - a) * gamma)
+    return result[()] if result.ndim == 0 else result
+
+
+def percentiles(image_data, q, exclude_zero=False):
+    """
+    Percentiles of an image, as np.percentile.
+
+    Parameters
+    ----------
+    image_data : array-like
+        Image of any dimension. May be a memory-mapped image or tiff_io.TiffPages.
+    q : float or sequence of float
+        Percentiles, from 0 to 100.
+    exclude_zero : bool
+        Percentiles of the non-zero pixels only.
+
+    Returns
+    -------
+    float or ndarray
+        float64 percentile(s).
+    """
+    if has_histogram(image_data.dtype):
+        counts = histogram(image_data)
+        if exclude_zero:
+            counts[0] = 0
+        return histogram_percentiles(counts, q)
+    image_data = np.asarray(image_data)
+    return np.percentile(image_data[image_data != 0] if exclude_zero else image_data, q)
+
+
+def rescale_to_range(image, low, high, out=None):
+    """
+    Rescales [low, high] to the full range of the image's type, as
+    skimage.exposure.rescale_intensity(image, in_range=(low, high), out_range='dtype').
+
+    Parameters
+    ----------
+    image : ndarray
+        Integer image (uint8 and uint16 through a lookup table).
+    low, high : float
+        Input range, e.g. two percentiles.
+    out : ndarray, optional
+        Output array of the image's shape and type (may be the image itself).
+
+    Returns
+    -------
+    ndarray
+        Rescaled image, of the input type.
+    """
+    info = np.iinfo(image.dtype)
+    if out is None:
+        out = np.empty(image.shape, dtype=image.dtype)
+    if has_histogram(image.dtype):
+        lut = _rescaled(np.arange(info.max + 1), low, high, info)
+        # Buffered take (mode 'raise'): out may be the image
+        return np.take(lut, image, out=out)
+    out[...] = _rescaled(image, low, high, info)
+    return out
+
+
+def _rescaled(values, low, high, info):
+    # Same operations as rescale_intensity, truncated to the type
+    low, high = float(low), float(high)
+    out_low, out_high = (0.0 if low >= 0 else float(info.min)), float(info.max)
+    values = np.clip(values, low, high)
+    if low != high:
+        values = (values - low) / (high - low)
+        return (values * (out_high - out_low) + out_low).astype(info.dtype)
+    return np.clip(values, out_low, out_high).astype(info.dtype)
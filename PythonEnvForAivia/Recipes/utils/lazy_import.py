@@ -0,0 +1,80 @@
+import sys
+import types
+import importlib
+
+"""
+Lazy imports for the Aivia recipes.
+
+Recipes import GUI, plotting or table packages (wx, magicgui, matplotlib, pandas, cv2,
+seaborn...) at the top of the file even when they are only needed on some code paths
+(a file dialog, an optional histogram...). These imports dominate the start-up time
+of short recipes and fail in headless runs.
+
+    plt = lazy_import('matplotlib.pyplot')          # instead of: import matplotlib.pyplot as plt
+    magicgui = lazy_import('magicgui', 'magicgui')  # instead of: from magicgui import magicgui
+
+The module (and its parent packages) is only imported on first attribute access, or
+first call for an imported function or class. A missing package is therefore only
+reported when the code path that needs it runs.
+
+Use Tests/utils/import_time.py to measure the cold import time of the recipes.
+
+Requirements
+------------
+No extra package (standard library only)
+"""
+
+
+def lazy_import(module_name, attribute=None):
+    """
+    Imports a module on first use.
+
+    Parameters
+    ----------
+    module_name : str
+        Full name of the module, e.g. 'matplotlib.pyplot'.
+    attribute : str
+        Name of a function or class of the module, for the equivalent of
+        `from module_name import attribute`.
+
+    Returns
+    -------
+    module or _LazyAttribute
+        Module loaded on first attribute access, or proxy of the attribute loaded
+        on first call or attribute access.
+    """
+    if attribute is not None:
+        return _LazyAttribute(module_name, attribute)
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    return _LazyModule(module_name)
+
+
+class _LazyModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        module = importlib.import_module(self.__name__)
+        # Later lookups find the attributes directly
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+
+class _LazyAttribute:
+    def __init__(self, module_name, attribute):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._module_name), self._attribute)
+        return self._target
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
@@ -0,0 +1,145 @@
+import math
+import numpy as np
+from Recipes.utils.sliding_window import sliding_z_filter
+
+"""
+Grey-level morphology with disks (2D images) and balls (3D images), decomposed into
+lines.
+
+skimage's dilation and erosion visit every pixel of the footprint: the cost grows with
+the area of a disk or the volume of a ball (r^2 or r^3). Here the footprint, all
+offsets d with sum(d^2) <= r^2 as in skimage's disk(r) and ball(r), is split into
+chords along the last axis. For each chord half-width w, the offsets with a chord of
+at least w form a smaller disk (or 1D segment) of squared radius r^2 - w^2 on the
+other axes, so that:
+    dilation(image, ball(r)) = max over w of dilation(line_w(image), ball(r^2 - w^2))
+where line_w is the running maximum over 2w + 1 pixels of the last axis. The lines are
+widened one pixel at a time (two comparisons per pixel and width) and the remaining
+segments use the van Herk / Gil-Werman running maximum of sliding_window.py (constant
+time per pixel). The cost grows linearly with the radius in 2D, as r^2 in 3D.
+
+Windows are clipped at the image borders, which gives the same results as skimage's
+default mode ('reflect') for these symmetric, convex footprints.
+
+dilations() and erosions() compute several radii at once, sharing the widened lines
+(e.g. the texture stack of MorphologicalTexture for several sizes).
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+
+def footprint(radius, ndim):
+    """Disk (ndim = 2) or ball (ndim = 3) of the given radius, as skimage's disk / ball."""
+    offsets = np.ogrid[(slice(-radius, radius + 1),) * ndim]
+    return (sum(offset ** 2 for offset in offsets) <= radius ** 2).astype(np.uint8)
+
+
+def dilation(image, radius):
+    """Grey-level dilation by a disk (2D) or ball (3D) of the given radius."""
+    return dilations(image, [radius])[0]
+
+
+def erosion(image, radius):
+    """Grey-level erosion by a disk (2D) or ball (3D) of the given radius."""
+    return erosions(image, [radius])[0]
+
+
+def closing(image, radius):
+    """Grey-level closing by a disk (2D) or ball (3D), as skimage.morphology.closing."""
+    return erosion(dilation(image, radius), radius)
+
+
+def opening(image, radius):
+    """Grey-level opening by a disk (2D) or ball (3D), as skimage.morphology.opening."""
+    return dilation(erosion(image, radius), radius)
+
+
+def dilations(image, radii):
+    """
+    Dilations of an image by disks (2D) or balls (3D) of several radii.
+
+    Parameters
+    ----------
+    image : ndarray
+        2D or 3D image (booleans are processed as uint8).
+    radii : list of int
+        Radii of the footprints.
+
+    Returns
+    -------
+    list of ndarray
+        Dilated images, of the input type, in the order of radii.
+    """
+    return _extremes_of(image, radii, 'max')
+
+
+def erosions(image, radii):
+    """Erosions of an image by disks (2D) or balls (3D) of several radii, see dilations()."""
+    return _extremes_of(image, radii, 'min')
+
+
+def _extremes_of(image, radii, operation):
+    image = np.asarray(image)
+    if any(radius < 0 for radius in radii):
+        raise ValueError('Radii must be positive')
+    work = image.view(np.uint8) if image.dtype == bool else image
+    results = _extremes(work, [int(radius) ** 2 for radius in radii], tuple(range(image.ndim)), operation)
+    return [np.ascontiguousarray(result).view(image.dtype) for result in results]
+
+
+def _extremes(image, squared_radii, axes, operation):
+    # Extremes over the discrete balls {sum(d^2) <= r2} on the given axes, for each r2
+    axis = axes[-1]
+    if len(axes) == 1:
+        return [_segment_extreme(image, math.isqrt(r2), axis, operation) for r2 in squared_radii]
+
+    ufunc = np.maximum if operation == 'max' else np.minimum
+    norms = _squared_norms(len(axes) - 1, max(squared_radii))
+    widths = [{math.isqrt(r2 - norm) for norm in norms if norm <= r2} for r2 in squared_radii]
+    results = [None] * len(squared_radii)
+    line = image
+    for width in range(max(max(w) for w in widths) + 1):
+        if width:
+            line = _widen(line, axis, ufunc)
+        # Radii with chords of this half-width: the rest of their footprint is a smaller
+        # ball on the other axes, shared by radii giving the same squared radius
+        users = [k for k, w in enumerate(widths) if width in w]
+        if not users:
+            continue
+        remaining = sorted({squared_radii[k] - width ** 2 for k in users})
+        parts = dict(zip(remaining, _extremes(line, remaining, axes[:-1], operation)))
+        shared = len(remaining) < len(users)
+        for k in users:
+            part = parts[squared_radii[k] - width ** 2]
+            if results[k] is None:
+                results[k] = part.copy() if shared else part
+            else:
+                ufunc(results[k], part, out=results[k])
+    return results
+
+
+def _squared_norms(ndim, max_norm):
+    # Sums of ndim squares up to max_norm
+    squares = np.arange(math.isqrt(max_norm) + 1) ** 2
+    norms = np.zeros(1, dtype=np.int64)
+    for _ in range(ndim):
+        norms = np.unique((norms[:, np.newaxis] + squares).ravel())
+        norms = norms[norms <= max_norm]
+    return norms
+
+
+def _widen(line, axis, ufunc):
+    # Running extreme over one more pixel on each side along axis
+    lower = (slice(None),) * axis + (slice(None, -1),)
+    upper = (slice(None),) * axis + (slice(1, None),)
+    result = line.copy()
+    ufunc(result[upper], line[lower], out=result[upper])
+    ufunc(result[lower], line[upper], out=result[lower])
+    return result
+
+
+def _segment_extreme(image, half_width, axis, operation):
+    moved = np.moveaxis(image, axis, 0)
+    return np.moveaxis(sliding_z_filter(moved, half_width, half_width, operation), 0, axis)
@@ -0,0 +1,182 @@
+import ast
+from functools import partial
+import numpy as np
+
+"""
+Point operations (intensity mappings) of 8 and 16-bit images through lookup tables.
+
+A point operation gives every pixel a value depending only on its own value: for
+uint8 and uint16 images it is a lookup table of the 256 or 65536 values of the type,
+computed once with the operation itself (same float type, rounding and saturation as
+the operation applied to the image) and applied with np.take, one plane at a time,
+in the image's type: results are identical without any float copy of the image, and
+planes are read from memory-mapped or TiffPages images as they are mapped. Other
+types apply the operation to each plane.
+
+gamma_curve(), sigmoid_curve(), log_curve() and window_level() are the point
+operations of skimage.exposure.adjust_gamma, adjust_sigmoid, adjust_log and of a
+rescaling of a window of values to the type's range: their tables are these functions
+applied to the values of the type, identical to the functions applied to the image
+(which convert it to float64 first).
+
+compile_expression() turns a formula of the pixel value x, e.g. "(x - 100) * 1.5",
+into a point operation. Only numbers, x, arithmetic operators and a few numpy
+functions are accepted; the formula is checked once and evaluated in float32.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+scikit-image (comes with Aivia installer)
+"""
+
+LUT_TYPES = (np.uint8, np.uint16)
+EXPRESSION_FUNCTIONS = {'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log2': np.log2,
+                        'log10': np.log10, 'floor': np.floor, 'ceil': np.ceil, 'round': np.round,
+                        'minimum': np.minimum, 'maximum': np.maximum, 'clip': np.clip}
+_EXPRESSION_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+                     ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd)
+
+
+def has_lut(dtype):
+    """True for the types whose point operations are lookup tables."""
+    return np.dtype(dtype).type in LUT_TYPES
+
+
+def value_lut(func, dtype):
+    """
+    Lookup table of a point operation for a uint8 or uint16 image.
+
+    Parameters
+    ----------
+    func : callable
+        Point operation, taking and returning an array (of any types).
+    dtype : numpy dtype
+        Type of the images the table is applied to.
+
+    Returns
+    -------
+    ndarray
+        func of every value of the type, indexed by the value.
+    """
+    if not has_lut(dtype):
+        raise ValueError(f'Lookup tables are computed for uint8 and uint16 images, not {np.dtype(dtype)}')
+    return np.asarray(func(np.arange(np.iinfo(dtype).max + 1, dtype=dtype)))
+
+
+def map_planes(func, image_data, lut=None):
+    """
+    Applies a point operation to an image plane by plane.
+
+    Parameters
+    ----------
+    func : callable
+        Point operation, taking a 2D array and returning an array of the same shape.
+    image_data : array-like
+        Image of any dimension. May be a memory-mapped image or tiff_io.TiffPages.
+    lut : ndarray, optional
+        Lookup table of func (see value_lut()), computed for uint8 and uint16 images if
+        not given.
+
+    Yields
+    ------
+    ndarray
+        func of every YX plane, in file order.
+    """
+    if lut is None and has_lut(image_data.dtype):
+        lut = value_lut(func, image_data.dtype)
+    for index in np.ndindex(image_data.shape[:-2]):
+        plane = np.asarray(image_data[index])
+        yield func(plane) if lut is None else np.take(lut, plane)
+
+
+def apply_point_op(func, image_data, out=None):
+    """
+    Applies a point operation to an image, plane by plane.
+
+    Parameters
+    ----------
+    func : callable
+        Point operation, taking a 2D array and returning an array of the same shape.
+    image_data : array-like
+        Image of any dimension. May be a memory-mapped image or tiff_io.TiffPages.
+    out : ndarray, optional
+        Output of the image's shape (may be the image itself). Allocated with the type
+        of func's results if not given.
+
+    Returns
+    -------
+    ndarray
+        out
+    """
+    lut = value_lut(func, image_data.dtype) if has_lut(image_data.dtype) else None
+    for index, plane in zip(np.ndindex(image_data.shape[:-2]), map_planes(func, image_data, lut)):
+        if out is None:
+            out = np.empty(image_data.shape, dtype=plane.dtype)
+        out[index] = plane
+    return out
+
+
+def gamma_curve(gamma=1, gain=1):
+    """Point operation of skimage.exposure.adjust_gamma (O = gain * I^gamma)."""
+    from skimage.exposure import adjust_gamma
+    return partial(adjust_gamma, gamma=gamma, gain=gain)
+
+
+def sigmoid_curve(cutoff=0.5, gain=10, inv=False):
+    """Point operation of skimage.exposure.adjust_sigmoid (O = 1 / (1 + exp(gain * (cutoff - I))))."""
+    from skimage.exposure import adjust_sigmoid
+    return partial(adjust_sigmoid, cutoff=cutoff, gain=gain, inv=inv)
+
+
+def log_curve(gain=1, inv=False):
+    """Point operation of skimage.exposure.adjust_log (O = gain * log(1 + I))."""
+    from skimage.exposure import adjust_log
+    return partial(adjust_log, gain=gain, inv=inv)
+
+
+def window_level(window, level):
+    """
+    Point operation rescaling the values from level - window / 2 to level + window / 2
+    to the full range of an integer type (see histogram.rescale_to_range()).
+    """
+    from Recipes.utils.histogram import rescale_to_range
+    return partial(rescale_to_range, low=level - window / 2, high=level + window / 2)
+
+
+def compile_expression(expression):
+    """
+    Point operation of a formula of the pixel value x.
+
+    Parameters
+    ----------
+    expression : str
+        Formula, e.g. "(x - 100) * 1.5" or "sqrt(x) * 16". Numbers, x, the operators
+        + - * / // % ** and the functions of EXPRESSION_FUNCTIONS are accepted.
+
+    Returns
+    -------
+    callable
+        Function of an array, returning the formula of its values in float32.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as error:
+        raise ValueError(f'Invalid expression {expression!r}: {error.msg}') from None
+    for node in ast.walk(tree):
+        if not isinstance(node, _EXPRESSION_NODES):
+            raise ValueError(f'Invalid expression {expression!r}: {type(node).__name__} is not accepted')
+        if isinstance(node, ast.Name) and node.id != 'x' and node.id not in EXPRESSION_FUNCTIONS:
+            raise ValueError(f'Invalid expression {expression!r}: unknown name {node.id}')
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in EXPRESSION_FUNCTIONS):
+            raise ValueError(f'Invalid expression {expression!r}: only {", ".join(EXPRESSION_FUNCTIONS)} can be called')
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f'Invalid expression {expression!r}: {node.value!r} is not a number')
+    code = compile(tree, '<expression>', 'eval')
+
+    def evaluate(data):
+        x = np.asarray(data, dtype=np.float32)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            result = eval(code, {'__builtins__': {}}, dict(EXPRESSION_FUNCTIONS, x=x))
+        return np.broadcast_to(np.asarray(result, dtype=np.float32), x.shape)
+
+    return evaluate
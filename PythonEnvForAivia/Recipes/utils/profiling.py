@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import inspect
+import tempfile
+import functools
+import contextlib
+import tracemalloc
+from pathlib import Path
+
+"""
+Per-stage timing and memory instrumentation for the recipes.
+
+Decorating run(params) with @profiled and wrapping its steps in stage() blocks
+    @profiled
+    def run(params):
+        with stage('read'):
+            image_data = imread(image_location)
+        with stage('compute'):
+            ...
+records the wall time, CPU time and memory peak of every stage. At the end of the run
+a summary line is printed (it shows up in the Aivia log) and the whole record is
+appended as one JSON line to recipe_profile.jsonl, next to the Aivia log (the most
+recent %LOCALAPPDATA%/DRVision Technologies LLC/Aivia <version> folder), or in the
+AIVIA_RECIPE_PROFILE_DIR folder if set.
+
+Settings (environment variable AIVIA_RECIPE_PROFILE):
+    not set or 0     disabled: @profiled calls run(params) directly and stage() returns
+                     a shared no-op context manager
+    1                stage peaks are the process peak RSS at the end of each stage
+    tracemalloc      stage peaks are the peaks of memory allocated by Python and numpy
+                     during each stage (exact per stage, but slows allocations down)
+
+Requirements
+------------
+No extra package (standard library only)
+"""
+
+PROFILE_FILE_NAME = 'recipe_profile.jsonl'
+
+_active = None              # _RunRecord of the run being profiled
+_NO_STAGE = contextlib.nullcontext()
+
+
+def profiling_mode():
+    mode = os.environ.get('AIVIA_RECIPE_PROFILE', '')
+    return None if mode in ('', '0') else mode
+
+
+def profiled(run):
+    """
+    Decorator recording the timing and memory of a recipe's run(params) and of its stages.
+
+    The decorated function keeps the signature of run(params).
+    """
+    recipe = Path(inspect.unwrap(run).__globals__['__file__']).stem
+
+    @functools.wraps(run)
+    def wrapper(params):
+        global _active
+        mode = profiling_mode()
+        if mode is None or _active is not None:
+            return run(params)
+
+        _active = _RunRecord(recipe, use_tracemalloc=(mode == 'tracemalloc'))
+        status = 'ok'
+        try:
+            return run(params)
+        except BaseException as e:
+            status = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            record, _active = _active, None
+            record.finish(status, params)
+
+    return wrapper
+
+
+def stage(name):
+    """
+    Context manager timing a stage of the profiled run (no-op when profiling is disabled).
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, e.g. 'read', 'compute', 'convert' or 'write'. Nested stages
+        are recorded as 'parent/child'.
+    """
+    if _active is None:
+        return _NO_STAGE
+    return _active.stage(name)
+
+
+def peak_rss_mb():
+    """Peak resident memory of the current process in MB."""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / 1024 ** 2
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def profile_path():
+    folder = os.environ.get('AIVIA_RECIPE_PROFILE_DIR') or _aivia_log_dir() or tempfile.gettempdir()
+    return Path(folder) / PROFILE_FILE_NAME
+
+
+def _aivia_log_dir():
+    local_app_data = os.environ.get('LOCALAPPDATA')
+    if not local_app_data:
+        return None
+    base = Path(local_app_data) / 'DRVision Technologies LLC'
+    folders = sorted(base.glob('Aivia*'), key=os.path.getmtime) if base.is_dir() else []
+    return folders[-1] if folders else None
+
+
+class _RunRecord:
+    def __init__(self, recipe, use_tracemalloc=False):
+        self.recipe = recipe
+        self.use_tracemalloc = use_tracemalloc
+        self.started_tracemalloc = use_tracemalloc and not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start()
+        self.stages = []
+        self.open_stages = []       # [name, child peak] of the stages being timed
+        self.start_time = time.time()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def _memory_peak(self):
+        if self.use_tracemalloc:
+            return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        return peak_rss_mb()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.open_stages:
+            name = self.open_stages[-1][0] + '/' + name
+            if self.use_tracemalloc:
+                # The parent's peak so far would be lost by reset_peak()
+                self.open_stages[-1][1] = max(self.open_stages[-1][1], self._memory_peak())
+        self.open_stages.append([name, 0.0])
+        if self.use_tracemalloc:
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            _, child_peak = self.open_stages.pop()
+            peak = max(self._memory_peak(), child_peak)
+            if self.use_tracemalloc and self.open_stages:
+                self.open_stages[-1][1] = max(self.open_stages[-1][1], peak)
+            self.stages.append({'name': name, 'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4),
+                                'peak_mb': round(peak, 3)})
+
+    def finish(self, status, params):
+        wall, cpu = time.perf_counter() - self.wall_start, time.process_time() - self.cpu_start
+        record = {'recipe': self.recipe, 'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start_time)),
+                  'pid': os.getpid(), 'in_worker': bool(os.environ.get('AIVIA_IN_RECIPE_WORKER')),
+                  'status': status, 'TCount': params.get('TCount'), 'ZCount': params.get('ZCount'),
+                  'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4), 'peak_rss_mb': round(peak_rss_mb(), 1),
+                  'memory': 'tracemalloc' if self.use_tracemalloc else 'rss', 'stages': self.stages}
+        if self.use_tracemalloc:
+            # The peak is reset at the start of every stage
+            peaks = [self._memory_peak()] + [s['peak_mb'] for s in self.stages]
+            record['peak_alloc_mb'] = round(max(peaks), 1)
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+
+        stages = ', '.join(f"{s['name']} {s['wall_s']:.2f} s" for s in self.stages if '/' not in s['name'])
+        print(f"-- Profile {self.recipe}: {stages + ', ' if stages else ''}total {wall:.2f} s, "
+              f"peak RSS {record['peak_rss_mb']:.0f} MB --")
+        try:
+            with open(profile_path(), 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f'Could not write the profile to {profile_path()}: {e}')
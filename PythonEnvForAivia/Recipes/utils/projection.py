@@ -0,0 +1,245 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Single-pass projections along Z.
+
+ZProjector receives the Z planes of a stack one at a time and only keeps per-pixel
+accumulators (O(Y*X) memory whatever the number of slices), so that stacks opened
+with tiff_io.open_image are streamed from disk plane by plane. Any combination of
+projections is computed in the same pass:
+    max, min        maximum / minimum intensity, in the input type
+    argmax, argmin  first slice where the maximum / minimum is reached
+    sum, mean       sum (int64 or float64) and mean (float64)
+    std             standard deviation (float64, Welford's running variance)
+    edf             extended depth of field: value of the slice in best focus, the focus
+                    being the local energy of the Laplacian (argedf gives that slice)
+
+project_stack() runs a projector over every time point of a ZYX or TZYX image, and
+project_channels() over several channels at once (one thread per channel, each
+streaming its own file). composite_rgb() mixes projected channels into an RGB image
+with one colour per channel, in integer arithmetic and in the input type.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+scipy (installed with scikit-image), for the edf projection only
+"""
+
+PROJECTIONS = ('max', 'min', 'argmax', 'argmin', 'sum', 'mean', 'std', 'edf', 'argedf')
+FOCUS_SIZE = 9          # Size of the window over which the focus measure is averaged
+COLORS = {'red': (255, 0, 0), 'green': (0, 255, 0), 'blue': (0, 0, 255),
+          'cyan': (0, 255, 255), 'magenta': (255, 0, 255), 'yellow': (255, 255, 0),
+          'gray': (255, 255, 255)}
+
+
+class ZProjector:
+    """
+    Accumulates projections of the Z planes given to add().
+
+    Parameters
+    ----------
+    projections : iterable of str
+        Names of the projections to compute (see PROJECTIONS).
+    """
+
+    def __init__(self, projections):
+        self.projections = set(projections)
+        unknown = self.projections.difference(PROJECTIONS)
+        if unknown:
+            raise ValueError(f'Unknown projections {sorted(unknown)}, expected some of {PROJECTIONS}')
+        self.count = 0
+        self.maximum = self.minimum = self.argmax = self.argmin = None
+        self.sum = self.mean = self.m2 = None
+        self.focus = self.edf = self.argedf = None
+
+    def add(self, plane):
+        """Adds the next Z plane (2D array)."""
+        plane = np.asarray(plane)
+        z = self.count
+        self.count += 1
+        if z == 0:
+            self._start(plane)
+            return
+
+        wanted = self.projections
+        if wanted & {'max', 'argmax'}:
+            if 'argmax' in wanted:
+                self.argmax[plane > self.maximum] = z
+            np.maximum(self.maximum, plane, out=self.maximum)
+        if wanted & {'min', 'argmin'}:
+            if 'argmin' in wanted:
+                self.argmin[plane < self.minimum] = z
+            np.minimum(self.minimum, plane, out=self.minimum)
+        if 'sum' in wanted:
+            self.sum += plane
+        if wanted & {'mean', 'std'}:
+            delta = plane - self.mean
+            self.mean += delta / self.count
+            if 'std' in wanted:
+                self.m2 += delta * (plane - self.mean)
+        if wanted & {'edf', 'argedf'}:
+            focus = focus_measure(plane)
+            in_focus = focus > self.focus
+            self.focus[in_focus] = focus[in_focus]
+            self.edf[in_focus] = plane[in_focus]
+            self.argedf[in_focus] = z
+
+    def _start(self, plane):
+        wanted = self.projections
+        index_type = np.uint16
+        if wanted & {'max', 'argmax'}:
+            self.maximum = plane.copy()
+            self.argmax = np.zeros(plane.shape, dtype=index_type)
+        if wanted & {'min', 'argmin'}:
+            self.minimum = plane.copy()
+            self.argmin = np.zeros(plane.shape, dtype=index_type)
+        if 'sum' in wanted:
+            self.sum = plane.astype(np.float64 if plane.dtype.kind == 'f' else np.int64)
+        if wanted & {'mean', 'std'}:
+            self.mean = plane.astype(np.float64)
+            self.m2 = np.zeros(plane.shape, dtype=np.float64)
+        if wanted & {'edf', 'argedf'}:
+            self.focus = focus_measure(plane)
+            self.edf = plane.copy()
+            self.argedf = np.zeros(plane.shape, dtype=index_type)
+
+    def result(self, projection):
+        """Returns a projection of the planes added so far."""
+        if projection not in self.projections:
+            raise ValueError(f'{projection} was not computed')
+        if self.count == 0:
+            raise ValueError('No plane was added')
+        if projection == 'std':
+            return np.sqrt(self.m2 / self.count)
+        return {'max': self.maximum, 'min': self.minimum, 'argmax': self.argmax, 'argmin': self.argmin,
+                'sum': self.sum, 'mean': self.mean, 'edf': self.edf, 'argedf': self.argedf}[projection]
+
+
+def focus_measure(plane, size=FOCUS_SIZE):
+    """Local energy of the Laplacian of a plane, averaged over size x size pixels."""
+    from scipy import ndimage
+    laplacian = ndimage.laplace(np.asarray(plane, dtype=np.float32))
+    return ndimage.uniform_filter(laplacian * laplacian, size=size)
+
+
+def project_stack(image_data, projections, tCount=1):
+    """
+    Projects a ZYX or TZYX image along Z, reading one plane at a time.
+
+    Parameters
+    ----------
+    image_data : array-like
+        ZYX image, or TZYX image if tCount > 1. May be a memory-mapped image.
+    projections : iterable of str
+        Names of the projections to compute (see PROJECTIONS).
+    tCount : int
+        Number of time points.
+
+    Returns
+    -------
+    dict
+        Projection name: YX array, or TYX array if tCount > 1.
+    """
+    frames = range(image_data.shape[0]) if tCount > 1 else [None]
+    results = {projection: [] for projection in projections}
+    for t in frames:
+        stack = image_data if t is None else image_data[t]
+        projector = ZProjector(projections)
+        for z in range(stack.shape[0]):
+            projector.add(stack[z])
+        for projection in projections:
+            results[projection].append(projector.result(projection))
+
+    if tCount > 1:
+        return {projection: np.stack(planes) for projection, planes in results.items()}
+    return {projection: planes[0] for projection, planes in results.items()}
+
+
+def project_channels(channels, projection='max', tCount=1):
+    """
+    Projects several ZYX or TZYX channels of the same shape along Z, reading the
+    channels concurrently, one plane at a time.
+
+    Parameters
+    ----------
+    channels : list of array-like
+        Channels, e.g. memory-mapped images from tiff_io.open_image.
+    projection : str
+        Name of the projection (see PROJECTIONS), 'max' by default.
+    tCount : int
+        Number of time points.
+
+    Returns
+    -------
+    ndarray
+        CYX array, or TCYX array if tCount > 1, of the type of the projection.
+    """
+    shapes = {tuple(channel.shape) for channel in channels}
+    if len(shapes) != 1:
+        raise ValueError(f'Channels must have the same shape, got {sorted(shapes)}')
+    shape = shapes.pop()
+    frame_count = shape[0] if tCount > 1 else 1
+    out = None
+
+    def project(c, t):
+        stack = channels[c] if tCount == 1 else channels[c][t]
+        projector = ZProjector([projection])
+        for z in range(stack.shape[0]):
+            projector.add(stack[z])
+        return projector.result(projection)
+
+    with ThreadPoolExecutor(max_workers=len(channels)) as executor:
+        for t in range(frame_count):
+            results = executor.map(project, range(len(channels)), [t] * len(channels))
+            for c, result in enumerate(results):
+                if out is None:
+                    out = np.empty((frame_count, len(channels)) + result.shape, dtype=result.dtype)
+                out[t, c] = result
+
+    return out if tCount > 1 else out[0]
+
+
+def composite_rgb(projections, colors, out=None):
+    """
+    Mixes channels into an RGB image, each channel being displayed with a colour LUT
+    (black to the channel's colour) and the LUTs added up, as in a multi-channel display.
+
+    Parameters
+    ----------
+    projections : ndarray
+        Unsigned integer channels, on axis -3 (CYX or TCYX).
+    colors : list
+        Colour of each channel: name from COLORS or (R, G, B) values from 0 to 255.
+    out : ndarray, optional
+        Output array with 3 channels (red, green, blue) on axis -3, of the type of the
+        projections. Sums over the maximum of the type are clipped.
+
+    Returns
+    -------
+    ndarray
+        RGB image.
+    """
+    if projections.dtype.kind != 'u':
+        raise ValueError(f'Cannot make a colour composite of {projections.dtype} images.')
+    if len(colors) != projections.shape[-3]:
+        raise ValueError(f'Expected {projections.shape[-3]} colours, got {len(colors)}')
+    weights = np.array([COLORS[color] if isinstance(color, str) else color for color in colors],
+                       dtype=np.int64)
+    if out is None:
+        out = np.empty(projections.shape[:-3] + (3,) + projections.shape[-2:], dtype=projections.dtype)
+    imax = np.iinfo(projections.dtype).max
+
+    # One time point and one component at a time: the temporaries are the size of a plane
+    for index in np.ndindex(projections.shape[:-3]):
+        frame, frame_out = projections[index], out[index]
+        for component in range(3):
+            total = np.zeros(frame.shape[-2:], dtype=np.int64)
+            for channel, weight in zip(frame, weights[:, component]):
+                if weight == 255:
+                    total += channel
+                elif weight:
+                    total += (channel.astype(np.int64) * weight + 127) // 255
+            np.minimum(total, imax, out=total)
+            frame_out[component] = total
+    return out
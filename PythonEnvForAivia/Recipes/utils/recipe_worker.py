@@ -0,0 +1,347 @@
+import os
+import sys
+import io
+import json
+import time
+import signal
+import secrets
+import tempfile
+import importlib.util
+import subprocess
+import traceback
+import threading
+import contextlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+"""
+Opt-in long-lived worker process that runs recipes without paying interpreter,
+virtual environment and import start-up on every call.
+
+Setting the AIVIA_RECIPE_WORKER environment variable to 1 makes the recipes that
+support it forward run(params) to the worker (see submit()). The worker is started on
+first use, listens on 127.0.0.1 (port AIVIA_RECIPE_WORKER_PORT, 6001 by default), has
+the heavy modules already imported and keeps recipe modules loaded between calls
+(they are reloaded when the file changes).
+
+Only headless recipes may forward their runs: in the worker they run on a background
+thread of a detached process without a console, where GUI toolkits (magicgui / Qt, wx)
+cannot show dialogs, and module-level dialogs would be shown again when the worker
+loads the recipe. Recipes asking the user for input keep running in their own process.
+
+Runs are executed one at a time, in order of submission, while pings are answered by
+another thread: a worker running a recipe reports itself busy, and the submitted run
+waits for its turn. The client pings the worker before each submission and only
+starts a new one if none is running (no key file, or the connection is refused). A
+worker that dies during a run is restarted and the run is submitted once more. A run
+that does not finish within AIVIA_RECIPE_WORKER_TIMEOUT seconds (3600 by default,
+waiting for the previous runs included) stops the worker and fails. The worker also
+exits by itself after AIVIA_RECIPE_WORKER_MAX_RUNS runs (100 by default) to release
+leaked memory.
+
+The worker's address, pid and authentication key are in a key file of the temporary
+folder, readable by the current user only. A worker is only ever stopped after
+checking that its pid is still the process that wrote the key file.
+
+The worker can be started by hand (to see its log) or stopped:
+    python recipe_worker.py
+    python recipe_worker.py --stop
+
+Requirements
+------------
+No extra package (standard library only)
+"""
+
+PRELOADED_MODULES = ['numpy', 'tifffile', 'scipy.ndimage', 'skimage.io', 'skimage.filters',
+                     'skimage.morphology', 'skimage.transform', 'skimage.exposure', 'matplotlib.pyplot']
+
+PING_TIMEOUT = 5
+START_TIMEOUT = 60
+DEFAULT_RUN_TIMEOUT = 3600
+
+
+def worker_enabled():
+    """True when run(params) should be forwarded to the worker (never inside the worker)."""
+    return os.environ.get('AIVIA_RECIPE_WORKER') == '1' and not os.environ.get('AIVIA_IN_RECIPE_WORKER')
+
+
+def run_timeout():
+    return float(os.environ.get('AIVIA_RECIPE_WORKER_TIMEOUT', DEFAULT_RUN_TIMEOUT))
+
+
+def _address():
+    return '127.0.0.1', int(os.environ.get('AIVIA_RECIPE_WORKER_PORT', 6001))
+
+
+def _key_path():
+    return Path(tempfile.gettempdir()) / f'aivia_recipe_worker_{_address()[1]}.key'
+
+
+def _read_key_file():
+    # {"pid", "start", "key"} written by the running worker
+    try:
+        content = json.loads(_key_path().read_text())
+        return int(content['pid']), bytes.fromhex(content['key']), content['start']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None, None
+
+
+def _write_key_file(key):
+    path = _key_path()
+    # Left by a worker that did not exit cleanly: this one holds the port now
+    path.unlink(missing_ok=True)
+    # Created readable by the current user only, and never through an existing file
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'pid': os.getpid(), 'start': _process_start(os.getpid()), 'key': key.hex()}, f)
+
+
+def _process_start(pid):
+    # Start time of a running process (None if not found), telling a worker from a later
+    # process with the same pid
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)     # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return None
+        try:
+            times = [wintypes.FILETIME() for _ in range(4)]
+            if not kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+                return None
+            return (times[0].dwHighDateTime << 32) | times[0].dwLowDateTime
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        # Linux: clock ticks since boot (field 22 of /proc/<pid>/stat, after the command name)
+        return int(Path(f'/proc/{pid}/stat').read_text().rsplit(')', 1)[1].split()[19])
+    except FileNotFoundError:
+        if Path('/proc/self/stat').exists():
+            return None
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        started = subprocess.run(['ps', '-o', 'lstart=', '-p', str(pid)], capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    return started.strip() or None
+
+
+def _request(message, timeout=None):
+    _, key, _ = _read_key_file()
+    if key is None:
+        raise ConnectionError('No recipe worker is running')
+
+    # In a thread, as the connection itself (authentication) waits for the worker
+    answer = []
+
+    def exchange():
+        try:
+            with Client(_address(), authkey=key) as connection:
+                connection.send(message)
+                answer.append((True, connection.recv()))
+        except BaseException as e:
+            answer.append((False, e))
+
+    thread = threading.Thread(target=exchange, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if not answer:
+        raise TimeoutError('Recipe worker did not answer')
+    succeeded, value = answer[0]
+    if not succeeded:
+        raise value
+    return value
+
+
+def worker_status():
+    """
+    Health check of the worker: 'ready', 'busy' (running or queuing recipes),
+    'unresponsive' (no answer within PING_TIMEOUT seconds) or None if no worker is
+    running.
+    """
+    try:
+        answer = _request(('ping',), timeout=PING_TIMEOUT)
+    except TimeoutError:
+        return 'unresponsive'
+    except (OSError, EOFError, ConnectionError):
+        return None
+    if answer[0] != 'pong':
+        return None
+    return 'busy' if len(answer) > 2 and answer[2] else 'ready'
+
+
+def ping():
+    """Health check: True if a worker answers within PING_TIMEOUT seconds."""
+    return worker_status() in ('ready', 'busy')
+
+
+def _kill_stale_worker():
+    pid, _, start = _read_key_file()
+    if pid is not None:
+        # Not a later process reusing the pid of a worker that exited
+        if start is not None and _process_start(pid) == start:
+            with contextlib.suppress(OSError):
+                os.kill(pid, signal.SIGTERM)
+        _key_path().unlink(missing_ok=True)
+
+
+def start_worker():
+    """Starts a detached worker with the current interpreter and waits until it answers."""
+    # Key file of a worker that did not exit cleanly (killed if it is somehow still running)
+    _kill_stale_worker()
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen([sys.executable, str(Path(__file__).resolve())],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if ping():
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f'Recipe worker did not start within {START_TIMEOUT} s')
+
+
+def stop_worker():
+    try:
+        _request(('shutdown',), timeout=PING_TIMEOUT)
+    except (OSError, EOFError, TimeoutError, ConnectionError):
+        pass
+
+
+def submit(recipe_path, params):
+    """
+    Runs a recipe's run(params) in the worker, starting or restarting it if needed.
+
+    Parameters
+    ----------
+    recipe_path : str
+        Path of the recipe file (usually __file__).
+    params : dict
+        Parameters given by Aivia.
+
+    Returns
+    -------
+    object
+        Return value of run(params). The recipe's printed output is printed here.
+    """
+    recipe_path = str(Path(recipe_path).resolve())
+    for attempt in range(2):
+        # A busy worker runs the recipe after the current ones. An unresponsive one is
+        # given the same chance, as a long computation may hold the interpreter.
+        if worker_status() is None:
+            start_worker()
+        try:
+            status, output, result = _request(('run', recipe_path, params), timeout=run_timeout())
+        except TimeoutError:
+            _kill_stale_worker()
+            raise RuntimeError(f'Recipe worker did not finish the run within {run_timeout():g} s, it was stopped') from None
+        except (OSError, EOFError) as e:
+            # Worker died during the run
+            print(f'Recipe worker failed ({e}), restarting it')
+            continue
+        print(output, end='')
+        if status == 'error':
+            raise RuntimeError(f'Recipe failed in worker:\n{result}')
+        return result
+    raise RuntimeError('Recipe worker failed twice')
+
+
+class _Worker:
+    def __init__(self):
+        self.modules = {}
+
+    def load(self, recipe_path):
+        mtime = os.path.getmtime(recipe_path)
+        cached = self.modules.get(recipe_path)
+        if cached is None or cached[0] != mtime:
+            name = 'recipe_' + Path(recipe_path).stem
+            spec = importlib.util.spec_from_file_location(name, recipe_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            self.modules[recipe_path] = (mtime, module)
+        return self.modules[recipe_path][1]
+
+    def run(self, recipe_path, params):
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                result = self.load(recipe_path).run(params)
+            return 'ok', output.getvalue(), result
+        except BaseException:
+            return 'error', output.getvalue(), traceback.format_exc()
+
+    def answer(self, connection, recipe_path, params):
+        with connection:
+            # The client may have given up waiting
+            with contextlib.suppress(OSError):
+                connection.send(self.run(recipe_path, params))
+
+
+def _activate_environment():
+    # Same search as the recipes' virtual environment activation
+    for i in range(5):
+        activate_path = str(Path(__file__).resolve().parents[i]) + '\\env\\Scripts\\activate_this.py'
+        if os.path.exists(activate_path):
+            exec(open(activate_path).read(), {'__file__': activate_path})
+            return
+
+
+def serve():
+    os.environ['AIVIA_IN_RECIPE_WORKER'] = '1'
+    _activate_environment()
+    for module_name in PRELOADED_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+
+    key = secrets.token_bytes(32)
+    max_runs = int(os.environ.get('AIVIA_RECIPE_WORKER_MAX_RUNS', 100))
+    worker = _Worker()
+    # Runs one at a time in order, pings are answered meanwhile
+    runner = ThreadPoolExecutor(max_workers=1)
+    pending = []
+    runs = 0
+    with Listener(_address(), authkey=key) as listener:
+        _write_key_file(key)
+        print(f'Recipe worker listening on {listener.address}')
+        try:
+            while runs < max_runs:
+                try:
+                    connection = listener.accept()
+                except Exception:
+                    # Failed authentication or aborted connection
+                    continue
+                try:
+                    message = connection.recv() if connection.poll(PING_TIMEOUT) else None
+                except (OSError, EOFError):
+                    message = None
+                if message is None or message[0] != 'run':
+                    with connection:
+                        if message is not None and message[0] == 'ping':
+                            pending = [run for run in pending if not run.done()]
+                            connection.send(('pong', os.getpid(), len(pending)))
+                        elif message is not None and message[0] == 'shutdown':
+                            connection.send(('bye',))
+                            break
+                else:
+                    pending.append(runner.submit(worker.answer, connection, message[1], message[2]))
+                    runs += 1
+        finally:
+            _key_path().unlink(missing_ok=True)
+    # Runs already submitted are finished (a new worker may start meanwhile)
+    runner.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    if '--stop' in sys.argv:
+        stop_worker()
+    else:
+        serve()
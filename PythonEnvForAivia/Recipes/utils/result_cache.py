@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import functools
+from pathlib import Path
+
+"""
+Opt-in content-addressed cache for recipe outputs.
+
+When a workflow is re-run after changing one step, most recipes get the same input
+pixels and parameters as before. Decorating run(params) with @cached_run looks up a
+key made of:
+    - the pixel data of every input file (TIFF page data, not the file path or tags),
+    - the other parameters, normalized (3, '3' and '3.0' are the same value),
+    - the code of the recipe and of the shared utilities.
+Output paths (parameters whose name contains 'result' or 'output') are not part of
+the key. On a hit the outputs are copied from the cache instead of being recomputed
+(never hard-linked: a later run writing to the same path, with or without the cache,
+would then rewrite the cached entry).
+
+Settings (environment variables):
+    AIVIA_RECIPE_CACHE=1        enables the cache
+    AIVIA_RECIPE_CACHE_DIR      cache folder, <temp folder>/aivia_recipe_cache by default
+    AIVIA_RECIPE_CACHE_MB       size of the cache, 2048 MB by default. The least
+                                recently used results are evicted first.
+
+Hit/miss statistics are kept in the cache folder:
+    python result_cache.py            prints the statistics
+    python result_cache.py --clear    empties the cache
+
+Only recipes whose outputs only depend on their inputs and parameters should use the
+cache (no random numbers, dialogs or external programs). Recipes with such a mode, e.g.
+one writing an extra image next to the result and opening it in Aivia, decorate run with
+@cached_run(bypass=...): runs for which bypass(params) is true are never cached.
+
+Requirements
+------------
+tifffile (comes with Aivia installer)
+"""
+
+CACHE_VERSION = 1
+IGNORED_PARAMS = ['CallingExecutable', 'EntryPoint']
+DEFAULT_CACHE_MB = 2048
+
+
+def cache_enabled():
+    return os.environ.get('AIVIA_RECIPE_CACHE') == '1'
+
+
+def cache_dir():
+    return Path(os.environ.get('AIVIA_RECIPE_CACHE_DIR', Path(tempfile.gettempdir()) / 'aivia_recipe_cache'))
+
+
+def cache_size_limit():
+    return int(float(os.environ.get('AIVIA_RECIPE_CACHE_MB', DEFAULT_CACHE_MB)) * 1024 ** 2)
+
+
+def is_output_param(name):
+    name = name.lower()
+    return 'result' in name or 'output' in name
+
+
+def cached_run(run=None, bypass=None):
+    """
+    Decorator adding the result cache to a recipe's run(params).
+
+    The decorated function keeps the signature of run(params) and behaves exactly like
+    it when the cache is disabled. Recipes loaded in the recipe worker get run(params)
+    back undecorated.
+
+    Parameters
+    ----------
+    run : callable
+        run(params) of the recipe. Omitted when the decorator is given a bypass:
+        @cached_run(bypass=...).
+    bypass : callable, optional
+        Function of the parameters, true for the runs that must not be cached (outputs
+        not given as parameters, external programs).
+    """
+    if run is None:
+        return functools.partial(cached_run, bypass=bypass)
+    if os.environ.get('AIVIA_IN_RECIPE_WORKER'):
+        # Runs forwarded to the recipe worker were already looked up (and are stored) by the client
+        return run
+    recipe_path = os.path.abspath(run.__globals__['__file__'])
+
+    @functools.wraps(run)
+    def wrapper(params):
+        if not cache_enabled() or (bypass is not None and bypass(params)):
+            return run(params)
+
+        key = cache_key(recipe_path, params)
+        if key is None:
+            return run(params)
+
+        entry = cache_dir() / key
+        if _restore(entry, params):
+            _count('hits')
+            print(f'-- Result cache hit ({key[:12]}), outputs restored --')
+            return json.loads((entry / 'entry.json').read_text())['result']
+
+        _count('misses')
+        result = run(params)
+        _store(entry, recipe_path, params, result)
+        return result
+
+    return wrapper
+
+
+def cache_key(recipe_path, params):
+    """
+    Computes the cache key of a run.
+
+    Parameters
+    ----------
+    recipe_path : str
+        Path of the recipe file.
+    params : dict
+        Parameters given by Aivia.
+
+    Returns
+    -------
+    str or None
+        Hexadecimal key, None if the run cannot be cached (folder given as input).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'v{CACHE_VERSION}\n'.encode())
+    h.update(_code_hash(recipe_path))
+
+    for name in sorted(params):
+        if is_output_param(name) or name in IGNORED_PARAMS:
+            continue
+        value = params[name]
+        if isinstance(value, str) and os.path.isdir(value):
+            return None
+        if isinstance(value, str) and os.path.isfile(value):
+            h.update(f'{name}=<file>\n'.encode())
+            h.update(file_data_hash(value))
+        else:
+            h.update(f'{name}={_normalize(value)}\n'.encode())
+    return h.hexdigest()
+
+
+def file_data_hash(path):
+    """Hash of the pixel data of a TIFF file (whole content for other files)."""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        import tifffile
+        with tifffile.TiffFile(path) as tif:
+            series = tif.series[0]
+            h.update(f'{series.shape} {series.dtype} {series.axes}\n'.encode())
+            fh = tif.filehandle
+            for page in tif.pages:
+                h.update(f'{page.shape} {page.compression} {page.predictor}\n'.encode())
+                for offset, count in zip(page.dataoffsets, page.databytecounts):
+                    fh.seek(offset)
+                    h.update(fh.read(count))
+        return h.digest()
+    except Exception:
+        # Not a TIFF file (or not readable by tifffile)
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.digest()
+
+
+def _normalize(value):
+    text = str(value).strip()
+    try:
+        return repr(float(text))
+    except ValueError:
+        return text
+
+
+@functools.lru_cache(maxsize=None)
+def _code_hash(recipe_path):
+    h = hashlib.blake2b(digest_size=16)
+    for path in [Path(recipe_path)] + sorted(Path(__file__).parent.glob('*.py')):
+        h.update(path.read_bytes())
+    return h.digest()
+
+
+def _output_names(params):
+    return [name for name in sorted(params)
+            if is_output_param(name) and isinstance(params[name], str) and params[name]]
+
+
+def _restore(entry, params):
+    try:
+        outputs = json.loads((entry / 'entry.json').read_text())['outputs']
+    except (OSError, ValueError, KeyError):
+        return False
+    if set(outputs) != set(_output_names(params)):
+        return False
+
+    for name, file_name in outputs.items():
+        destination = params[name]
+        if file_name is None:
+            continue
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        if os.path.lexists(destination):
+            # Replaced rather than written into, in case it is a link to another file
+            os.remove(destination)
+        shutil.copyfile(entry / file_name, destination)
+
+    # Least recently used entries are evicted first
+    os.utime(entry / 'entry.json')
+    return True
+
+
+def _store(entry, recipe_path, params, result):
+    try:
+        result_text = json.dumps(result)
+    except TypeError:
+        return
+
+    outputs = {}
+    for name in _output_names(params):
+        path = params[name]
+        # Outputs the recipe did not write are not restored either
+        outputs[name] = name + Path(path).suffix if os.path.isfile(path) else None
+    if not any(outputs.values()):
+        # Failed run (e.g. missing input)
+        return
+    size = sum(os.path.getsize(params[n]) for n, f in outputs.items() if f is not None)
+    if size > cache_size_limit():
+        return
+
+    root = cache_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    temp_entry = Path(tempfile.mkdtemp(dir=root, prefix='.tmp_'))
+    try:
+        for name, file_name in outputs.items():
+            if file_name is not None:
+                shutil.copyfile(params[name], temp_entry / file_name)
+        (temp_entry / 'entry.json').write_text(json.dumps(
+            {'recipe': Path(recipe_path).stem, 'outputs': outputs, 'result': json.loads(result_text),
+             'size': size, 'created': time.time()}))
+        if entry.exists():
+            shutil.rmtree(entry, ignore_errors=True)
+        os.replace(temp_entry, entry)
+    except OSError:
+        shutil.rmtree(temp_entry, ignore_errors=True)
+        return
+    _evict(root)
+
+
+def _evict(root):
+    entries = []
+    for entry_file in root.glob('*/entry.json'):
+        try:
+            size = json.loads(entry_file.read_text())['size']
+            entries.append((entry_file.stat().st_mtime, size, entry_file.parent))
+        except (OSError, ValueError, KeyError):
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    limit = cache_size_limit()
+    evicted = 0
+    for _, size, entry in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        evicted += 1
+    if evicted:
+        _count('evictions', evicted)
+
+
+def _count(name, increment=1):
+    stats_path = cache_dir() / 'stats.json'
+    stats = cache_stats()
+    stats[name] = stats.get(name, 0) + increment
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = stats_path.with_name(f'stats_{os.getpid()}.tmp')
+    temp_path.write_text(json.dumps(stats))
+    os.replace(temp_path, stats_path)
+
+
+def cache_stats():
+    """
+    Returns the statistics of the cache: hits, misses and evictions since it was
+    created or cleared (approximate when several recipes run in parallel).
+    """
+    try:
+        return json.loads((cache_dir() / 'stats.json').read_text())
+    except (OSError, ValueError):
+        return {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def clear_cache():
+    shutil.rmtree(cache_dir(), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if '--clear' in sys.argv:
+        clear_cache()
+        print(f'Cleared {cache_dir()}')
+    else:
+        stats = cache_stats()
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        entries = list(cache_dir().glob('*/entry.json'))
+        size = sum(json.loads(p.read_text()).get('size', 0) for p in entries)
+        print(f'Cache folder: {cache_dir()}')
+        print(f'Entries: {len(entries)} ({size / 1024 ** 2:.1f} MB of {cache_size_limit() / 1024 ** 2:.0f} MB)')
+        print(f"Hits: {stats.get('hits', 0)}, misses: {stats.get('misses', 0)}, "
+              f"evictions: {stats.get('evictions', 0)}"
+              + (f" (hit rate {stats.get('hits', 0) / lookups:.0%})" if lookups else ''))
@@ -0,0 +1,172 @@
+import numpy as np
+
+"""
+Sliding-window filters along Z: running max, min, sum, mean and median.
+
+For every slice i, the window covers the slices i - before to i + after (clipped to the
+stack), e.g. MaxSlices uses before = width // 2 and after = width // 2 - 1.
+
+Max and min use the van Herk / Gil-Werman algorithm: the stack is split into blocks of
+the window length, running maxima are accumulated forwards and backwards within each
+block, and every window is the maximum of one backward and one forward value. This is
+three comparisons per voxel whatever the window width, instead of one per slice of
+the window (still used for windows of less than SHIFT_WINDOW slices, where it is
+faster). Sum and mean are differences of cumulative sums (constant time per voxel
+as well). The median has no constant time equivalent: it is computed with one
+partition per window.
+
+Stacks are processed in blocks of rows so that temporaries stay small, and 3D+T
+images one time point at a time. With step > 1, only every step-th slice is computed
+and written ("thick slab" output, e.g. step = width for non-overlapping slabs).
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+OPERATIONS = ('max', 'min', 'sum', 'mean', 'median')
+BLOCK_BYTES = 64 * 1024 ** 2        # Size of the temporaries of a block of rows
+SHIFT_WINDOW = 8                    # Smaller max / min windows are computed directly
+
+
+def output_slices(z_count, step=1):
+    """Indices of the slices computed for a stack of z_count slices."""
+    return range(0, z_count, step)
+
+
+def sliding_z_filter(image_data, before, after, operation='max', tCount=1, step=1, out=None):
+    """
+    Applies a sliding-window filter along Z.
+
+    Parameters
+    ----------
+    image_data : array-like
+        ZYX image, or TZYX image if tCount > 1. May be a memory-mapped image.
+    before, after : int
+        Number of slices before and after each slice in its window.
+    operation : str
+        'max', 'min', 'sum', 'mean' or 'median'. Sums are clipped to the range of integer
+        types, means and medians are rounded to the nearest integer for integer types.
+    tCount : int
+        Number of time points.
+    step : int
+        Only compute every step-th slice (1 = all slices).
+    out : ndarray, optional
+        Output array of the input type, with len(output_slices(Z, step)) slices.
+
+    Returns
+    -------
+    ndarray
+        Filtered image.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f'Unknown operation {operation}, expected one of {OPERATIONS}')
+    if before < 0 or after < 0 or step < 1:
+        raise ValueError('Window sizes must be positive and the step at least 1')
+
+    z_axis = 1 if tCount > 1 else 0
+    z_count = image_data.shape[z_axis]
+    slices = output_slices(z_count, step)
+    out_shape = image_data.shape[:z_axis] + (len(slices),) + image_data.shape[z_axis + 1:]
+    if out is None:
+        out = np.empty(out_shape, dtype=image_data.dtype)
+
+    frames = [(t,) for t in range(image_data.shape[0])] if tCount > 1 else [()]
+    rows = _rows_per_block(image_data.shape[z_axis:], before + after + 1, operation)
+    for frame in frames:
+        for start in range(0, image_data.shape[z_axis + 1], rows):
+            block = frame + (slice(None), slice(start, start + rows))
+            out[block] = _filter_block(np.asarray(image_data[block]), before, after, operation, slices)
+    return out
+
+
+def _rows_per_block(frame_shape, window, operation):
+    # Padded copy plus forward and backward maxima, or cumulative sums, or the median's
+    # partitioned windows
+    copies = window if operation == 'median' else 3
+    row_bytes = int(np.prod((frame_shape[0] + 2 * window,) + frame_shape[2:])) * 8 * copies
+    return max(BLOCK_BYTES // max(row_bytes, 1), 1)
+
+
+def _filter_block(block, before, after, operation, slices):
+    if operation in ('max', 'min'):
+        return _running_extreme(block, before, after, operation, slices)
+    if operation == 'median':
+        return _running_median(block, before, after, slices)
+    return _running_sum(block, before, after, operation, slices)
+
+
+def _running_extreme(block, before, after, operation, slices):
+    ufunc = np.maximum if operation == 'max' else np.minimum
+    if before + after < SHIFT_WINDOW:
+        return _shifted_extreme(block, before, after, ufunc)[slices.start:slices.stop:slices.step]
+
+    if block.dtype.kind == 'f':
+        fill = -np.inf if operation == 'max' else np.inf
+    else:
+        fill = np.iinfo(block.dtype).min if operation == 'max' else np.iinfo(block.dtype).max
+
+    z_count, window = block.shape[0], before + after + 1
+    padded_count = -(-(z_count + window - 1) // window) * window
+    forward = np.full((padded_count,) + block.shape[1:], fill, dtype=block.dtype)
+    forward[before:before + z_count] = block
+    backward = forward.copy()
+
+    # Running extremes within blocks of the window length, forwards and backwards. Each
+    # step processes the k-th slice of every block at once.
+    forward_segments = forward.reshape((-1, window) + block.shape[1:])
+    backward_segments = backward.reshape((-1, window) + block.shape[1:])
+    for k in range(1, window):
+        ufunc(forward_segments[:, k], forward_segments[:, k - 1], out=forward_segments[:, k])
+        ufunc(backward_segments[:, window - 1 - k], backward_segments[:, window - k],
+              out=backward_segments[:, window - 1 - k])
+
+    # The window of slice i is padded[i:i + window]: it ends in the block where it does not start
+    starts = slice(slices.start, slices.stop, slices.step)
+    ends = slice(slices.start + window - 1, slices.stop + window - 1, slices.step)
+    return ufunc(backward[starts], forward[ends])
+
+
+def _shifted_extreme(block, before, after, ufunc):
+    # Small windows: one pass per slice of the window, on the whole block at once
+    result = block.copy()
+    for shift in range(1, min(before, block.shape[0] - 1) + 1):
+        ufunc(result[shift:], block[:-shift], out=result[shift:])
+    for shift in range(1, min(after, block.shape[0] - 1) + 1):
+        ufunc(result[:-shift], block[shift:], out=result[:-shift])
+    return result
+
+
+def _window_bounds(z_count, before, after, slices):
+    starts = np.asarray(slices)
+    return np.maximum(starts - before, 0), np.minimum(starts + after, z_count - 1) + 1
+
+
+def _running_sum(block, before, after, operation, slices):
+    accumulator = np.float64 if block.dtype.kind == 'f' else np.int64
+    cumulative = np.zeros((block.shape[0] + 1,) + block.shape[1:], dtype=accumulator)
+    np.cumsum(block, axis=0, dtype=accumulator, out=cumulative[1:])
+
+    low, high = _window_bounds(block.shape[0], before, after, slices)
+    sums = cumulative[high] - cumulative[low]
+    if operation == 'mean':
+        counts = (high - low).reshape((-1,) + (1,) * (block.ndim - 1))
+        return _to_input_type(sums / counts, block.dtype)
+    return _to_input_type(sums, block.dtype)
+
+
+def _running_median(block, before, after, slices):
+    low, high = _window_bounds(block.shape[0], before, after, slices)
+    medians = np.empty((len(low),) + block.shape[1:], dtype=np.float64)
+    for i, (start, end) in enumerate(zip(low, high)):
+        medians[i] = np.median(block[start:end], axis=0)
+    return _to_input_type(medians, block.dtype)
+
+
+def _to_input_type(values, dtype):
+    if dtype.kind == 'f':
+        return values.astype(dtype)
+    info = np.iinfo(dtype)
+    if values.dtype.kind == 'f':
+        values = np.rint(values)
+    return np.clip(values, info.min, info.max).astype(dtype)
@@ -0,0 +1,162 @@
+import numpy as np
+import tifffile
+
+"""
+Shared TIFF input and output helpers for the Aivia recipes.
+
+Aivia hands every recipe the path of a TIFF file that can be tens of gigabytes for
+long 3D+T acquisitions. Reading it with imread() decodes the whole stack in memory
+before any work starts. open_image() returns an array-like object instead:
+
+ - a read-only tifffile memmap when the file is uncompressed, contiguous and stored
+   in the native byte order (zero copy, the OS pages data in on demand),
+ - a TiffPages view otherwise, which decodes only the TIFF pages touched by an index.
+
+Both objects expose shape, dtype and ndim and support numpy indexing, so per-frame
+loops such as `image_data[t, z, :, :]` only read the pages they process.
+Use np.asarray() on the result when a whole-array operation is needed.
+
+On the output side, write_frames() writes an image from frames produced one after
+the other (e.g. by frames.map_frames()), so the whole output never needs to be in
+memory.
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+tifffile (comes with Aivia installer)
+"""
+
+
+def open_image(image_location):
+    """
+    Opens a TIFF file without decoding it.
+
+    Parameters
+    ----------
+    image_location : str
+        Path to the TIFF file.
+
+    Returns
+    -------
+    numpy.memmap or TiffPages
+        Read-only array-like object with the same shape and dtype as imread().
+    """
+    try:
+        image_data = tifffile.memmap(image_location, mode='r')
+    except ValueError:
+        # Compressed, tiled or fragmented data cannot be memory-mapped
+        return TiffPages(image_location)
+
+    if not image_data.dtype.isnative:
+        # Keep the recipes' outputs in native byte order
+        del image_data
+        return TiffPages(image_location)
+
+    return image_data
+
+
+def write_frames(result_location, frames, shape, dtype, **kwargs):
+    """
+    Writes a grayscale image to a TIFF file from an iterable of frames.
+
+    Parameters
+    ----------
+    result_location : str
+        Path to the TIFF file.
+    frames : iterable of numpy.ndarray
+        Consecutive blocks of the image along its leading axes (e.g. T frames or Z
+        planes), in file order. Frames are cast to dtype and written as they come.
+    shape : tuple of int
+        Shape of the whole image.
+    dtype : numpy.dtype
+        Data type of the image.
+    **kwargs
+        Passed to tifffile.imwrite (e.g. metadata={'axes': 'TZYX'}).
+    """
+    page_shape = tuple(shape[-2:])
+
+    def pages():
+        for frame in frames:
+            frame = np.asarray(frame).astype(dtype, copy=False)
+            yield from frame.reshape((-1,) + page_shape)
+
+    tifffile.imwrite(result_location, pages(), shape=shape, dtype=dtype, **kwargs)
+
+
+class TiffPages:
+    """
+    Array-like view of the first series of a TIFF file that decodes pages on demand.
+
+    Indices on the leading (non-page) axes select which pages are decoded, the
+    remaining indices are applied to the decoded pages.
+    """
+
+    def __init__(self, image_location):
+        self._tif = tifffile.TiffFile(image_location)
+        series = self._tif.series[0]
+        self.shape = tuple(series.shape)
+        self.dtype = np.dtype(series.dtype).newbyteorder('=')
+
+        self._pages = list(series.pages)
+        self._page_shape = tuple(self._pages[0].shape)
+        lead_shape = self.shape[:len(self.shape) - len(self._page_shape)]
+
+        if self.shape[len(lead_shape):] != self._page_shape or \
+                int(np.prod(lead_shape)) != len(self._pages):
+            # Pages do not map onto the leading axes: decode the series once
+            self._pages = [series]
+            self._page_shape = self.shape
+            lead_shape = ()
+
+        self._page_index = np.arange(len(self._pages)).reshape(lead_shape)
+        self._last_page = (None, None)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if Ellipsis in key:
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i + 1:]
+
+        n_lead = self._page_index.ndim
+        page_index = self._page_index[key[:n_lead]]
+
+        frames = np.empty(page_index.shape + self._page_shape, dtype=self.dtype)
+        for position, p in np.ndenumerate(page_index):
+            frames[position] = self._read_page(p)
+
+        if len(key) > n_lead:
+            return frames[(slice(None),) * page_index.ndim + key[n_lead:]]
+        return frames
+
+    def _read_page(self, p):
+        # Successive indices often hit the same page (e.g. Z planes of a single-page volume)
+        if self._last_page[0] != p:
+            self._last_page = (p, self._pages[p].asarray())
+        return self._last_page[1]
+
+    def __array__(self, dtype=None, copy=None):
+        image_data = self[...]
+        if dtype is not None:
+            image_data = image_data.astype(dtype, copy=False)
+        return image_data
+
+    def close(self):
+        self._tif.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
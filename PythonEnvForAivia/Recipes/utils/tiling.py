@@ -0,0 +1,125 @@
+import itertools
+import os
+import numpy as np
+from Recipes.utils.frames import default_workers, frame_indices, run_blocks
+
+"""
+Shared out-of-core tiled processing for neighbourhood filters.
+
+Filters such as morphological closings or Gaussian derivatives create float
+temporaries several times the size of the input. run_tiled() splits every 2D or 3D
+frame into tiles, extends each tile by a halo on every side, runs the kernel on it
+and only keeps the tile's core. As long as the halo covers the reach of the filter
+(footprint radius, or the Gaussian truncation radius plus the derivative stencils),
+the stitched result is identical to processing the whole frame at once: tiles
+touching the image border see the same border as the whole frame would.
+
+The kernel's temporaries are bounded by the memory budget, given in MB by the
+AIVIA_RECIPE_MEMORY_MB environment variable. The input and output images themselves
+are not: recipes hold them (and any conversion of the output) in full. Without a
+budget every frame is a single tile, which behaves like frames.run_per_frame().
+
+Requirements
+------------
+numpy (comes with Aivia installer)
+"""
+
+
+def default_memory_budget():
+    budget = os.environ.get('AIVIA_RECIPE_MEMORY_MB')
+    return int(budget) * 1024 ** 2 if budget else None
+
+
+def tile_shape_for_budget(frame_shape, halo, voxel_budget):
+    """
+    Halves the largest axis of the tile until the tile and its halo fit in the budget.
+
+    Parameters
+    ----------
+    frame_shape : tuple of int
+        Shape of the frame to split.
+    halo : tuple of int
+        Halo added on both sides of each axis.
+    voxel_budget : int
+        Maximum number of voxels of a tile including its halo.
+
+    Returns
+    -------
+    tuple of int
+        Tile shape (without halo).
+    """
+    tile_shape = list(frame_shape)
+    while np.prod([s + 2 * h for s, h in zip(tile_shape, halo)]) > voxel_budget:
+        axis = int(np.argmax(tile_shape))
+        if tile_shape[axis] <= max(halo[axis], 1):
+            # Tiles smaller than their halo would mostly process overlap
+            break
+        tile_shape[axis] = (tile_shape[axis] + 1) // 2
+    return tuple(tile_shape)
+
+
+def run_tiled(kernel, image_data, output_data, tCount, zCount, halo, frame_ndim=2,
+              bytes_per_voxel=8, memory_budget=None, max_workers=None):
+    """
+    Applies a neighbourhood kernel tile by tile to every frame of image_data.
+
+    Parameters
+    ----------
+    kernel : callable
+        Function taking a 2D or 3D array and returning an array of the same shape.
+    image_data : array-like
+        Input image (numpy array, memmap or tiff_io.TiffPages).
+    output_data : numpy.ndarray
+        Preallocated output with the same shape as image_data.
+    tCount, zCount : int
+        Number of timepoints and Z planes, as given by Aivia.
+    halo : int or tuple of int
+        Reach of the kernel in pixels, for all axes of a frame or for each of them.
+    frame_ndim : int
+        Dimensionality of the frames given to the kernel (2 or 3).
+    bytes_per_voxel : int
+        Memory used by the kernel per input voxel, temporaries included.
+    memory_budget : int
+        Memory budget in bytes shared by all workers, default_memory_budget() if None.
+    max_workers : int
+        Number of workers, default_workers() if None. 1 runs serially.
+
+    Returns
+    -------
+    numpy.ndarray
+        output_data
+    """
+    indices = frame_indices(tCount, zCount, frame_ndim)
+    n_lead = len(indices[0])
+    frame_shape = image_data.shape[n_lead:]
+    if np.isscalar(halo):
+        halo = (int(halo),) * len(frame_shape)
+
+    if max_workers is None:
+        max_workers = default_workers()
+    if memory_budget is None:
+        memory_budget = default_memory_budget()
+
+    if memory_budget is None:
+        tile_shape = frame_shape
+    else:
+        voxel_budget = memory_budget // (bytes_per_voxel * max(max_workers, 1))
+        tile_shape = tile_shape_for_budget(frame_shape, halo, voxel_budget)
+
+    blocks = []
+    for index in indices:
+        starts = [range(0, s, t) for s, t in zip(frame_shape, tile_shape)]
+        for origin in itertools.product(*starts):
+            core, extended, crop = [], [], []
+            for start, t, s, h in zip(origin, tile_shape, frame_shape, halo):
+                stop = min(start + t, s)
+                low, high = max(start - h, 0), min(stop + h, s)
+                core.append(slice(start, stop))
+                extended.append(slice(low, high))
+                crop.append(slice(start - low, stop - low))
+            blocks.append((index + tuple(extended), index + tuple(core), tuple(crop)))
+
+    if len(blocks) > len(indices):
+        print(f'-- Processing {len(blocks)} tiles of {tile_shape} (+{halo} halo) --')
+
+    return run_blocks(kernel, blocks, image_data, output_data, max_workers)
@@ -23,8 +23,16 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 import tifffile
-import wx
+wx = lazy_import('wx')
 import textwrap
 
 max_char_len = 150
@@ -32,6 +40,7 @@ max_char_len = 150
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     # Choose file
     img_path = pick_file('')
@@ -3,6 +3,14 @@ import numpy as np
 from skimage.io import imread, imsave
 import sys
 import ctypes
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Extracts intensities of two channels, pixel by pixel, and save the list in a csv file.
@@ -22,6 +30,7 @@ Dummy channel
 # [INPUT Name:inputImagePath2 Type:string DisplayName:'Input Ch2']
 # [INPUT Name:inputImagePath1 Type:string DisplayName:'Input Ch1']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Channel difference']
+@profiled
 def run(params):
     imageLocation1 = params['inputImagePath1']
     imageLocation2 = params['inputImagePath2']
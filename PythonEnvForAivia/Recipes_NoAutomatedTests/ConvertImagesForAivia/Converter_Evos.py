@@ -26,7 +26,15 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
-import wx
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
+wx = lazy_import('wx')
 import numpy as np
 import concurrent.futures
 import re
@@ -79,6 +87,7 @@ Returns
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     global DEFAULT_FOLDER, LAYOUTS, LAYOUTS_WELL_LIST, PREFIX, WELL_PREFIX, TAGS, WELL_TAGS, SUFFIX
 
@@ -26,6 +26,13 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 import wx
 import numpy as np
 import concurrent.futures
@@ -118,6 +125,7 @@ Returns
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     global DEFAULT_FILE, LAYOUTS, LAYOUTS_WELL_LIST, PREFIX, WELL_PREFIX, TAGS, WELL_TAGS, SUFFIX
 
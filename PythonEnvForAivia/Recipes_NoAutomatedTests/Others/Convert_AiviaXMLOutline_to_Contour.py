@@ -24,10 +24,18 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 
-import wx
+wx = lazy_import('wx')
 import numpy as np
-import cv2
+cv2 = lazy_import('cv2')
 from skimage.draw import polygon
 from skimage.io import imread, imsave
 from xml.dom import minidom
@@ -53,6 +61,7 @@ Returns
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Outline Contour']
+@profiled
 def run(params):
     input_p = params['inputPath']
     result_p = params['resultPath']
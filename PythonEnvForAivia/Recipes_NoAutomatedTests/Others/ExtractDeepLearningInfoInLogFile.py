@@ -24,9 +24,17 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
-import wx
-import matplotlib.pyplot as plt
-from matplotlib.widgets import RadioButtons
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
+wx = lazy_import('wx')
+plt = lazy_import('matplotlib.pyplot')
+RadioButtons = lazy_import('matplotlib.widgets', 'RadioButtons')
 import re
 import concurrent.futures
 
@@ -58,6 +66,7 @@ A chart with two axes, that can be saved with the matplotlib buttons.
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     print("Running")
     # Setting colors for chart
@@ -23,8 +23,16 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 import tifffile
-import wx
+wx = lazy_import('wx')
 import textwrap
 import re
 
@@ -64,6 +72,7 @@ class WxTable:
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     # Choose file
     file_path = test_file if test_file else pick_file('')
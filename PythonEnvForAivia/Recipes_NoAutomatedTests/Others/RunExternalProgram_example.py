@@ -2,6 +2,14 @@ import os.path
 from skimage.io import imread, imsave
 import shlex, subprocess
 import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 This is script has no real function (yet) and constitutes more like a diverted way to couple python to Aivia.
@@ -38,6 +46,7 @@ aivia_path = parentDir + '\\Aivia.exe'
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Output']
+@profiled
 def run(params):
     imageLocation = params['inputImagePath']
     resultLocation = params['resultPath']
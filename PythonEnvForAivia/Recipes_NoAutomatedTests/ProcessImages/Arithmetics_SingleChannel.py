@@ -1,8 +1,17 @@
 import os.path
 import sys
 import numpy as np
-from tifffile import imread, imsave
 import ctypes
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.point_ops import has_lut, value_lut, map_planes, compile_expression
+# ---------------------------------------------------------------
 
 """
 Various arithmetics to be applied to one channel.
@@ -19,7 +28,13 @@ Input Image : Aivia channel
     Input channel to use for the processing.
 
 Operation : int
-    Number-coded arithmetics action (0=multiply, 1=divide, 2=add, 3=subtract).
+    Number-coded arithmetics action (0=multiply, 1=divide, 2=add, 3=subtract,
+    4=expression).
+
+Expression : str
+    Formula of the pixel value x for the expression operation, e.g. "(x - 100) * 1.5"
+    (see Recipes/utils/point_ops.py). Set below, or with the 'expression' parameter of
+    batch runs.
 
 Threshold : int
     Grayvalue for the arithmetics.
@@ -31,10 +46,13 @@ Aivia objects
     Result of the process.
 """
 
+expression = '(x - 100) * 1.5'
+
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [INPUT Name:value Type:int DisplayName:'Value' Default:0 Min:0 Max:65535]
-# [INPUT Name:actionType Type:int DisplayName:'Operation (0=multiply, 1=divide, 2=add, 3=subtract)' Default:0 Min:0 Max:65535]
+# [INPUT Name:actionType Type:int DisplayName:'Operation (0=multiply, 1=divide, 2=add, 3=subtract, 4=expression)' Default:0 Min:0 Max:65535]
 # [OUTPUT Name:resultImagePath Type:string DisplayName:'Processed Image']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultImagePath']
@@ -47,54 +65,80 @@ def run(params):
         print(f'Error: {image_location} does not exist')
         return
 
-    image_data = imread(image_location)
+    image_data = open_image(image_location)
     d_type = image_data.dtype
-    dims = image_data.shape
-
-    output_data = np.empty(image_data.shape, dtype=d_type)
-    axes = ''
 
     # 3D+T
     if tCount > 1 and zCount > 1:
         print(f"Applying to 3D+T case with dims: {image_data.shape}")
-        for t in range(0, dims[0]):
-            output_data[t, :, :, :] = process_data(image_data[t, :, :, :], operation_type, value).astype(d_type)
         axes = 'TZYX'
 
     # 2D +/- T and 3D
     else:
         print(f"Applying to 2D/3D case with dims: {image_data.shape}")
-        output_data = process_data(image_data, operation_type, value).astype(d_type)
         if zCount > 1:
             axes = 'ZYX'
         else:
             axes = 'TYX' if tCount > 1 else 'YX'
 
-    imsave(result_location, output_data, metadata={'axes': axes}, ome=True)
-
-
-def process_data(data, op_type: int, value: int):
-    out_data = None
-    if op_type == 0:  # MULTIPLY
-        out_data = np.float32(data) * value
-    elif op_type == 1:  # DIVIDE
-        if value == 0:
-            sys.exit('Division by zero is not possible.')
-        out_data = np.float32(data) / value
-    elif op_type == 2:  # ADD
-        out_data = np.float32(data) + value
-    elif op_type == 3:  # SUBTRACT
-        out_data = np.float32(data) - value
-    elif op_type > 3:
+    arithmetic = arithmetics(operation_type, value, params.get('expression', expression))
+    operation = saturated(arithmetic, d_type)
+    # 8 and 16-bit images: every value mapped once, planes mapped through the table
+    planes = map_planes(operation, image_data)
+    clipped = []
+    if has_lut(d_type):
+        unclipped = value_lut(arithmetic, d_type)
+        out_of_range = np.isnan(unclipped) | (unclipped < 0) | (unclipped > np.iinfo(d_type).max)
+        if out_of_range.any():
+            planes = clipping_planes(image_data, value_lut(operation, d_type), out_of_range, clipped)
+
+    write_frames(result_location, planes, image_data.shape, d_type, metadata={'axes': axes}, ome=True)
+    if clipped:
+        print(f'Clipping data to fit the {d_type} range.')
+
+
+def arithmetics(op_type: int, value: float, formula=None):
+    """Function of the pixel values for the selected operation, in float32."""
+    if op_type == 1 and value == 0:
+        sys.exit('Division by zero is not possible.')
+    if op_type > 4:
         sys.exit('Wrong selection of operation type')
-        
-    # Clipping data only if 8 or 16 bit
-    if any(data.dtype == dtp for dtp in [np.uint8, np.uint16]):
-        if np.max(out_data) > np.iinfo(data.dtype).max or np.min(out_data) < 0:
-            out_data = out_data.clip(0, np.iinfo(data.dtype).max)
-            print(f'Clipping data to fit the {data.dtype} range.')
+    evaluate = compile_expression(formula) if op_type == 4 else None
+
+    def process_data(data):
+        if op_type == 0:  # MULTIPLY
+            return np.float32(data) * value
+        elif op_type == 1:  # DIVIDE
+            return np.float32(data) / value
+        elif op_type == 2:  # ADD
+            return np.float32(data) + value
+        elif op_type == 3:  # SUBTRACT
+            return np.float32(data) - value
+        return evaluate(data)  # EXPRESSION
+
+    return process_data
+
+
+def saturated(func, dtype):
+    """func cast to dtype, clipped to the range of 8 and 16-bit types (NaN gives 0)."""
+    dtype = np.dtype(dtype)
+
+    def process_data(data):
+        out_data = func(data)
+        if has_lut(dtype):
+            out_data = np.clip(np.nan_to_num(out_data, nan=0.0), 0, np.iinfo(dtype).max)
+        return out_data.astype(dtype)
+
+    return process_data
+
 
-    return out_data
+def clipping_planes(image_data, lut, out_of_range, clipped):
+    """Planes mapped through lut, appending True to clipped once a plane has a value out_of_range."""
+    for index in np.ndindex(image_data.shape[:-2]):
+        plane = np.asarray(image_data[index])
+        if not clipped and np.take(out_of_range, plane).any():
+            clipped.append(True)
+        yield np.take(lut, plane)
 
 
 def Mbox(title, text):
@@ -112,3 +156,5 @@ if __name__ == '__main__':
 # CHANGELOG
 #   v1_00: - From Threshold_for_3DObjects.py. Compatible with 32 bit images
 #   v1_10: - Adding ome=True tag with imwrite for Aivia 13.0.0 compatibility 
+#   v1_20: - Lookup tables for 8 and 16-bit images (no float copy), planes read and written one at a time, expression operation
+#   v1_21: - Clipped values noted while the planes are mapped (no extra pass over the image)
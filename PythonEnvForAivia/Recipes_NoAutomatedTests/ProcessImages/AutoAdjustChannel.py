@@ -1,9 +1,20 @@
 import os.path
 import numpy as np
 from tifffile import imread, imsave
-from skimage.exposure import equalize_hist, equalize_adapthist, cumulative_distribution, rescale_intensity
-from skimage.util import img_as_ubyte, img_as_uint
+from skimage.exposure import equalize_hist, cumulative_distribution
 import ctypes
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+from Recipes.utils.dtype_policy import to_dtype
+from Recipes.utils.histogram import percentiles, rescale_to_range
+from Recipes.utils.clahe import clahe
+# ---------------------------------------------------------------
 
 
 processing_options = {1: 'Use Quantile',
@@ -27,6 +38,10 @@ Parameters
 Input Image : Aivia channel
     Input channel to use for the processing.
 
+CLAHE Kernel Depth : int
+    Number of Z planes of the CLAHE contextual regions (3D images only). 1 equalizes
+    every plane with its own regions, above 1 the kernel is 3D.
+
 Returns
 -------
 Aivia image
@@ -36,13 +51,12 @@ Aivia image
 
 def process_img(img_array, process_no, param_d: dict):
     in_dtype = img_array.dtype
-    proc_data = np.empty_like(img_array)
 
     if process_no == 1:         # Quantile and Cumulative Distribution
-        q_min = np.percentile(img_array, int(param_d['min_val'] * 100))
-        q_max = np.percentile(img_array, int(param_d['max_val'] * 100))
+        # Both quantiles from one histogram, rescaled through a lookup table
+        q_min, q_max = percentiles(img_array, [int(param_d['min_val'] * 100), int(param_d['max_val'] * 100)])
 
-        proc_data = rescale_intensity(img_array, in_range=(q_min, q_max), out_range='dtype')
+        proc_data = rescale_to_range(img_array, q_min, q_max)
         print(f"Processed image using Quantiles (min = {param_d['min_val']}, max = {param_d['max_val']})")
 
     elif process_no == 2:  # CLAHE
@@ -54,30 +68,24 @@ def process_img(img_array, process_no, param_d: dict):
                 k_size = param_d['k_size_val']
         print(f'CLAHE kernel size is: {k_size}')
 
-        # Normalize image (0-1)
-        img_array = (img_array - img_array.min()) / (img_array.max() - img_array.min())
-        
-        proc_data_tmp = equalize_adapthist(img_array, kernel_size=k_size)
-        if str(in_dtype) == 'uint16':
-            proc_data = img_as_uint(proc_data_tmp)
-        else:
-            proc_data = img_as_ubyte(proc_data_tmp)
+        # Histograms of the contextual regions counted from the integer image, mappings
+        # interpolated chunk by chunk (same result as skimage's equalize_adapthist)
+        proc_data = clahe(img_array, kernel_size=k_size, dtype=np.uint16 if str(in_dtype) == 'uint16' else np.uint8)
 
         print(f"Processed image with CLAHE (Contrast Limited Adaptive Histogram Equalization) with a kernel size of {k_size}")
 
     elif process_no == 3:         # Equalize
         proc_data_tmp = equalize_hist(img_array)
-        if str(in_dtype) == 'uint16':
-            proc_data = img_as_uint(proc_data_tmp)
-        else:
-            proc_data = img_as_ubyte(proc_data_tmp)
+        proc_data = to_dtype(proc_data_tmp, np.uint16 if str(in_dtype) == 'uint16' else np.uint8)
         print(f'Processed image with histogram equalization')
 
     return proc_data
     
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Channel']
+# [INPUT Name:kernelDepth Type:int DisplayName:'CLAHE Kernel Depth (Z)' Default:1 Min:1 Max:100]
 # [OUTPUT Name:resultImagePath Type:string DisplayName:'AutoAdjusted Channel']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultImagePath']
@@ -93,18 +101,22 @@ def run(params):
     dims = image_data.shape
     
     processed = np.empty_like(image_data)
-    if zCount == 1:
-        parameters['k_size_val'] = parameters['k_size_val'][1:]
+    param_d = dict(parameters)
+    if param_d['k_size_val']:
+        if zCount == 1:
+            param_d['k_size_val'] = param_d['k_size_val'][1:]
+        else:
+            param_d['k_size_val'] = (int(params.get('kernelDepth', 1)),) + tuple(param_d['k_size_val'][1:])
 
     # 2D+T
     if tCount > 1 and zCount == 1:
         print(f"Applying to 2D+T case with dims: {image_data.shape}")
         for t in range(0, dims[0]):
             if dims[0] == tCount:
-                processed[t, :, :] = process_img(image_data[t, :, :], selected_processing, parameters).astype(image_data.dtype)
+                processed[t, :, :] = process_img(image_data[t, :, :], selected_processing, param_d).astype(image_data.dtype, copy=False)
                 axes = 'YXT'  # Format from tifffile
             else:
-                processed[:, :, t] = process_img(image_data[:, :, t], selected_processing, parameters).astype(image_data.dtype)
+                processed[:, :, t] = process_img(image_data[:, :, t], selected_processing, param_d).astype(image_data.dtype, copy=False)
                 axes = 'TYX'
                 print('Processing an unconventional timelapse with YXT dimensions')
 
@@ -112,7 +124,7 @@ def run(params):
     if tCount > 1 and zCount > 1:
         print(f"Applying to 3D+T case with dims: {dims}")
         for t in range(0, dims[0]):
-            processed[t, :, :, :] = process_img(image_data[t, :, :, :], selected_processing, parameters).astype(image_data.dtype)
+            processed[t, :, :, :] = process_img(image_data[t, :, :, :], selected_processing, param_d).astype(image_data.dtype, copy=False)
             axes = 'TZYX'  # Format from tifffile
 
     # 2D
@@ -120,13 +132,13 @@ def run(params):
         if zCount == 1:
             axes = 'YX'
             print(f"Applying to 2D case with dims: {image_data.shape}")
-            processed = process_img(image_data, selected_processing, parameters).astype(image_data.dtype)
+            processed = process_img(image_data, selected_processing, param_d).astype(image_data.dtype, copy=False)
         
         # 3D
         else:
             axes = 'ZYX'
             print(f"Applying to 3D case with dims: {image_data.shape}")
-            processed = process_img(image_data, selected_processing, parameters).astype(image_data.dtype)
+            processed = process_img(image_data, selected_processing, param_d).astype(image_data.dtype, copy=False)
 
     # Reporting
     max_val = np.iinfo(image_data.dtype).max
@@ -149,3 +161,6 @@ if __name__ == '__main__':
 
 # CHANGELOG
 #   v1_00: - From Threshold_for_3DObjects.py
+#   v1_10: - CLAHE in float32 instead of float64, conversion to the input bit depth without full-size temporaries
+#   v1_20: - Quantiles from the image histogram (no sort of the image) and rescaling through a lookup table
+#   v1_30: - CLAHE from the integer image, region histograms in parallel and interpolation by chunks, 3D kernel depth input
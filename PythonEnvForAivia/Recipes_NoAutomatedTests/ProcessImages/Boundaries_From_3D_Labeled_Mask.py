@@ -4,6 +4,14 @@ import os.path
 import numpy as np
 from skimage.io import imread, imsave
 from skimage import segmentation
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Detects boundaries of 3D labeled objects and creates measurable objects in Aivia.
@@ -32,6 +40,7 @@ Note: replace output with one of the line below to change output type (objects o
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Labeled Mask']
 # [OUTPUT Name:resultPath Type:string DisplayName:’Boundaries from labels’ Objects:3D MinSize:0.5 MaxSize:50000.0]
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
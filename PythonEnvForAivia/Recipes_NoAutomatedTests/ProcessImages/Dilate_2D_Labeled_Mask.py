@@ -3,6 +3,15 @@ import os.path
 import numpy as np
 from skimage.io import imread, imsave
 from skimage.segmentation import expand_labels
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 """
 Dilate 2D labeled masks.
@@ -27,6 +36,7 @@ Channel in Aivia
 # [INPUT Name:inputImagePath Type:string DisplayName:'Labeled Mask']
 # [INPUT Name:dilation Type:int DisplayName:'Dilate distance (pixels)' Default:1 Min:0 Max:65535]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dilated Labeled Mask']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultPath']
@@ -6,7 +6,14 @@ from skimage.io import imread, imsave
 from skimage.measure import label
 from skimage.segmentation import random_walker
 from skimage.util import img_as_ubyte, img_as_uint
-import time
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
 
 """
 Creates 3D objects from seeds. Propagation of seeds is limited by input mask.
@@ -42,6 +49,7 @@ Note: replace output with one of the line below to change output type (objects o
 # [INPUT Name:inputMaskImage Type:string DisplayName:'Whole Sample Mask']
 # [INPUT Name:thresholdVal Type:int DisplayName:'Intensity Threshold if not a mask' Default:1 Min:0 Max:65535]
 # [OUTPUT Name:resultPath Type:string DisplayName:'Labeled Mask']
+@profiled
 def run(params):
     whole_mask_p = params['inputMaskImage']
     seeds_mask_p = params['inputSeedsImage']
@@ -60,48 +68,44 @@ def run(params):
     Z_cal = float(pixel_cal[2].split(' ')[0])
     cal_ratio = Z_cal / XY_cal
 
-    t0 = time.perf_counter()
-    whole_mask = imread(whole_mask_p)
-    # Check if a mask, otherwise apply threshold
-    if len(np.unique(whole_mask)) > 2:
-        whole_mask = np.where(whole_mask > threshold, 1, 0)
-        print(f'Detected more than two values in mask.\n'
-              f'Using provided threshold (= {threshold}) to transform the image as a mask.')
-
-    t1 = time.perf_counter()
-    print('Creating whole sample mask done in {:0.2f} seconds'.format(t1 - t0))
-
-    seeds_mask = imread(seeds_mask_p)
-    dims = whole_mask.shape
-    print('-- Input dimensions (expected (Z), Y, X): ', np.asarray(dims), ' --')
-
-    # Checking image is not 2D/2D+t or 3D+t
-    if len(dims) == 2 or (len(dims) == 3 and tCount > 1):
-        message = 'Error: Cannot be applied to timelapses or 2D images.'
-        Mbox('Error', message, 0)
-        sys.exit(message)
-
-    # Seed binary mask needs to be transformed as labeled mask
-    labeled_seeds = label(seeds_mask)
-    t2 = time.perf_counter()
-    print('Creating labels from seeds mask done in {:0.2f} seconds'.format(t2 - t1))
-
-    # Important? Set to -1 all pixels not in the whole sample mask
-    labeled_seeds[whole_mask == 0] = -1
-
-    # Performing seeds-guided segmentation of the whole sample mask
-    # mode options = ‘cg’, ‘cg_j’, ‘cg_mg’, ‘bf’
-    labeled_mask = random_walker(whole_mask, labeled_seeds, mode='cg_j', copy=True, spacing=(cal_ratio, 1.0, 1.0))
-    t3 = time.perf_counter()
-    print('Random Walker segmentation done in {:0.2f} seconds'.format(t3 - t2))
-    
-    # Conversion from 32 bit to 8 or 16 bit
-    if whole_mask.dtype == np.uint16:
-        final_mask = img_as_uint(labeled_mask)
-    else:
-        final_mask = img_as_ubyte(labeled_mask)
-
-    imsave(result_location, final_mask)
+    with stage('whole sample mask'):
+        whole_mask = imread(whole_mask_p)
+        # Check if a mask, otherwise apply threshold
+        if len(np.unique(whole_mask)) > 2:
+            whole_mask = np.where(whole_mask > threshold, 1, 0)
+            print(f'Detected more than two values in mask.\n'
+                  f'Using provided threshold (= {threshold}) to transform the image as a mask.')
+
+    with stage('seeds labels'):
+        seeds_mask = imread(seeds_mask_p)
+        dims = whole_mask.shape
+        print('-- Input dimensions (expected (Z), Y, X): ', np.asarray(dims), ' --')
+
+        # Checking image is not 2D/2D+t or 3D+t
+        if len(dims) == 2 or (len(dims) == 3 and tCount > 1):
+            message = 'Error: Cannot be applied to timelapses or 2D images.'
+            Mbox('Error', message, 0)
+            sys.exit(message)
+
+        # Seed binary mask needs to be transformed as labeled mask
+        labeled_seeds = label(seeds_mask)
+
+    with stage('random walker'):
+        # Important? Set to -1 all pixels not in the whole sample mask
+        labeled_seeds[whole_mask == 0] = -1
+
+        # Performing seeds-guided segmentation of the whole sample mask
+        # mode options = ‘cg’, ‘cg_j’, ‘cg_mg’, ‘bf’
+        labeled_mask = random_walker(whole_mask, labeled_seeds, mode='cg_j', copy=True, spacing=(cal_ratio, 1.0, 1.0))
+
+    with stage('write'):
+        # Conversion from 32 bit to 8 or 16 bit
+        if whole_mask.dtype == np.uint16:
+            final_mask = img_as_uint(labeled_mask)
+        else:
+            final_mask = img_as_ubyte(labeled_mask)
+
+        imsave(result_location, final_mask)
 
 
 def Mbox(title, text, style):
@@ -119,3 +123,4 @@ if __name__ == '__main__':
 
 # CHANGELOG
 #   v1_00: - From Objects_From_3D_Labeled_Mask_1_00.py
+#   v1_10: - Stage timings recorded with Recipes/utils/profiling.py (AIVIA_RECIPE_PROFILE=1) instead of printed
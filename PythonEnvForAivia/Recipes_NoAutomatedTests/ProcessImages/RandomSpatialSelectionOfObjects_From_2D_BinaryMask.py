@@ -7,6 +7,14 @@ from skimage.io import imread, imsave
 from skimage.measure import label, regionprops
 from scipy.ndimage import distance_transform_edt
 from scipy.spatial import cKDTree
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 
 # DEFAULT PARAMETERS
@@ -76,6 +84,7 @@ DEBUG_MODE = False
 # [INPUT Name:refImagePath Type:string DisplayName:'Reference Mask']
 # [INPUT Name:inputImagePath Type:string DisplayName:'Binary Mask']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Objects from labels' Objects:2D MinSize:0.0 MaxSize:50000.0]
+@profiled
 def run(params):
     global activate_option_2, activate_option_3
     image_location = params['inputImagePath']
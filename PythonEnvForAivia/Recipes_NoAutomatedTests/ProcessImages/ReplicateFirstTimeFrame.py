@@ -2,6 +2,14 @@ import numpy as np
 from skimage.io import imread, imsave
 import sys
 import ctypes
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
 
 '''
 Replicates the first image in a time series to all other time frames.
@@ -20,6 +28,7 @@ Output
 
 # [INPUT Name:inputImagePath Type:string DisplayName:'Channel to replicate']
 # [OUTPUT Name:outputImagePath Type:string DisplayName:'Replicated channel']
+@profiled
 def run(params):
     inputImagePath_ = params['inputImagePath']
     outputImagePath_ = params['outputImagePath']
@@ -6,7 +6,15 @@ from skimage.morphology import closing, opening, disk, ball, square, cube
 from skimage.filters import gaussian, median
 from scipy.ndimage import label
 import math
-from datetime import datetime
+import sys
+from pathlib import Path
+
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -54,6 +62,7 @@ Aivia channel
 # [OUTPUT Name:resultPath3 Type:string DisplayName:'Branches']
 # [OUTPUT Name:resultPath2 Type:string DisplayName:'Branching points']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Skeleton']
+@profiled
 def run(params):
     image_location = params['inputImagePath']
     skeleton_p = params['resultPath']
@@ -84,160 +93,157 @@ def run(params):
         print(f'Error: {image_location} does not exist')
         return
         
-    image_data = imread(image_location)
-    dims = image_data.shape
-    print('-- Input dimensions (expected (T), Z, Y, X): ', np.asarray(dims), ' --')
-    bitdepth_max = np.iinfo(image_data.dtype).max
-    temp_array = np.empty_like(image_data)
-    output_data = np.empty_like(image_data)
+    with stage('read and filter'):
+        image_data = imread(image_location)
+        dims = image_data.shape
+        print('-- Input dimensions (expected (T), Z, Y, X): ', np.asarray(dims), ' --')
+        bitdepth_max = np.iinfo(image_data.dtype).max
+        temp_array = np.empty_like(image_data)
+        output_data = np.empty_like(image_data)
     
-    thr_array = np.where(image_data > threshold, 1, 0).astype(image_data.dtype)
-
-    # Filter binary mask to smooth skeleton
-    if filter_radius > 0 and filter_type == 1:
-        filtered_array = gaussian(thr_array, sigma=filter_radius, preserve_range=True)
+        thr_array = np.where(image_data > threshold, 1, 0).astype(image_data.dtype)
 
-        # Calculate gaussian filter threshold with x = 1.5 pixels, so that any single pixel wide structure is conserved
-        filter_threshold = math.exp(-1.125 / (filter_radius ** 2)) / filter_radius
+        # Filter binary mask to smooth skeleton
+        if filter_radius > 0 and filter_type == 1:
+            filtered_array = gaussian(thr_array, sigma=filter_radius, preserve_range=True)
 
-        temp_array = np.where(filtered_array > filter_threshold, 1, 0).astype(image_data.dtype)
+            # Calculate gaussian filter threshold with x = 1.5 pixels, so that any single pixel wide structure is conserved
+            filter_threshold = math.exp(-1.125 / (filter_radius ** 2)) / filter_radius
 
-    elif filter_radius > 0 and filter_type == 0:
-        # Median filter doesn't enlarge structures compared to Gaussian
-        temp_array = median(thr_array, disk(filter_radius))
+            temp_array = np.where(filtered_array > filter_threshold, 1, 0).astype(image_data.dtype)
 
-    else:
-        temp_array = thr_array
+        elif filter_radius > 0 and filter_type == 0:
+            # Median filter doesn't enlarge structures compared to Gaussian
+            temp_array = median(thr_array, disk(filter_radius))
 
-    if close_radius > 0:
-        if zCount > 1:
-            structure = ball(close_radius)
         else:
-            structure = disk(close_radius)
+            temp_array = thr_array
 
-    t1_sk = datetime.now()
-    axes = 'YX'
-
-    # 3D+T
-    if tCount > 1 and zCount > 1:
-        axes = 'TZYX'
-        for t in range(0, dims[0]):
-            temp_array[t, :, :, :] = skeletonize_3d(temp_array[t, :, :, :])
+        if close_radius > 0:
+            if zCount > 1:
+                structure = ball(close_radius)
+            else:
+                structure = disk(close_radius)
+
+    with stage('skeleton'):
+        axes = 'YX'
+
+        # 3D+T
+        if tCount > 1 and zCount > 1:
+            axes = 'TZYX'
+            for t in range(0, dims[0]):
+                temp_array[t, :, :, :] = skeletonize_3d(temp_array[t, :, :, :])
+                if open_skeleton:
+                    temp_array[t, :, :, :] = opening(temp_array[t, :, :, :], footprint=structure)
+                elif close_radius > 0:
+                    temp_array[t, :, :, :] = closing(temp_array[t, :, :, :], footprint=structure)
+
+        # 2D+T
+        elif tCount > 1 and zCount == 1:
+            axes = 'TYX'
+            for t in range(0, dims[0]):
+                temp_array[t, :, :] = skeletonize(temp_array[t, :, :])
+                if open_skeleton:
+                    temp_array[t, :, :] = opening(temp_array[t, :, :], footprint=structure)
+                elif close_radius > 0:
+                    temp_array[t, :, :] = closing(temp_array[t, :, :], footprint=structure)
+
+        # 3D
+        elif tCount == 1 and zCount > 1:
+            axes = 'ZYX'
+            temp_array = skeletonize_3d(temp_array).astype(np.uint8)
             if open_skeleton:
-                temp_array[t, :, :, :] = opening(temp_array[t, :, :, :], footprint=structure)
+                temp_array = opening(temp_array, footprint=structure)
             elif close_radius > 0:
-                temp_array[t, :, :, :] = closing(temp_array[t, :, :, :], footprint=structure)
+                temp_array = closing(temp_array, footprint=structure)
 
-    # 2D+T
-    elif tCount > 1 and zCount == 1:
-        axes = 'TYX'
-        for t in range(0, dims[0]):
-            temp_array[t, :, :] = skeletonize(temp_array[t, :, :])
+        # 2D
+        else:
+            temp_array = skeletonize(temp_array)
             if open_skeleton:
-                temp_array[t, :, :] = opening(temp_array[t, :, :], footprint=structure)
+                temp_array = opening(temp_array, footprint=structure)
             elif close_radius > 0:
-                temp_array[t, :, :] = closing(temp_array[t, :, :], footprint=structure)
-
-    # 3D
-    elif tCount == 1 and zCount > 1:
-        axes = 'ZYX'
-        temp_array = skeletonize_3d(temp_array).astype(np.uint8)
-        if open_skeleton:
-            temp_array = opening(temp_array, footprint=structure)
-        elif close_radius > 0:
-            temp_array = closing(temp_array, footprint=structure)
-
-    # 2D
-    else:
-        temp_array = skeletonize(temp_array)
-        if open_skeleton:
-            temp_array = opening(temp_array, footprint=structure)
-        elif close_radius > 0:
-            temp_array = closing(temp_array, footprint=structure)
-
-    t2_sk = datetime.now()
-    print(f'Skeleton detected in {round((t2_sk - t1_sk).total_seconds())} seconds')
-
-    # Skeleton is binarized
-    bin_skeleton = np.where(temp_array.astype(image_data.dtype) > 0, 1, 0).astype(image_data.dtype)
+                temp_array = closing(temp_array, footprint=structure)
+
+    with stage('nodes'):
+        # Skeleton is binarized
+        bin_skeleton = np.where(temp_array.astype(image_data.dtype) > 0, 1, 0).astype(image_data.dtype)
     
-    # Define a structuring element to find nodes
-    if zCount > 1:
-        structuring_element = cube(3)
-    else:
-        structuring_element = square(3)
+        # Define a structuring element to find nodes
+        if zCount > 1:
+            structuring_element = cube(3)
+        else:
+            structuring_element = square(3)
         
-    # Label connected components in the skeleton
-    labeled_skeletons, num_skeletons = label(bin_skeleton, structuring_element)
+        # Label connected components in the skeleton
+        labeled_skeletons, num_skeletons = label(bin_skeleton, structuring_element)
 
-    # Initialize an empty array to store node points
-    nodes = np.zeros_like(bin_skeleton)
+        # Initialize an empty array to store node points
+        nodes = np.zeros_like(bin_skeleton)
 
-    # Distance manually defined here to search for connectivity of each skeleton pixels
-    branch_dist = 1
+        # Distance manually defined here to search for connectivity of each skeleton pixels
+        branch_dist = 1
 
-    # Iterate over each feature and check connectivity
-    no_nodes = 0
-    t1 = datetime.now()
+        # Iterate over each feature and check connectivity
+        no_nodes = 0
+        for sk_no in range(1, num_skeletons + 1):
+            single_skeleton = np.where(labeled_skeletons == sk_no)
 
-    for sk_no in range(1, num_skeletons + 1):
-        single_skeleton = np.where(labeled_skeletons == sk_no)
+            for i in range(len(single_skeleton[0])):
+                if zCount > 1:
+                    px = single_skeleton[0][i], single_skeleton[1][i], single_skeleton[2][i]
+                else:
+                    px = single_skeleton[0][i], single_skeleton[1][i]
 
-        for i in range(len(single_skeleton[0])):
-            if zCount > 1:
-                px = single_skeleton[0][i], single_skeleton[1][i], single_skeleton[2][i]
-            else:
-                px = single_skeleton[0][i], single_skeleton[1][i]
-
-            cropped_skeleton = crop_array(bin_skeleton, px, branch_dist)
-
-            # A node typically has 3 or more connected components (removing one corresponding to the central pixel
-            if np.sum(cropped_skeleton) >= 3 + 1:
-                nodes[px] = 1
-                no_nodes += 1
-
-        ''' IDEA TO DEVELOP >> transform skeleton as point cloud in 2D/3D and assess distance of pixels with KDtree?
-        from sklearn.neighbors import KDTree
-        tree = KDTree(pcloud)
-
-        # For finding K neighbors of P1 with shape (1, 3)
-        indices, distances = tree.query(P1, K)
-        '''
-
-    t2 = datetime.now()
-    print(f'Number of detected nodes = {no_nodes}\n...done in {round((t2 - t1).total_seconds())} seconds')
-
-    # Dilation of maps
-    # Define a structuring element for dilation
-    if zCount > 1:
-        largest = disk(node_dilation_size)
-        inter = disk(node_dilation_size - 1)
-        smallest = disk(node_dilation_size - 2)
-        len_to_add_1 = int((len(largest) - len(inter)) / 2)
-        len_to_add_2 = int((len(largest) - len(smallest)) / 2)
-        struct_element_nodes = np.stack([np.pad(smallest, len_to_add_2),
-                                np.pad(inter, len_to_add_1),
-                                largest,
-                                np.pad(inter, len_to_add_1),
-                                np.pad(smallest, len_to_add_2)])
-
-        largest = disk(skeleton_dilation_size)
-        smallest = disk(1)
-        len_to_add = int((len(largest) - len(smallest)) / 2)
-        struct_element_sk = np.stack([np.pad(smallest, len_to_add), largest, np.pad(smallest, len_to_add)])
-    else:
-        struct_element_nodes = disk(node_dilation_size)
-        struct_element_sk = disk(skeleton_dilation_size)
-
-    dilated_bin_skeleton = binary_dilation(bin_skeleton, struct_element_sk).astype(image_data.dtype) * bitdepth_max
-    dilated_nodes = binary_dilation(nodes, struct_element_nodes).astype(image_data.dtype) * bitdepth_max
-    dilated_branches = np.subtract(dilated_bin_skeleton, dilated_nodes).astype(image_data.dtype)
-
-    # Save data to go back to Aivia
-    meta_info = {'axes': axes}
-    imsave(skeleton_p, dilated_bin_skeleton, imagej=True, photometric='minisblack', metadata=meta_info)
-    imsave(nodes_map_p, dilated_nodes, imagej=True, photometric='minisblack', metadata=meta_info)
-    imsave(branches_map_p, dilated_branches, imagej=True, photometric='minisblack', metadata=meta_info)
+                cropped_skeleton = crop_array(bin_skeleton, px, branch_dist)
+
+                # A node typically has 3 or more connected components (removing one corresponding to the central pixel
+                if np.sum(cropped_skeleton) >= 3 + 1:
+                    nodes[px] = 1
+                    no_nodes += 1
+
+            ''' IDEA TO DEVELOP >> transform skeleton as point cloud in 2D/3D and assess distance of pixels with KDtree?
+            from sklearn.neighbors import KDTree
+            tree = KDTree(pcloud)
+
+            # For finding K neighbors of P1 with shape (1, 3)
+            indices, distances = tree.query(P1, K)
+            '''
+
+        print(f'Number of detected nodes = {no_nodes}')
+
+    with stage('write'):
+        # Dilation of maps
+        # Define a structuring element for dilation
+        if zCount > 1:
+            largest = disk(node_dilation_size)
+            inter = disk(node_dilation_size - 1)
+            smallest = disk(node_dilation_size - 2)
+            len_to_add_1 = int((len(largest) - len(inter)) / 2)
+            len_to_add_2 = int((len(largest) - len(smallest)) / 2)
+            struct_element_nodes = np.stack([np.pad(smallest, len_to_add_2),
+                                    np.pad(inter, len_to_add_1),
+                                    largest,
+                                    np.pad(inter, len_to_add_1),
+                                    np.pad(smallest, len_to_add_2)])
+
+            largest = disk(skeleton_dilation_size)
+            smallest = disk(1)
+            len_to_add = int((len(largest) - len(smallest)) / 2)
+            struct_element_sk = np.stack([np.pad(smallest, len_to_add), largest, np.pad(smallest, len_to_add)])
+        else:
+            struct_element_nodes = disk(node_dilation_size)
+            struct_element_sk = disk(skeleton_dilation_size)
+
+        dilated_bin_skeleton = binary_dilation(bin_skeleton, struct_element_sk).astype(image_data.dtype) * bitdepth_max
+        dilated_nodes = binary_dilation(nodes, struct_element_nodes).astype(image_data.dtype) * bitdepth_max
+        dilated_branches = np.subtract(dilated_bin_skeleton, dilated_nodes).astype(image_data.dtype)
+
+        # Save data to go back to Aivia
+        meta_info = {'axes': axes}
+        imsave(skeleton_p, dilated_bin_skeleton, imagej=True, photometric='minisblack', metadata=meta_info)
+        imsave(nodes_map_p, dilated_nodes, imagej=True, photometric='minisblack', metadata=meta_info)
+        imsave(branches_map_p, dilated_branches, imagej=True, photometric='minisblack', metadata=meta_info)
 
 
 def crop_array(arr, central_coords, crop_radius):
@@ -280,3 +286,4 @@ if __name__ == '__main__':
 # CHANGELOG:
 #   v1.00: - Version using cropped 3*3 kernels on each pixel/voxel of the skeleton to detect nodes
 #   v1.10: - Replacing 'selem' by 'footprint' for morphomathematical functions and fixed 3D footprint format for dilation
+#   v1.20: - Stage timings recorded with Recipes/utils/profiling.py (AIVIA_RECIPE_PROFILE=1) instead of printed
@@ -1,16 +1,34 @@
-import math
+import sys
+from functools import partial
+from pathlib import Path
 import numpy as np
-from tifffile import imread, imwrite
 from skimage.restoration import rolling_ball
-from skimage.transform import rescale
 from skimage.util import img_as_ubyte, img_as_uint
 import ctypes
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.tiff_io import open_image, write_frames
+from Recipes.utils.frames import run_per_frame, map_frames
+from Recipes.utils.background import paraboloid_background
+from Recipes.utils.result_cache import cached_run
+from Recipes.utils.profiling import profiled, stage
+# ---------------------------------------------------------------
+
 """
 See: https://scikit-image.org/docs/stable/api/skimage.restoration.html#skimage.restoration.rolling_ball
 
 Process a single channel image to subtract the background.
 
+The ball of skimage costs its area per pixel: it is used up to a radius of 50 pixels.
+Larger radii, and the paraboloid shape, use a paraboloid with the ball's curvature at
+its top, whose cost does not depend on the radius (see Recipes/utils/background.py).
+For large radii it gives the ball's background within a few grey levels, without
+downsampling the image. 3D images can be processed with a 3D paraboloid (Z calibration
+taken into account) instead of plane by plane.
+
 Requirements
 ------------
 numpy (comes with Aivia installer)
@@ -25,6 +43,12 @@ Input Image : Aivia channel
 Radius : int
     Size of kernel used.
 
+Shape : int
+    0 = ball (paraboloid above 50 pixels), 1 = paraboloid.
+
+3D : int
+    0 = plane by plane, 1 = 3D paraboloid for 3D and 3D+T images.
+
 Returns
 -------
 Aivia image
@@ -32,9 +56,16 @@ Aivia image
 """
 
 
+BALL_RADIUS_LIMIT = 50      # Larger balls are replaced by paraboloids
+
+
 # [INPUT Name:inputImagePath Type:string DisplayName:'Input Image']
 # [INPUT Name:radius Type:int DisplayName:'Radius (calibrated distance)' Default:0 Min:0 Max:100]
+# [INPUT Name:shape Type:int DisplayName:'Shape (0=Ball, 1=Paraboloid)' Default:0 Min:0 Max:1]
+# [INPUT Name:use3D Type:int DisplayName:'3D (0=No, 1=Yes)' Default:0 Min:0 Max:1]
 # [OUTPUT Name:resultImagePath Type:string DisplayName:'Processed Image']
+@profiled
+@cached_run
 def run(params):
     image_location = params['inputImagePath']
     result_location = params['resultImagePath']
@@ -45,111 +76,82 @@ def run(params):
     pixel_cal_tmp = params['Calibration']
     pixel_cal = pixel_cal_tmp[6:].split(', ')           # Expects calibration with 'XYZT: ' in front
     XY_cal = float(pixel_cal[0].split(' ')[0])
+    Z_cal = float(pixel_cal[2].split(' ')[0])
 
     px_radius = round(radius / XY_cal)
         
-    image_data = imread(image_location)
+    image_data = open_image(image_location)
     dims = image_data.shape
     
-    processed = np.empty_like(image_data)
-    parameters = {'radius': px_radius if px_radius > 0 else 1}
+    use_3d = int(params.get('use3D', 0)) == 1 and zCount > 1
+    frame_ndim = 3 if use_3d else 2
+    parameters = {'radius': px_radius if px_radius > 0 else 1,
+                  'paraboloid': use_3d or int(params.get('shape', 0)) == 1,
+                  'spacing': (Z_cal / XY_cal, 1.0, 1.0) if use_3d else None}
     print(f"Pixel-based radius for rolling ball: {parameters['radius']}")
 
     # xD+T
     if tCount > 1:
         if zCount == 1:                                                         # 2D+T
             print(f"Applying to 2D+T case with dims: {image_data.shape}")
-            for t in range(dims[0]):
-                if dims[0] == tCount:
-                    processed[t, :, :] = process_img(image_data[t, :, :], parameters)
-                    axes = 'TYX'  # Format from tifffile
-                else:
-                    processed[:, :, t] = process_img(image_data[:, :, t], parameters)
-                    axes = 'YXT'
-                    print('Processing an unconventional timelapse with YXT dimensions')
+            axes = 'TYX' if dims[0] == tCount else 'YXT'                        # TYX is the format from tifffile
         else:                                                                            # 3D+T
             print(f"Applying to 3D+T case with dims: {image_data.shape}")
-            for t in range(dims[0]):
-                for z in range(dims[1]):
-                    if dims[0] == tCount:
-                        processed[t, z, :, :] = process_img(image_data[t, z, :, :], parameters)
-                        axes = 'TZYX'  # Format from tifffile
-                    else:
-                        processed[z, :, :, t] = process_img(image_data[z, :, :, t], parameters)
-                        axes = 'ZYXT'
-                        print('Processing an unconventional timelapse with ZYXT dimensions')
+            axes = 'TZYX' if dims[0] == tCount else 'ZYXT'                      # TZYX is the format from tifffile
 
     # 2D and 3D
     elif tCount == 1:
         if zCount == 1:                                                     # 2D
             print(f"Applying to 2D case with dims: {image_data.shape}")
-            processed = process_img(image_data, parameters)
             axes = 'YX'
         else:                                                               # 3D
             print(f"Applying to 3D case with dims: {image_data.shape}")
-            for z in range(dims[0]):
-                processed[z, :, :] = process_img(image_data[z, :, :], parameters)
             axes = 'ZYX'
 
-    # Conversion to 8 or 16 bit
-    if image_data.dtype == np.uint16:
-        final_mask = img_as_uint(processed)
-    else:
-        final_mask = img_as_ubyte(processed)
-
-    print(f'Converting processed image from {processed.dtype} (min={np.min(processed)}, max={np.max(processed)})'
-          f' to {final_mask.dtype} (min={np.min(final_mask)}, max={np.max(final_mask)})')
-
-    imwrite(result_location, final_mask, metadata={'axes': axes})
+    with stage('compute and write'):
+        # Background is evaluated plane by plane, or frame by frame in 3D
+        kernel = partial(process_img, params=parameters)
+        if axes.endswith('T'):
+            print(f'Processing an unconventional timelapse with {axes} dimensions')
+            # Planes are not contiguous in the file, the whole image is processed before writing
+            image_data = np.asarray(image_data)
+            processed = np.empty_like(image_data)
+            run_per_frame(kernel, np.moveaxis(image_data, -1, 0), np.moveaxis(processed, -1, 0), tCount, zCount,
+                          frame_ndim=frame_ndim)
+            frames = [processed]
+        else:
+            # Each plane (or 3D frame) is written as soon as it is processed
+            frames = map_frames(kernel, image_data, tCount, zCount, frame_ndim=frame_ndim)
+
+        # Conversion to 8 or 16 bit
+        output_dtype = np.uint16 if image_data.dtype == np.uint16 else np.uint8
+        ranges = []
+        write_frames(result_location, convert_frames(frames, output_dtype, ranges), dims, output_dtype,
+                     metadata={'axes': axes})
+
+    ranges = np.array(ranges)
+    print(f'Converting processed image from {image_data.dtype} (min={ranges[:, 0].min()}, max={ranges[:, 1].max()})'
+          f' to {np.dtype(output_dtype)} (min={ranges[:, 2].min()}, max={ranges[:, 3].max()})')
+
+
+def convert_frames(frames, dtype, ranges):
+    for processed in frames:
+        final_mask = img_as_uint(processed) if dtype == np.uint16 else img_as_ubyte(processed)
+        ranges.append((np.min(processed), np.max(processed), np.min(final_mask), np.max(final_mask)))
+        yield final_mask
 
 
 def process_img(img_array, params: dict):
-    # Downsampling image if radius is to large
-    downsamp_factor = 1
-    division_factor = 2
-    interpol_mode = 1  # 0: Nearest-neighbor, 1: Bi-linear , 2: Bi-quadratic, 3: Bi-cubic, 4: Bi-quartic, 5: Bi-quintic
-    radius_thr = 50
-
-    tmp_radius = params['radius']
-    while tmp_radius > radius_thr:
-        tmp_radius = math.floor(tmp_radius / division_factor)
-        downsamp_factor *= division_factor
-
-    final_radius = tmp_radius
-
-    # Downsampling the image, if needed
-    if downsamp_factor > 1:
-        proc_img_array = rescale(img_array, 1 / downsamp_factor, interpol_mode, preserve_range=True)
-        print(f'--- Downsampling the image {downsamp_factor}x because '
-              f'pixel radius {params["radius"]} is higher than defined threshold ({radius_thr}). ---')
-    else:
-        proc_img_array = img_array
+    radius = params['radius']
 
     # Evaluate background map
-    downsampled_bkg = rolling_ball(proc_img_array, radius=final_radius).astype(proc_img_array.dtype)
-
-    # Revert image back to original scale
-    if downsamp_factor > 1:
-        # Calculating back the upsampling factor
-        fact_y = img_array.shape[0] / downsampled_bkg.shape[0]
-        fact_x = img_array.shape[1] / downsampled_bkg.shape[1]
-        upsamp_factor = max(fact_y, fact_x)
-
-        proc_bkg = rescale(downsampled_bkg, upsamp_factor, interpol_mode).astype(img_array.dtype)
-
-        # Transfer to the array
-        final_bkg = proc_bkg[:img_array.shape[0], :img_array.shape[1]]
-
-        print(f'--- Upsampling the image {upsamp_factor}x to revert image to original size.'
-              f'\nOriginal size:{img_array.shape[0]} * {img_array.shape[1]} ---'
-              f'\nRescaled size:{proc_bkg.shape[0]} * {proc_bkg.shape[1]} ---')
+    if params['paraboloid'] or radius > BALL_RADIUS_LIMIT:
+        background = paraboloid_background(img_array, radius, params['spacing'])
     else:
-        final_bkg = downsampled_bkg
+        background = rolling_ball(img_array, radius=radius).astype(img_array.dtype)
 
     # Subtracting the background
-    final_data = np.where(img_array >= final_bkg, img_array - final_bkg, 0)
-
-    # final_data = final_bkg
+    final_data = np.where(img_array >= background, img_array - background, 0)
 
     return final_data
 
@@ -172,3 +174,7 @@ if __name__ == '__main__':
 # CHANGELOG
 # v1_00: - From DetectEdges_v1_00.py
 # v1_10: - Adding the possibility to process 3D and 3D + T images
+# v1_20: - Planes are processed in parallel with the shared per-frame executor
+# v1_30: - Planes are written as soon as they are processed (peak memory of a few planes)
+# v1_40: - Rolling paraboloid (cost independent of the radius) instead of downsampling for radii above 50 px,
+#          paraboloid shape option and 3D paraboloid option using the Z calibration
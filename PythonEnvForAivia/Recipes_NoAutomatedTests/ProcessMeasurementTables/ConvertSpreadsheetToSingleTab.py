@@ -23,8 +23,16 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
-import pandas as pd
-import wx
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
+pd = lazy_import('pandas')
+wx = lazy_import('wx')
 import threading
 
 """
@@ -63,6 +71,7 @@ DataFrame
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     # Pick the file
     aivia_excel_file = pick_file()
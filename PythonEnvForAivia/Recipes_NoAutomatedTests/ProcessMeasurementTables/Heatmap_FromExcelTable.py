@@ -23,13 +23,21 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
-import pandas as pd
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
+pd = lazy_import('pandas')
 import re
-import wx
-import matplotlib.pyplot as plt
-import seaborn as sns
+wx = lazy_import('wx')
+plt = lazy_import('matplotlib.pyplot')
+sns = lazy_import('seaborn')
 import numpy as np
-from magicgui import magicgui
+magicgui = lazy_import('magicgui', 'magicgui')
 import concurrent.futures
 
 # Folder to quickly run the script on all Excel files in it
@@ -87,6 +95,7 @@ default_color_maps = ['Accent', 'Accent_r', 'Blues', 'Blues_r', 'BrBG', 'BrBG_r'
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     color_map = sns.diverging_palette(150, 275, s=80, l=55, n=9)        # Max = 359
     # color_map = 'crest'
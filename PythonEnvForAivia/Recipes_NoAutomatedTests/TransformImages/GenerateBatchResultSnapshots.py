@@ -26,11 +26,17 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.lazy_import import lazy_import
+from Recipes.utils.profiling import profiled
+from Recipes.utils.histogram import percentiles, rescale_to_range
+# ---------------------------------------------------------------
+
 import numpy as np
-import pandas as pd
-import wx
 import concurrent.futures
-from magicgui import magicgui, widgets
 import re
 from tifffile import imread, imwrite, TiffFile
 from skimage.exposure import rescale_intensity
@@ -40,6 +46,10 @@ from skimage.morphology import binary_dilation, disk
 from PIL import Image, ImageDraw, ImageFont
 from xml.dom import minidom
 from datetime import datetime
+pd = lazy_import('pandas')
+wx = lazy_import('wx')
+magicgui = lazy_import('magicgui', 'magicgui')
+widgets = lazy_import('magicgui.widgets')
 
 # Folder to quickly run the script on all Excel files in it
 DEFAULT_FOLDER = r""
@@ -123,6 +133,7 @@ Images
 
 # [INPUT Name:inputPath Type:string DisplayName:'Any channel']
 # [OUTPUT Name:resultPath Type:string DisplayName:'Dummy to delete']
+@profiled
 def run(params):
     global choice_list1, downscale_f, img_ext, display_type, quantile_values
 
@@ -365,12 +376,12 @@ def run(params):
         for c in range(len(channels)):
             print(f"*** Processing channel {c+1} out of {len(channels)} ")
             if display_selection[c] == display_type[0]:     # As original but with quantile-based autoscale
-                # Using quantile values
-                q_min = np.percentile(scaled_img_arr[c], int(quantile_values['min_val'] * 100))
-                q_max = np.percentile(scaled_img_arr[c], int(quantile_values['max_val'] * 100))
+                # Using quantile values (with the min and max, from the same histogram)
+                img_min, q_min, q_max, img_max = percentiles(scaled_img_arr[c], [0, int(quantile_values['min_val'] * 100),
+                                                                                 int(quantile_values['max_val'] * 100), 100])
 
-                if q_min != np.min(scaled_img_arr[c]) or q_max != np.max(scaled_img_arr[c]):
-                    scaled_img_arr[c] = rescale_intensity(scaled_img_arr[c], in_range=(q_min, q_max), out_range='dtype')
+                if q_min != img_min or q_max != img_max:
+                    rescale_to_range(scaled_img_arr[c], q_min, q_max, out=scaled_img_arr[c])
                     print(f"Processed image using Quantiles (min = {quantile_values['min_val']}, max = {quantile_values['max_val']})")
 
             # Convert masks to outlines if requested
@@ -423,7 +434,7 @@ def run(params):
                 input_mask = scaled_img_arr[c]
                 if len(np.unique(input_mask)) != 2:
                     # Create binary mask
-                    q_val = np.percentile(input_mask[np.nonzero(input_mask)], int(quantile_values['binary_val'] * 100))
+                    q_val = percentiles(input_mask, int(quantile_values['binary_val'] * 100), exclude_zero=True)
                     img_max = np.iinfo(input_mask.dtype).max
                     print(f"Image is not binary but binary mask was requested.",
                           f"\nCreating binary from quantile ({quantile_values['binary_val']}) value = {q_val}.")
@@ -1099,3 +1110,5 @@ if __name__ == '__main__':
 # Changelog:
 # v1.00: - Code from ProcessMultipleExcelTables_FromAivia / CreateGalleries
 # v1.10: - Updating MagicGui from 0.5.1 to 0.9.1 with new container functionality to better control UI appearance
+# v1.20: - Quantiles from the histogram of each channel and rescaling through a lookup table (no sort, no float copy)
+# v1.21: - pandas, wx and magicgui widgets are imported on first use
@@ -25,6 +25,13 @@ else:
     sys.exit(error_mess)
 # ---------------------------------------------------------------
 
+# -------- Shared recipe utilities ------------------------------
+utils_root = str(Path(__file__).parents[2])
+if utils_root not in sys.path:
+    sys.path.append(utils_root)
+from Recipes.utils.profiling import profiled
+# ---------------------------------------------------------------
+
 from magicgui import magicgui
 from skimage.io import imread, imsave
 import numpy as np
@@ -85,6 +92,7 @@ reg_types = {
 # [INPUT Name:inputRawImagePath2 Type:string DisplayName:'Unregistered Ch 1 (aligned)']
 # [OUTPUT Name:resultPath1 Type:string DisplayName:'Registered Ch 2']
 # [OUTPUT Name:resultPath2 Type:string DisplayName:'Registered Ch 1']
+@profiled
 def run(params):
     global reg_methods, reg_types, n_channels
 
@@ -0,0 +1,119 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+import tifffile
+from scipy import ndimage
+from skimage.restoration import rolling_ball
+from Recipes_NoAutomatedTests.ProcessImages import SubtractBackground_RollingBall
+from Recipes.utils import background
+from Recipes.utils.background import paraboloid_background
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the rolling paraboloid of Recipes/utils/background.py with a direct erosion by
+the paraboloid on crops of the inputs of the MeijeringNeuriteness test configurations
+(2D and 3D, anisotropic Z, blocks of a few lines), and runs SubtractBackground_RollingBall
+with a radius above the ball limit (compared with skimage's ball, which it replaces) and
+with the 3D paraboloid.'''
+
+RADIUS = 60
+BALL_ATOL = 8           # Grey levels between the ball and the paraboloid backgrounds for RADIUS
+
+
+def direct_background(image, radius, spacing):
+    # Erosion by the paraboloid over offsets reaching the whole image
+    offsets = np.ogrid[tuple(slice(-n + 1, n) for n in image.shape)]
+    profile = sum((step * offset) ** 2 for step, offset in zip(spacing, offsets)) / (2.0 * radius)
+    eroded = ndimage.grey_erosion(image.astype(np.float64), structure=-profile, mode='constant', cval=np.inf)
+    return eroded.astype(np.float32).astype(image.dtype)
+
+
+def run_test(config):
+    image_data = tifffile.imread(config['inputImagePath'])
+    zCount = int(config['ZCount'])
+    frame = image_data[0] if int(config['TCount']) > 1 else image_data
+    # Small crops: the direct erosion visits every pair of pixels
+    crop = frame[:8, 30:42, 20:32] if zCount > 1 else frame[30:60, 20:50]
+
+    with mock.patch.object(background, 'BLOCK_BYTES', 20000):
+        for radius in [1, 5, 40]:
+            spacings = [(1.0,) * crop.ndim] + ([(2.5, 1.0, 1.0)] if zCount > 1 else [])
+            for spacing in spacings:
+                assert np.array_equal(paraboloid_background(crop, radius, spacing),
+                                      direct_background(crop, radius, spacing)), (radius, spacing)
+    return True
+
+
+def run_recipe_test(config):
+    config.pop('groundTruthPath_1')
+    output_folder = tempfile.mkdtemp()
+    params = {'inputImagePath': config['inputImagePath'], 'radius': RADIUS,
+              'resultImagePath': os.path.join(output_folder, 'background_subtracted.tif'),
+              'TCount': config['TCount'], 'ZCount': config['ZCount'], 'Calibration': config['Calibration']}
+    try:
+        SubtractBackground_RollingBall.run(params=params)
+        image_data = tifffile.imread(params['inputImagePath'])
+        planes = image_data.reshape((-1,) + image_data.shape[-2:])
+        ball = np.stack([np.where(plane >= b, plane - b, 0) for plane, b in
+                         ((plane, rolling_ball(plane, radius=RADIUS).astype(plane.dtype)) for plane in planes)])
+        result = tifffile.imread(params['resultImagePath']).reshape(ball.shape)
+        assert np.abs(result.astype(np.int64) - ball).max() <= BALL_ATOL
+
+        if int(config['ZCount']) > 1:
+            params['use3D'] = 1
+            SubtractBackground_RollingBall.run(params=params)
+            expected = image_data - paraboloid_background(image_data, RADIUS, (1.0, 1.0, 1.0))
+            assert np.array_equal(tifffile.imread(params['resultImagePath']), expected)
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    return True
+
+class Test_Background(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+    def dynamic_recipe_test_generator(self, config):
+        self.assertTrue(run_recipe_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+def generate_recipe_test_method(config):
+    def test_method(self):
+        self.dynamic_recipe_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "MeijeringNeuriteness", "Config_MeijeringNeuriteness.json")
+# 8 and 16-bit 2D and 3D configurations (and 2D+T and 3D+T for the paraboloid only, the
+# ball of skimage being slow for this radius), the first four run with the recipe as well
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+recipe_configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                              'Test_16bit_YX_Fluo_nuclei.tif',
+                                                              'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                              'Test_16bit_ZYX_mitoFluo_T15.tif'])
+
+# Dynamically create test methods for each configuration
+for i, config in enumerate(configurations):
+    test_name = f"test_Background_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_Background, test_name, test_method)
+
+for i, config in enumerate(recipe_configurations):
+    test_name = f"test_Background_SubtractBackground_{i:02d}"  # Must start with "test_"
+    test_method = generate_recipe_test_method(config)
+    setattr(Test_Background, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
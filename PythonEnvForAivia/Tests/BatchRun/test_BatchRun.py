@@ -0,0 +1,56 @@
+import unittest
+import os
+import shutil
+import tempfile
+from Recipes.utils.batch_run import run_batch, build_params
+from Tests.utils.comparison import isIdentical
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Runs ShapeIndex with the headless batch runner on a folder holding the inputs of the
+ShapeIndex test configurations: the parameters inferred from the files must be the
+ones of the configurations and the outputs identical to the ground truth.'''
+
+RECIPE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "Recipes", "ProcessImages", "ShapeIndex.py")
+
+
+def run_test(configs):
+    input_folder = tempfile.mkdtemp()
+    output_folder = tempfile.mkdtemp()
+    try:
+        for config in configs:
+            shutil.copy(config['inputImagePath'], input_folder)
+        images = sorted(os.path.join(input_folder, name) for name in os.listdir(input_folder))
+        overrides = {'sigma': str(configs[0]['sigma'])}
+
+        rows = run_batch(RECIPE_PATH, images, output_folder, overrides, workers=2)
+        assert [row['status'] for row in rows] == ['ok'] * len(configs)
+        assert os.path.exists(os.path.join(output_folder, 'batch_summary.csv'))
+
+        for config in configs:
+            image_location = os.path.join(input_folder, os.path.basename(config['inputImagePath']))
+            params = build_params(RECIPE_PATH, image_location, output_folder, overrides)
+            assert (params['ZCount'], params['TCount']) == (config['ZCount'], config['TCount'])
+            assert isIdentical(config['groundTruthPath_1'], params['resultPath'], atol=config.get('atol', 0))
+    finally:
+        shutil.rmtree(input_folder, ignore_errors=True)
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    return True
+
+class Test_BatchRun(unittest.TestCase):
+    def test_BatchRun_00(self):
+        self.assertTrue(run_test(configurations))
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "ShapeIndex", "Config_ShapeIndex.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+import tifffile
+from skimage.exposure import equalize_adapthist
+from Recipes_NoAutomatedTests.ProcessImages import AutoAdjustChannel
+from Recipes.utils import clahe as clahe_module
+from Recipes.utils.clahe import clahe
+from Recipes.utils.dtype_policy import to_dtype
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the CLAHE of Recipes/utils/clahe.py with skimage.exposure.equalize_adapthist
+(converted with to_dtype) on the inputs of the MeijeringNeuriteness test configurations
+(8 and 16-bit, 2D and 3D frames, 2D and 3D kernels, clip limits, small chunks and
+several threads), and runs the CLAHE mode of AutoAdjustChannel on 2D and 3D images with
+a 3D kernel depth.'''
+
+KERNEL_DEPTH = 3
+
+
+def run_test(config):
+    image_data = tifffile.imread(config['inputImagePath'])
+    frame = image_data[0] if int(config['TCount']) > 1 else image_data
+
+    kernels = [None, 8, (4, 9, 9)[-frame.ndim:], (1, 500, 500)[-frame.ndim:]]
+    for kernel_size in kernels:
+        for clip_limit in [0.01, 0.0]:
+            expected = to_dtype(equalize_adapthist(frame, kernel_size, clip_limit), frame.dtype)
+            assert np.array_equal(clahe(frame, kernel_size, clip_limit), expected), (kernel_size, clip_limit)
+
+    with mock.patch.object(clahe_module, 'BLOCK_BYTES', 20000):
+        expected = to_dtype(equalize_adapthist(frame, kernels[2], nbins=64), np.uint16)
+        assert np.array_equal(clahe(frame, kernels[2], nbins=64, dtype=np.uint16, max_workers=3), expected)
+    return True
+
+
+def run_recipe_test(config):
+    config.pop('groundTruthPath_1')
+    output_folder = tempfile.mkdtemp()
+    params = {'inputImagePath': config['inputImagePath'], 'kernelDepth': KERNEL_DEPTH,
+              'resultImagePath': os.path.join(output_folder, 'autoadjusted.tif'),
+              'TCount': config['TCount'], 'ZCount': config['ZCount']}
+    try:
+        AutoAdjustChannel.run(params=params)
+        image_data = tifffile.imread(params['inputImagePath'])
+        kernel_size = (KERNEL_DEPTH, 500, 500)[-image_data.ndim:]
+        expected = to_dtype(equalize_adapthist(image_data, kernel_size), image_data.dtype)
+        assert np.array_equal(tifffile.imread(params['resultImagePath']), expected)
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    return True
+
+class Test_CLAHE(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+    def dynamic_recipe_test_generator(self, config):
+        self.assertTrue(run_recipe_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+def generate_recipe_test_method(config):
+    def test_method(self):
+        self.dynamic_recipe_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "MeijeringNeuriteness", "Config_MeijeringNeuriteness.json")
+# 8 and 16-bit 2D, 3D, 2D+T and 3D+T configurations (the first frame of time series), and
+# the recipe on 2D and 3D images
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+recipe_configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                              'Test_16bit_YX_Fluo_nuclei.tif',
+                                                              'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                              'Test_16bit_ZYX_mitoFluo_T15.tif'])
+
+# Dynamically create test methods for each configuration
+for i, config in enumerate(configurations):
+    test_name = f"test_CLAHE_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_CLAHE, test_name, test_method)
+
+for i, config in enumerate(recipe_configurations):
+    test_name = f"test_CLAHE_AutoAdjustChannel_{i:02d}"  # Must start with "test_"
+    test_method = generate_recipe_test_method(config)
+    setattr(Test_CLAHE, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import tifffile
+import matplotlib.pyplot as plt
+from Recipes.TransformImages import ZColorCoding
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Runs ZColorCoding with the color-coded max projection output and compares it with the
+maximum of each pixel multiplied by the color of the slice (or time point) where it is
+reached, on the ZColorCoding test configurations (2D+t, 3D and 3D+t).'''
+
+
+def expected_projection(image_data, colors, coded_axis):
+    maximum = image_data.max(axis=coded_axis)
+    argmax = image_data.argmax(axis=coded_axis)
+    rgb = [(maximum * colors[argmax, c]).astype(image_data.dtype) for c in range(3)]
+    return np.stack(rgb, axis=-3)
+
+
+def run_test(config):
+    for key in ('groundTruthPath_1', 'groundTruthPath_2', 'groundTruthPath_3'):
+        config.pop(key)
+    tCount, zCount = int(config['TCount']), int(config['ZCount'])
+    output_folder = tempfile.mkdtemp()
+    for key in ('resultPathRed', 'resultPathGreen', 'resultPathBlue'):
+        config[key] = os.path.join(output_folder, os.path.basename(config[key]))
+    config['fileOutputPath_4'] = os.path.join(output_folder, 'projection.tif')
+    config['projectionMode'] = 1
+    try:
+        ZColorCoding.run(params=config)
+
+        image_data = tifffile.imread(config['inputImagePath'])
+        color_count = tCount if zCount == 1 else zCount
+        colors = np.asarray(plt.get_cmap(ZColorCoding.cmaps[int(config['colorMapChoice'])], color_count).colors)
+        expected = expected_projection(image_data, colors, 1 if tCount > 1 and zCount > 1 else 0)
+        projection = tifffile.imread(config['fileOutputPath_4'])
+        assert projection.dtype == image_data.dtype
+        assert np.array_equal(projection, expected)
+
+        for key in ('resultPathRed', 'resultPathGreen', 'resultPathBlue'):
+            empty_channel = tifffile.imread(config[key])
+            assert empty_channel.shape == image_data.shape and not empty_channel.any()
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    return True
+
+class Test_ColorCoding(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "TransformImages", "ZColorCoding", "Config_ZColorCoding.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+
+# Dynamically create test methods for 8-bit 2D+t, 8 and 16-bit 3D and 8-bit 3D+t configurations
+for i, config in enumerate(configurations):
+    test_name = f"test_ColorCoding_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_ColorCoding, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
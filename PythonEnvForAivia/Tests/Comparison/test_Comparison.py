@@ -0,0 +1,77 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import tifffile
+from Tests.utils.comparison import compare_images
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares ground truth files of the ShapeIndex test configurations with modified copies:
+the first difference must be found and located, with and without the stored plane
+hashes, and tolerances must accept small float differences.'''
+
+
+def run_test(config):
+    ground_truth_path_1 = config['groundTruthPath_1']
+    temp_folder = tempfile.mkdtemp()
+    try:
+        data = tifffile.imread(ground_truth_path_1)
+        same_path = os.path.join(temp_folder, 'same.tif')
+        tifffile.imwrite(same_path, data, compression='zlib')
+
+        position = tuple(s // 2 for s in data.shape)
+        changed = data.copy()
+        changed[position] += 1
+        changed_path = os.path.join(temp_folder, 'changed.tif')
+        tifffile.imwrite(changed_path, changed)
+
+        float_path = os.path.join(temp_folder, 'float.tif')
+        tifffile.imwrite(float_path, data.astype(np.float32) + 0.01)
+
+        for use_hashes in [False, True, True]:
+            assert compare_images(ground_truth_path_1, same_path, use_hashes=use_hashes)[0]
+            identical, message = compare_images(ground_truth_path_1, changed_path, use_hashes=use_hashes)
+            assert not identical
+            assert f'First difference at index {position}' in message
+
+        assert not compare_images(ground_truth_path_1, float_path)[0]
+        assert compare_images(ground_truth_path_1, float_path, atol=0.02)[0]
+        assert not compare_images(ground_truth_path_1, float_path, atol=0.005)[0]
+
+        # Shapes are checked before any pixel is decoded
+        cropped_path = os.path.join(temp_folder, 'cropped.tif')
+        tifffile.imwrite(cropped_path, data[..., 1:])
+        assert not compare_images(ground_truth_path_1, cropped_path)[0]
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+    return True
+
+class Test_Comparison(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "ShapeIndex", "Config_ShapeIndex.json")
+# 2D, 2D+T, 3D and 3D+T ground truths
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+
+# Dynamically create test methods for each configuration
+for i, config in enumerate(configurations):
+    test_name = f"test_Comparison_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_Comparison, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import os
+import numpy as np
+import tifffile
+from skimage.util import img_as_float32, img_as_float64, img_as_ubyte, img_as_uint
+from Recipes.utils import dtype_policy
+from Recipes.utils.dtype_policy import as_compute_float, compute_dtype, map_blocks, to_dtype
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Conversions of the data type policy on the input images of the ShapeIndex test configurations:
+float32 conversion as img_as_float32, and block by block conversion back to 8 and 16-bit
+identical to img_as_ubyte / img_as_uint, with blocks smaller than a plane.'''
+
+
+def run_test(config):
+    image = tifffile.imread(config['inputImagePath'])
+    assert compute_dtype(image.dtype) == np.float32
+
+    float_image = as_compute_float(image)
+    assert float_image.dtype == np.float32
+    assert np.array_equal(float_image, img_as_float32(image))
+
+    rng = np.random.default_rng(0)
+    signed = rng.uniform(-1, 1, image.shape)
+    signed.flat[:3] = [-1, 1, 0.5 / 65535]
+    block_bytes = dtype_policy.BLOCK_BYTES
+    dtype_policy.BLOCK_BYTES = 1000
+    try:
+        for data in [float_image, img_as_float64(image), signed, signed.astype(np.float32)]:
+            assert np.array_equal(to_dtype(data, np.uint8), img_as_ubyte(data))
+            assert np.array_equal(to_dtype(data, np.uint16), img_as_uint(data))
+        assert to_dtype(image, image.dtype) is image
+
+        inverted = map_blocks(lambda block: np.iinfo(image.dtype).max - block, image, np.empty_like(image))
+        assert np.array_equal(inverted, np.iinfo(image.dtype).max - image)
+    finally:
+        dtype_policy.BLOCK_BYTES = block_bytes
+
+    return True
+
+class Test_DtypePolicy(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "ShapeIndex", "Config_ShapeIndex.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif'])
+
+# Dynamically create test methods for 8 and 16-bit, 2D and 3D configurations
+for i, config in enumerate(configurations):
+    test_name = f"test_DtypePolicy_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_DtypePolicy, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
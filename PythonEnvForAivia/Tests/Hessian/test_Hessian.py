@@ -0,0 +1,123 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import tifffile
+from skimage.feature import hessian_matrix, hessian_matrix_eigvals, shape_index
+from skimage.util import img_as_float
+from Recipes.ProcessImages import ShapeIndex
+from Recipes.utils import hessian
+from Recipes.utils.dtype_policy import to_dtype
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the shape index of Recipes/utils/hessian.py with skimage on the inputs of the
+ShapeIndex test configurations: plane by plane with skimage.feature.shape_index, and in
+3D with the extreme eigenvalues of skimage.feature.hessian_matrix. Multi-scale results
+are compared with single scale ones, and ShapeIndex is run with the 3D Hessian and a
+stack of scales.'''
+
+SIGMAS = hessian.scale_sigmas(2.0, 3)
+
+
+def reference_3d(frame, sigma):
+    H = hessian_matrix(img_as_float(frame), sigma, mode='reflect', use_gaussian_derivatives=False)
+    eigenvalues = hessian_matrix_eigvals(H)
+    l1, l2 = eigenvalues[0], eigenvalues[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (2.0 / np.pi) * np.arctan((l2 + l1) / (l2 - l1))
+
+
+def assert_close(expected, result, atol):
+    assert np.array_equal(np.isnan(expected), np.isnan(result))
+    valid = ~np.isnan(expected)
+    assert np.allclose(expected[valid], result[valid], atol=atol), np.abs(expected[valid] - result[valid]).max()
+
+
+def run_test(config):
+    image_data = tifffile.imread(config['inputImagePath'])
+    frame = image_data[0] if int(config['TCount']) > 1 else image_data
+    plane = frame[frame.shape[0] // 2] if frame.ndim == 3 else frame
+
+    assert_close(shape_index(img_as_float(plane), 3.0, mode='reflect'), hessian.shape_index(plane, 3.0), 1e-3)
+    if frame.ndim == 3:
+        assert_close(reference_3d(frame, 3.0), hessian.shape_index(frame, 3.0), 1e-3)
+
+    # Cascaded smoothing against direct smoothing, and scale selection among the scales
+    stack = hessian.shape_index(frame, SIGMAS, stack=True)
+    selected = hessian.shape_index(frame, SIGMAS)
+    assert stack.shape == (len(SIGMAS),) + frame.shape and stack.dtype == np.float32
+    # Truncations of the cascaded kernels and borders differ by up to a few % of the index range
+    for k, sigma in enumerate(SIGMAS):
+        assert_close(hessian.shape_index(frame, sigma), stack[k], 5e-2)
+    assert np.all(np.isnan(selected) | np.any(stack == selected, axis=0))
+    return True
+
+
+def run_recipe_test(config):
+    config.pop('groundTruthPath_1')
+    config.pop('atol', 0)
+    output_folder = tempfile.mkdtemp()
+    config['resultPath'] = os.path.join(output_folder, os.path.basename(config['resultPath']))
+    config['fileOutputPath_2'] = os.path.join(output_folder, 'scales.tif')
+    config.update({'hessian3D': 1, 'scaleCount': 2, 'scaleCombination': 1})
+    tCount = int(config['TCount'])
+    try:
+        ShapeIndex.run(params=config)
+        image_data = tifffile.imread(config['inputImagePath'])
+        scales = tifffile.imread(config['fileOutputPath_2'])
+        channel_axis = scales.ndim - 3
+        frames = image_data if tCount > 1 else image_data[np.newaxis]
+        output_dtype = np.uint16 if image_data.dtype == np.uint16 else np.uint8
+        for k in range(2):
+            expected = np.stack([hessian.shape_index(frame, hessian.scale_sigmas(float(config['sigma']), 2), stack=True)[k]
+                                 for frame in frames])
+            expected = to_dtype(np.nan_to_num(expected), output_dtype)
+            assert np.array_equal(np.take(scales, k, axis=channel_axis), expected if tCount > 1 else expected[0]), k
+        assert np.array_equal(tifffile.imread(config['resultPath']), np.take(scales, 0, axis=channel_axis))
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    return True
+
+class Test_Hessian(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+    def recipe_test_generator(self, config):
+        self.assertTrue(run_recipe_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+def generate_recipe_test_method(config):
+    def test_method(self):
+        self.recipe_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "ShapeIndex", "Config_ShapeIndex.json")
+# 8 and 16-bit 2D, 2D+T and 3D configurations, and the 3D and 3D+T configurations run
+# with the recipe
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif'])
+recipe_configurations = configs_for_inputs(config_json_path, ['Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                              'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                              'Test_8bit_TZYX_mitoFluo.tif'])
+
+# Dynamically create test methods for each configuration
+for i, config in enumerate(configurations):
+    test_name = f"test_Hessian_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_Hessian, test_name, test_method)
+for i, config in enumerate(recipe_configurations):
+    setattr(Test_Hessian, f"test_HessianShapeIndex_{i:02d}", generate_recipe_test_method(config))
+
+
+if __name__ == "__main__":
+    unittest.main()
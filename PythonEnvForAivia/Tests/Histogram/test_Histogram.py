@@ -0,0 +1,74 @@
+import unittest
+import os
+import numpy as np
+import tifffile
+from skimage.exposure import rescale_intensity
+from Recipes_NoAutomatedTests.ProcessImages import AutoAdjustChannel
+from Recipes.utils.tiff_io import open_image
+from Recipes.utils.histogram import histogram, percentiles, rescale_to_range
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the histogram percentiles and rescaling of Recipes/utils/histogram.py with
+np.percentile and skimage.exposure.rescale_intensity on the inputs of the AdjustSigmoid
+test configurations (8 and 16-bit, 2D to 3D+T, read from the file without decoding it),
+including the percentiles of the non-zero pixels, and the quantile mode of
+AutoAdjustChannel.'''
+
+PERCENTILES = [0, 0.5, 2, 20, 50, 80, 99, 99.9, 99.95, 100]
+
+
+def run_test(config):
+    image_data = tifffile.imread(config['inputImagePath'])
+    opened = open_image(config['inputImagePath'])
+
+    counts = histogram(opened)
+    assert counts.sum() == image_data.size
+    assert np.array_equal(percentiles(opened, PERCENTILES), np.percentile(image_data, PERCENTILES))
+    assert percentiles(image_data, 80) == np.percentile(image_data, 80)
+    assert np.array_equal(percentiles(image_data, PERCENTILES, exclude_zero=True),
+                          np.percentile(image_data[np.nonzero(image_data)], PERCENTILES))
+
+    for low, high in [(2, 99.9), (0, 100), (50, 50)]:
+        q_low, q_high = np.percentile(image_data, [low, high])
+        expected = rescale_intensity(image_data, in_range=(q_low, q_high), out_range='dtype')
+        result = rescale_to_range(image_data, q_low, q_high)
+        assert result.dtype == expected.dtype and np.array_equal(result, expected), (low, high)
+        in_place = image_data.copy()
+        rescale_to_range(in_place, q_low, q_high, out=in_place)
+        assert np.array_equal(in_place, expected), (low, high)
+
+    param_d = {'min_val': 0.2, 'max_val': 1.0}
+    q_min = np.percentile(image_data, int(param_d['min_val'] * 100))
+    q_max = np.percentile(image_data, int(param_d['max_val'] * 100))
+    expected = rescale_intensity(image_data, in_range=(q_min, q_max), out_range='dtype')
+    assert np.array_equal(AutoAdjustChannel.process_img(image_data, 1, param_d), expected)
+    return True
+
+class Test_Histogram(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "AdjustSigmoid", "Config_AdjustSigmoid.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+
+# Dynamically create test methods for 8 and 16-bit 2D and 3D, 8-bit 2D+T and 3D+T configurations
+for i, config in enumerate(configurations):
+    test_name = f"test_Histogram_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_Histogram, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
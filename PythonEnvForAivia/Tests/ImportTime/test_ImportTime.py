@@ -0,0 +1,57 @@
+import unittest
+import json
+import os
+from Tests.utils.import_time import measure_import_time, reference_import_time
+
+
+'''
+Cold import time of the recipes, measured in a fresh interpreter with `python -X importtime`.
+Wall-clock times depend on the machine and its load, so each recipe is compared with the
+import time of numpy measured in the same run: budgets are given in numpy imports, about 3x
+the ratio measured on a developer machine. A recipe going over its budget (still over after
+two more measurements) most likely imports a heavy package at module level that could be
+imported lazily (see Recipes/utils/lazy_import.py).'''
+
+RETRIES = 2
+
+
+def run_test(config):
+    reference = reference_import_time()
+    budget = config['budgetNumpyImports'] * reference
+    import_time, slowest = measure_import_time(config['recipe'])
+    for _ in range(RETRIES):
+        if import_time <= budget:
+            break
+        # Transient load of the machine
+        import_time, slowest = min((import_time, slowest), measure_import_time(config['recipe']))
+
+    assert import_time <= budget, \
+        f"{config['recipe']} imports in {import_time:.2f} s, {import_time / reference:.1f} numpy imports " \
+        f"(budget {config['budgetNumpyImports']}, numpy imports in {reference:.3f} s), slowest imports: {slowest}"
+
+    return True
+
+class Test_ImportTime(unittest.TestCase):
+    run_serially = True     # Timings, not run alongside other tests by Tests/utils/parallel_runner.py
+
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "Config_ImportTime.json")
+with open(config_json_path) as f:
+    configurations = json.load(f)
+
+# Dynamically create test methods for each configuration
+for i, config in enumerate(configurations):
+    test_name = f"test_ImportTime_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_ImportTime, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
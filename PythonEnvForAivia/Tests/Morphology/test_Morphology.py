@@ -0,0 +1,98 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import tifffile
+from skimage import morphology
+from Recipes.ProcessImages import MorphologicalTexture
+from Recipes.utils.morphology import footprint, dilation, erosion, closing, opening, dilations, erosions
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the decomposed disk and ball morphology with skimage on the inputs of the
+MorphologicalTexture test configurations (2D and 3D frames, 8 and 16-bit, binary
+masks), for radii smaller and larger than the van Herk threshold, and the texture
+stack of MorphologicalTexture for several sizes with the single size textures.'''
+
+RADII = [0, 1, 3, 5, 9]
+
+
+def run_test(config):
+    image_data = tifffile.imread(config['inputImagePath'])
+    frame = image_data[0] if int(config['TCount']) > 1 else image_data
+
+    for radius in RADII:
+        structure = morphology.disk(radius) if frame.ndim == 2 else morphology.ball(radius)
+        assert np.array_equal(footprint(radius, frame.ndim), structure)
+        assert np.array_equal(dilation(frame, radius), morphology.dilation(frame, structure)), radius
+        assert np.array_equal(erosion(frame, radius), morphology.erosion(frame, structure)), radius
+        assert np.array_equal(closing(frame, radius), morphology.closing(frame, structure)), radius
+        assert np.array_equal(opening(frame, radius), morphology.opening(frame, structure)), radius
+        mask = frame > np.mean(frame)
+        assert np.array_equal(closing(mask, radius), morphology.closing(mask, structure)), radius
+
+    for radius, dilated, eroded in zip(RADII, dilations(frame, RADII), erosions(frame, RADII)):
+        assert np.array_equal(dilated, dilation(frame, radius)), radius
+        assert np.array_equal(eroded, erosion(frame, radius)), radius
+    return True
+
+
+def run_multi_size_test(config):
+    config.pop('groundTruthPath_1')
+    output_folder = tempfile.mkdtemp()
+    config['resultPath'] = os.path.join(output_folder, os.path.basename(config['resultPath']))
+    config['fileOutputPath_2'] = os.path.join(output_folder, 'textures.tif')
+    config['sizeCount'] = 3
+    size = int(config['size'])
+    try:
+        MorphologicalTexture.run(params=config)
+        image_data = tifffile.imread(config['inputImagePath'])
+        tCount = int(config['TCount'])
+        textures = tifffile.imread(config['fileOutputPath_2'])
+        # Channels after T and after Z (ImageJ order)
+        channel_axis = 1 if tCount > 1 or int(config['ZCount']) > 1 else 0
+        for k in range(3):
+            frames = image_data if tCount > 1 else image_data[np.newaxis]
+            expected = np.stack([MorphologicalTexture.texture(frame, size * (k + 1)) for frame in frames])
+            assert np.array_equal(np.take(textures, k, axis=channel_axis), expected if tCount > 1 else expected[0]), k
+        assert np.array_equal(tifffile.imread(config['resultPath']), np.take(textures, 0, axis=channel_axis))
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    return True
+
+class Test_Morphology(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+    def multi_size_test_generator(self, config):
+        self.assertTrue(run_multi_size_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+def generate_multi_size_test_method(config):
+    def test_method(self):
+        self.multi_size_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "MorphologicalTexture", "Config_MorphologicalTexture.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif'])
+
+# Dynamically create test methods for the 8 and 16-bit 2D, 2D+T and 3D configurations
+for i, config in enumerate(configurations):
+    test_name = f"test_Morphology_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_Morphology, test_name, test_method)
+    setattr(Test_Morphology, f"test_MorphologyMultiSize_{i:02d}", generate_multi_size_test_method(dict(config)))
+
+
+if __name__ == "__main__":
+    unittest.main()
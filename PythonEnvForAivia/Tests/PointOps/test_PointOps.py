@@ -0,0 +1,144 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import tifffile
+from Recipes_NoAutomatedTests.ProcessImages import Arithmetics_SingleChannel
+from Recipes.utils.tiff_io import open_image
+from skimage import exposure
+from Recipes.utils.point_ops import apply_point_op, compile_expression, map_planes
+from Recipes.utils.point_ops import gamma_curve, sigmoid_curve, log_curve, window_level
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the lookup tables of Recipes/utils/point_ops.py with the point operations
+applied to the whole image on the inputs of the AdjustSigmoid test configurations (8 and
+16-bit, 2D to 3D+T, read from the file without decoding it): the gamma, sigmoid, log
+and window/level curves with skimage.exposure, the expressions and the rejection of
+invalid ones. Runs every operation of Arithmetics_SingleChannel against its previous
+float32 implementation (AdjustGamma and AdjustSigmoid are compared with their ground
+truths in Tests/ProcessImages).'''
+
+EXPRESSIONS = ['(x - 100) * 1.5', 'sqrt(x) * 16', '-x', 'x ** 2 / 7 + 3', 'log(x)', 'clip(x // 3 % 50, 10, 40)']
+INVALID_EXPRESSIONS = ['y + 1', '__import__("os")', 'x.real', 'open("f")', '"1" * x', 'x +', 'lambda: x']
+OPERATIONS = [(0, 3), (0, 0), (1, 7), (2, 200), (3, 40), (3, 70000)]
+
+
+def float_arithmetics(data, op_type, value):
+    # Arithmetics_SingleChannel v1_10
+    if op_type == 0:
+        out_data = np.float32(data) * value
+    elif op_type == 1:
+        out_data = np.float32(data) / value
+    elif op_type == 2:
+        out_data = np.float32(data) + value
+    else:
+        out_data = np.float32(data) - value
+    if any(data.dtype == dtp for dtp in [np.uint8, np.uint16]):
+        if np.max(out_data) > np.iinfo(data.dtype).max or np.min(out_data) < 0:
+            out_data = out_data.clip(0, np.iinfo(data.dtype).max)
+    return out_data.astype(data.dtype)
+
+
+def run_test(config):
+    image_data = tifffile.imread(config['inputImagePath'])
+    opened = open_image(config['inputImagePath'])
+    info = np.iinfo(image_data.dtype)
+
+    curves = [(gamma_curve(0.75), exposure.adjust_gamma(image_data, 0.75)),
+              (gamma_curve(1.6, 0.8), exposure.adjust_gamma(image_data, 1.6, 0.8)),
+              (sigmoid_curve(0.3, 12), exposure.adjust_sigmoid(image_data, 0.3, 12)),
+              (sigmoid_curve(0.5, 5, inv=True), exposure.adjust_sigmoid(image_data, 0.5, 5, inv=True)),
+              (log_curve(1.2), exposure.adjust_log(image_data, 1.2)),
+              (window_level(info.max / 4, info.max / 5),
+               exposure.rescale_intensity(image_data, in_range=(info.max / 5 - info.max / 8, info.max / 5 + info.max / 8)))]
+    for i, (curve, expected) in enumerate(curves):
+        result = np.stack(list(map_planes(curve, opened))).reshape(image_data.shape)
+        assert result.dtype == expected.dtype and np.array_equal(result, expected), i
+
+    for expression in EXPRESSIONS:
+        evaluate = compile_expression(expression)
+        namespace = {'sqrt': np.sqrt, 'log': np.log, 'clip': np.clip, 'x': image_data.astype(np.float32)}
+        with np.errstate(divide='ignore'):
+            expected = eval(expression, namespace)
+        assert np.array_equal(evaluate(image_data), expected), expression
+
+        def saturated(data):
+            return np.clip(np.nan_to_num(evaluate(data), nan=0.0), 0, info.max).astype(data.dtype)
+        with np.errstate(invalid='ignore'):
+            expected = saturated(image_data)
+        assert np.array_equal(apply_point_op(saturated, opened), expected), expression
+        in_place = image_data.copy()
+        apply_point_op(saturated, in_place, out=in_place)
+        assert np.array_equal(in_place, expected), expression
+
+    for expression in INVALID_EXPRESSIONS:
+        try:
+            compile_expression(expression)
+        except ValueError:
+            continue
+        raise AssertionError(f'{expression} accepted')
+    return True
+
+
+def run_recipe_test(config):
+    output_folder = tempfile.mkdtemp()
+    params = {'inputImagePath': config['inputImagePath'],
+              'resultImagePath': os.path.join(output_folder, 'arithmetics.tif'),
+              'TCount': config['TCount'], 'ZCount': config['ZCount']}
+    try:
+        image_data = tifffile.imread(params['inputImagePath'])
+        for op_type, value in OPERATIONS:
+            params.update(actionType=op_type, value=value)
+            Arithmetics_SingleChannel.run(params=params)
+            result = tifffile.imread(params['resultImagePath'])
+            assert np.array_equal(result, float_arithmetics(image_data, op_type, value)), (op_type, value)
+
+        params.update(actionType=4, expression='(x - 100) * 1.5')
+        Arithmetics_SingleChannel.run(params=params)
+        expected = np.clip((image_data.astype(np.float32) - 100) * 1.5, 0, np.iinfo(image_data.dtype).max)
+        assert np.array_equal(tifffile.imread(params['resultImagePath']), expected.astype(image_data.dtype))
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    return True
+
+class Test_PointOps(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+    def dynamic_recipe_test_generator(self, config):
+        self.assertTrue(run_recipe_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+def generate_recipe_test_method(config):
+    def test_method(self):
+        self.dynamic_recipe_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "AdjustSigmoid", "Config_AdjustSigmoid.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif',
+                                                       'Test_8bit_TYX_mitoFluo_MaxIP.tif',
+                                                       'Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+
+# Dynamically create test methods for 8 and 16-bit 2D and 3D, 8-bit 2D+T and 3D+T configurations
+for i, config in enumerate(configurations):
+    test_name = f"test_PointOps_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_PointOps, test_name, test_method)
+
+    test_name = f"test_PointOps_Arithmetics_SingleChannel_{i:02d}"  # Must start with "test_"
+    test_method = generate_recipe_test_method(config)
+    setattr(Test_PointOps, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,10 +22,11 @@ The maximum values from all of the transforms is output at every voxel.'''
 
 def run_test(config):
     ground_truth_path_1 = config.pop('groundTruthPath_1')
+    atol = config.pop('atol', 0)
 
     result_value = MeijeringNeuriteness.run(params=config)
     
-    assert isIdentical(ground_truth_path_1, config.get('resultPath'))
+    assert isIdentical(ground_truth_path_1, config.get('resultPath'), atol=atol)
 
     return True
 
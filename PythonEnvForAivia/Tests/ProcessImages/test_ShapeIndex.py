@@ -20,10 +20,11 @@ Different values indicate convexity/concavitiy and shapes:
 
 def run_test(config):
     ground_truth_path_1 = config.pop('groundTruthPath_1')
+    atol = config.pop('atol', 0)
 
     result_value = ShapeIndex.run(params=config)
     
-    assert isIdentical(ground_truth_path_1, config.get('resultPath'))
+    assert isIdentical(ground_truth_path_1, config.get('resultPath'), atol=atol)
 
     return True
 
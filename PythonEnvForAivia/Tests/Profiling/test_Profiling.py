@@ -0,0 +1,71 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from Recipes.ProcessImages import ShapeIndex
+from Recipes.utils.profiling import PROFILE_FILE_NAME
+from Tests.utils.comparison import isIdentical
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Runs a profiled recipe with and without the profiler: results must be identical to the
+ground truth and each profiled run must append one JSON line with its stages. Uses the
+ShapeIndex test configurations.'''
+
+
+def run_test(config, mode):
+    ground_truth_path_1 = config.pop('groundTruthPath_1')
+    atol = config.pop('atol', 0)
+    profile_folder = tempfile.mkdtemp()
+    profile_path = os.path.join(profile_folder, PROFILE_FILE_NAME)
+    # Not the ShapeIndex test output, which may be written by a concurrent test
+    config['resultPath'] = os.path.join(profile_folder, os.path.basename(config['resultPath']))
+    try:
+        with mock.patch.dict(os.environ, {'AIVIA_RECIPE_PROFILE': '0', 'AIVIA_RECIPE_PROFILE_DIR': profile_folder}):
+            ShapeIndex.run(params=config)
+        assert isIdentical(ground_truth_path_1, config.get('resultPath'), atol=atol)
+        assert not os.path.exists(profile_path)
+
+        with mock.patch.dict(os.environ, {'AIVIA_RECIPE_PROFILE': mode, 'AIVIA_RECIPE_PROFILE_DIR': profile_folder}):
+            ShapeIndex.run(params=config)
+        assert isIdentical(ground_truth_path_1, config.get('resultPath'), atol=atol)
+
+        with open(profile_path) as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 1
+        record = records[0]
+        assert record['recipe'] == 'ShapeIndex' and record['status'] == 'ok'
+        assert [s['name'] for s in record['stages']] == ['compute', 'convert', 'write']
+        assert sum(s['wall_s'] for s in record['stages']) <= record['wall_s']
+        assert record['stages'][0]['peak_mb'] > 0
+    finally:
+        shutil.rmtree(profile_folder, ignore_errors=True)
+
+    return True
+
+class Test_Profiling(unittest.TestCase):
+    def dynamic_test_generator(self, config, mode):
+        self.assertTrue(run_test(config, mode))
+
+def generate_test_method(config, mode):
+    def test_method(self):
+        self.dynamic_test_generator(dict(config), mode)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "ShapeIndex", "Config_ShapeIndex.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif'])
+
+# Dynamically create test methods for each configuration and memory mode
+for i, config in enumerate(configurations):
+    for mode in ['1', 'tracemalloc']:
+        test_name = f"test_Profiling_{i:02d}_{mode}"  # Must start with "test_"
+        test_method = generate_test_method(config, mode)
+        setattr(Test_Profiling, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
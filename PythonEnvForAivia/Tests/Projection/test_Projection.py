@@ -0,0 +1,95 @@
+import unittest
+import os
+import numpy as np
+import tifffile
+from Recipes.utils.projection import PROJECTIONS, focus_measure, project_stack, project_channels, composite_rgb
+from Recipes.utils.tiff_io import open_image
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the single-pass Z projections with numpy on the inputs of the MaxSlices test
+configurations (3D and 3D+T), read plane by plane from the memory-mapped files, and the
+multi-channel projection and colour composite used by MaxIntensityProjectionRGB.'''
+
+
+def expected_projections(stack):
+    values = stack.astype(np.float64)
+    focus = np.stack([focus_measure(plane) for plane in stack])
+    in_focus = focus.argmax(axis=0)
+    return {'max': stack.max(axis=0), 'min': stack.min(axis=0),
+            'argmax': stack.argmax(axis=0), 'argmin': stack.argmin(axis=0),
+            'sum': values.sum(axis=0), 'mean': values.mean(axis=0), 'std': values.std(axis=0),
+            'edf': np.take_along_axis(stack, in_focus[np.newaxis], axis=0)[0], 'argedf': in_focus}
+
+
+def run_test(config):
+    tCount = int(config['TCount'])
+    image_data = tifffile.imread(config['inputImagePath'])
+    projections = project_stack(open_image(config['inputImagePath']), PROJECTIONS, tCount)
+
+    frames = image_data if tCount > 1 else image_data[np.newaxis]
+    for t, stack in enumerate(frames):
+        expected = expected_projections(stack)
+        for projection in PROJECTIONS:
+            result = projections[projection][t] if tCount > 1 else projections[projection]
+            assert result.shape == stack.shape[1:], projection
+            if projection in ('mean', 'std'):
+                assert np.allclose(result, expected[projection], rtol=1e-9, atol=1e-9), projection
+            else:
+                assert np.array_equal(result, expected[projection]), projection
+    return True
+
+
+def run_channels_test(config):
+    tCount = int(config['TCount'])
+    image_data = tifffile.imread(config['inputImagePath'])
+    channels = [open_image(config['inputImagePath']), open_image(config['inputImagePath'])]
+    projections = project_channels(channels, 'max', tCount)
+
+    expected = image_data.max(axis=-3)
+    assert projections.shape == expected.shape[:-2] + (2,) + expected.shape[-2:]
+    assert np.array_equal(projections[..., 0, :, :], expected)
+    assert np.array_equal(projections[..., 1, :, :], expected)
+
+    # Red and yellow: the red component is the clipped sum of both channels
+    rgb = composite_rgb(projections, ['red', 'yellow'])
+    total = expected.astype(np.int64) * 2
+    assert rgb.dtype == image_data.dtype
+    assert np.array_equal(rgb[..., 0, :, :], np.minimum(total, np.iinfo(image_data.dtype).max))
+    assert np.array_equal(rgb[..., 1, :, :], expected)
+    assert not rgb[..., 2, :, :].any()
+    return True
+
+class Test_Projection(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+    def channels_test_generator(self, config):
+        self.assertTrue(run_channels_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+def generate_channels_test_method(config):
+    def test_method(self):
+        self.channels_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "MaxSlices", "Config_MaxSlices.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+
+# Dynamically create test methods for 8-bit 3D, 16-bit 3D and 8-bit 3D+T configurations
+for i, config in enumerate(configurations):
+    test_name = f"test_Projection_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_Projection, test_name, test_method)
+    setattr(Test_Projection, f"test_ProjectChannels_{i:02d}", generate_channels_test_method(config))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from unittest import mock
+import tifffile
+from Recipes.ProcessImages import AdjustGamma, MorphologicalTexture, ShapeIndex
+from Recipes.TransformImages import ZColorCoding
+from Recipes.utils.result_cache import cache_stats, cached_run
+from Tests.utils.comparison import isIdentical
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Runs a cached recipe twice with the result cache enabled: the second run must restore
+outputs identical to the ground truth without recomputing them. Uses the ShapeIndex test
+configurations. A restored output must not share its file with the cache entry: a later
+run writing to the same path without the cache must leave the entry unchanged. Runs
+writing files that are not outputs in their parameters bypass the cache, and recipes
+loaded in the recipe worker are not cached (the client looks their runs up).'''
+
+
+def run_test(config):
+    ground_truth_path_1 = config.pop('groundTruthPath_1')
+    atol = config.pop('atol', 0)
+    cache_folder = tempfile.mkdtemp()
+    # Not the ShapeIndex test output, which may be written by a concurrent test
+    output_folder = tempfile.mkdtemp()
+    config['resultPath'] = os.path.join(output_folder, os.path.basename(config['resultPath']))
+    environment = {'AIVIA_RECIPE_CACHE': '1', 'AIVIA_RECIPE_CACHE_DIR': cache_folder}
+    try:
+        with mock.patch.dict(os.environ, environment):
+            ShapeIndex.run(params=config)
+            assert isIdentical(ground_truth_path_1, config.get('resultPath'), atol=atol)
+            with mock.patch.object(ShapeIndex, 'shape_index', side_effect=AssertionError('Recomputed')):
+                ShapeIndex.run(params=config)
+            assert isIdentical(ground_truth_path_1, config.get('resultPath'), atol=atol)
+            assert (cache_stats()['hits'], cache_stats()['misses']) == (1, 1)
+
+            # A changed parameter is a miss
+            config['sigma'] = float(config['sigma']) + 1
+            ShapeIndex.run(params=config)
+            assert (cache_stats()['hits'], cache_stats()['misses']) == (1, 2)
+
+            # The least recently used entry is evicted when the cache is full
+            with mock.patch.dict(os.environ, {'AIVIA_RECIPE_CACHE_MB': str(os.path.getsize(config['resultPath']) / 1024 ** 2)}):
+                config['sigma'] += 1
+                ShapeIndex.run(params=config)
+            assert cache_stats()['evictions'] == 2
+    finally:
+        shutil.rmtree(cache_folder, ignore_errors=True)
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    return True
+
+
+def run_restore_test(config):
+    cache_folder = tempfile.mkdtemp()
+    output_folder = tempfile.mkdtemp()
+    params = {'inputImagePath': config['inputImagePath'], 'gamma': 0.5,
+              'resultPath': os.path.join(output_folder, 'gamma.tif')}
+    try:
+        with mock.patch.dict(os.environ, {'AIVIA_RECIPE_CACHE': '1', 'AIVIA_RECIPE_CACHE_DIR': cache_folder}):
+            AdjustGamma.run(params=params)
+            expected = tifffile.imread(params['resultPath'])
+            AdjustGamma.run(params=params)
+            assert cache_stats()['hits'] == 1
+
+        # Same output path, other gamma, cache disabled
+        with mock.patch.dict(os.environ, {'AIVIA_RECIPE_CACHE': '0'}):
+            AdjustGamma.run(params=dict(params, gamma=2.0))
+        assert not np.array_equal(tifffile.imread(params['resultPath']), expected)
+
+        with mock.patch.dict(os.environ, {'AIVIA_RECIPE_CACHE': '1', 'AIVIA_RECIPE_CACHE_DIR': cache_folder}):
+            AdjustGamma.run(params=params)
+            assert cache_stats()['hits'] == 2
+        assert np.array_equal(tifffile.imread(params['resultPath']), expected)
+    finally:
+        shutil.rmtree(cache_folder, ignore_errors=True)
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    return True
+
+
+def run_bypass_test(recipe, config, outputs=('resultPath',), **mode):
+    cache_folder = tempfile.mkdtemp()
+    output_folder = tempfile.mkdtemp()
+    # Extra image opened in Aivia, named after the first output: never looked up nor stored
+    params = dict({'inputImagePath': config['inputImagePath'], 'TCount': config['TCount'],
+                   'ZCount': config['ZCount']}, **mode)
+    for i, name in enumerate(outputs):
+        params[name] = os.path.join(output_folder, 'result.tif' if i == 0 else f'result_{i}.tif')
+    try:
+        with mock.patch.dict(os.environ, {'AIVIA_RECIPE_CACHE': '1', 'AIVIA_RECIPE_CACHE_DIR': cache_folder}):
+            for _ in range(2):
+                recipe.run(params=params)
+                assert os.path.isfile(os.path.join(output_folder, 'resulttmp.tif'))
+                os.remove(os.path.join(output_folder, 'resulttmp.tif'))
+            assert (cache_stats()['hits'], cache_stats()['misses']) == (0, 0)
+    finally:
+        shutil.rmtree(cache_folder, ignore_errors=True)
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    return True
+
+class Test_ResultCache(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+    def test_ResultCache_Restore(self):
+        self.assertTrue(run_restore_test(plane_configuration))
+
+    def test_ResultCache_Bypass(self):
+        self.assertTrue(run_bypass_test(ShapeIndex, plane_configuration, sigma=1.0, scaleCount=2, scaleCombination=1))
+        self.assertTrue(run_bypass_test(MorphologicalTexture, plane_configuration, size=1, sizeCount=2))
+        self.assertTrue(run_bypass_test(ZColorCoding, stack_configuration, colorMapChoice=0, projectionMode=1,
+                                        outputs=('resultPathRed', 'resultPathGreen', 'resultPathBlue')))
+
+    def test_ResultCache_Worker(self):
+        def run(params):
+            return params
+        with mock.patch.dict(os.environ, {'AIVIA_RECIPE_CACHE': '1', 'AIVIA_IN_RECIPE_WORKER': '1'}):
+            self.assertIs(cached_run(run), run)
+            self.assertIs(cached_run(bypass=lambda params: False)(run), run)
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "ShapeIndex", "Config_ShapeIndex.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                       'Test_16bit_YX_Fluo_nuclei.tif'])
+# Inputs of the restore and bypass tests
+plane_configuration, stack_configuration = configs_for_inputs(config_json_path, ['Test_8bit_YX_mitoFluo_T15_MaxIP.tif',
+                                                                                 'Test_8bit_ZYX_mitoFluo_T15.tif'])
+
+# Dynamically create test methods for each configuration
+for i, config in enumerate(configurations):
+    test_name = f"test_ResultCache_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_ResultCache, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
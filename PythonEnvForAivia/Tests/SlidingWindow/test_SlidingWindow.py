@@ -0,0 +1,71 @@
+import unittest
+import os
+import numpy as np
+import tifffile
+from unittest import mock
+from Recipes.utils import sliding_window
+from Recipes.utils.sliding_window import OPERATIONS, sliding_z_filter
+from Tests.utils.configs import configs_for_inputs
+
+
+'''
+Compares the sliding-window Z filters with a direct computation of every window, on the
+inputs of the MaxSlices test configurations: all operations, windows smaller and larger
+than the stack, asymmetric windows, strided ("thick slab") output, blocks of a few rows,
+and the direct and van Herk / Gil-Werman paths for max and min.'''
+
+
+def direct_filter(frame, before, after, operation, step):
+    reduce = {'max': np.max, 'min': np.min, 'sum': np.sum, 'mean': np.mean, 'median': np.median}[operation]
+    z_count = frame.shape[0]
+    slices = []
+    for i in range(0, z_count, step):
+        values = reduce(frame[max(i - before, 0):min(i + after, z_count - 1) + 1].astype(np.float64), axis=0)
+        info = np.iinfo(frame.dtype)
+        slices.append(np.clip(np.rint(values), info.min, info.max).astype(frame.dtype))
+    return np.stack(slices)
+
+
+def run_test(config):
+    image_data = tifffile.imread(config['inputImagePath'])
+    tCount = int(config['TCount'])
+    if tCount > 1:
+        image_data = image_data[:3]         # A few time points are enough
+    frames = image_data if tCount > 1 else image_data[np.newaxis]
+
+    with mock.patch.object(sliding_window, 'BLOCK_BYTES', 200000):
+        for before, after in [(1, 0), (3, 2), (0, 5), (20, 19)]:
+            for operation in OPERATIONS:
+                for step in [1, 4]:
+                    expected = np.stack([direct_filter(frame, before, after, operation, step) for frame in frames])
+                    for shift_window in [0, 100]:
+                        with mock.patch.object(sliding_window, 'SHIFT_WINDOW', shift_window):
+                            result = sliding_z_filter(image_data, before, after, operation, tCount, step)
+                        assert np.array_equal(result.reshape(expected.shape), expected), \
+                            f'{operation} before {before} after {after} step {step}'
+
+    return True
+
+class Test_SlidingWindow(unittest.TestCase):
+    def dynamic_test_generator(self, config):
+        self.assertTrue(run_test(config))
+
+def generate_test_method(config):
+    def test_method(self):
+        self.dynamic_test_generator(config)
+    return test_method
+
+config_json_path = os.path.join(os.path.dirname(__file__), "..", "ProcessImages", "MaxSlices", "Config_MaxSlices.json")
+configurations = configs_for_inputs(config_json_path, ['Test_8bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_16bit_ZYX_mitoFluo_T15.tif',
+                                                       'Test_8bit_TZYX_mitoFluo.tif'])
+
+# Dynamically create test methods for 8-bit 3D, 16-bit 3D and 8-bit 3D+T configurations
+for i, config in enumerate(configurations):
+    test_name = f"test_SlidingWindow_{i:02d}"  # Must start with "test_"
+    test_method = generate_test_method(config)
+    setattr(Test_SlidingWindow, test_name, test_method)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,7 +8,7 @@ from Tests.utils.comparison import isIdentical
 
 '''
 Performs a maximum intensity projection through Z for a single channel.
-Works only in 3D (not 3D+t yet).'''
+Works in 3D and 3D+T (other projection types are compared with numpy in Tests/Projection).'''
 
 
 def run_test(config):
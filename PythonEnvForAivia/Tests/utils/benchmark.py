@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path, PureWindowsPath
+
+import numpy as np
+import tifffile
+
+from Recipes.utils.profiling import peak_rss_mb
+
+
+"""
+Benchmark of the recipes, driven by the test configurations.
+
+Every entry of Tests/<Category>/<Recipe>/Config_<Recipe>.json is run with its original
+inputs and with synthetic inputs scaled up by tiling the original image:
+    --scales 1 4 16 64     XY area factors (2x, 4x, 8x the width and height)
+    --tz 1 4               factors applied to T and Z when the input has them
+Each run happens in a fresh interpreter, which records the wall time and CPU time of
+run(params) and the peak RSS of the process. Results are written as JSON.
+
+    python -m Tests.utils.benchmark --scales 1 4 --output bench.json
+    python -m Tests.utils.benchmark --recipes ShapeIndex MorphologicalTexture --compare bench.json
+
+With --compare, runs slower (or using more memory) than the baseline by more than
+--tolerance are reported as regressions and the exit code is 1.
+"""
+
+ROOT = Path(__file__).parents[2]      # PythonEnvForAivia folder
+
+# Recipes waiting for user input (dialogs, GUIs, message boxes) are skipped by default
+INTERACTIVE_RECIPES = ['AiviaExperimentCreator', 'AdjustGamma_MagicGui', 'CalculateIntersectionOverUnion',
+                       'DrawArrayOfShapes_2D', 'DrawShapes_2D', 'DrawShollCircles_2D_AiviaGui',
+                       'Rotate3D_90deg', 'StackReg_ImageAlignment', 'SuperpixelPainter']
+
+# Regressions smaller than these are measurement noise
+MIN_TIME_DELTA = 0.05       # s
+MIN_MEMORY_DELTA = 10       # MB
+
+
+def list_configs(recipe_names=None, include_interactive=False):
+    """
+    Lists the test configurations of the recipes.
+
+    Returns
+    -------
+    list of tuple
+        (module name, recipe name, index of the configuration, configuration)
+    """
+    configs = []
+    for config_path in sorted(ROOT.glob('Tests/*/*/Config_*.json')):
+        recipe = config_path.parent.name
+        if recipe_names and recipe not in recipe_names:
+            continue
+        if recipe in INTERACTIVE_RECIPES and not include_interactive:
+            continue
+        module_name = f'Recipes.{config_path.parents[1].name}.{recipe}'
+        with open(config_path) as f:
+            for i, config in enumerate(json.load(f)):
+                configs.append((module_name, recipe, i, config))
+    return configs
+
+
+def local_path(value):
+    # Test configurations use Windows paths relative to the PythonEnvForAivia folder
+    return str(ROOT.joinpath(*PureWindowsPath(value).parts))
+
+
+def is_output_param(name):
+    name = name.lower()
+    return 'result' in name or 'output' in name
+
+
+def prepare_case(config, xy_scale, tz_scale, work_dir):
+    """
+    Creates the parameters of a benchmark run: scaled copies of the input TIFF files and
+    output paths in work_dir.
+
+    Returns
+    -------
+    dict or None
+        Parameters for run(params), None if the inputs cannot be scaled (input missing
+        or not a TIFF file).
+    """
+    params = {}
+    t_count, z_count = int(config.get('TCount', 1)), int(config.get('ZCount', 1))
+    scaled = (xy_scale, tz_scale) != (1, 1)
+
+    for name, value in config.items():
+        if name.startswith('groundTruthPath'):
+            continue
+        if not isinstance(value, str) or '\\' not in value:
+            params[name] = value
+            continue
+        path = local_path(value)
+        if is_output_param(name):
+            params[name] = os.path.join(work_dir, 'OUT_' + os.path.basename(path))
+        elif not os.path.exists(path):
+            return None
+        elif scaled:
+            if not path.lower().endswith(('.tif', '.tiff')):
+                return None
+            params[name] = os.path.join(work_dir, 'IN_' + os.path.basename(path))
+            scale_tiff(path, params[name], xy_scale, tz_scale, t_count, z_count)
+        else:
+            params[name] = path
+
+    if 'TCount' in params and t_count > 1:
+        params['TCount'] = t_count * tz_scale
+    if 'ZCount' in params and z_count > 1:
+        params['ZCount'] = z_count * tz_scale
+    return params
+
+
+def scale_tiff(input_path, output_path, xy_scale, tz_scale, t_count, z_count):
+    """Writes input_path tiled xy_scale times in XY area and tz_scale times in T and Z."""
+    with tifffile.TiffFile(input_path) as tif:
+        image = tif.series[0].asarray()
+        axes = tif.series[0].axes
+    rgb = axes.endswith('S')
+    n_lead = image.ndim - (3 if rgb else 2)
+    factor = int(round(np.sqrt(xy_scale)))
+    # Leading axes are T and/or Z
+    reps = [tz_scale] * n_lead + [factor, factor] + ([1] if rgb else [])
+    tifffile.imwrite(output_path, np.tile(image, reps), photometric='rgb' if rgb else 'minisblack',
+                     metadata={'axes': axes.replace('Q', 'Z' if z_count > 1 else 'T')})
+
+
+def run_child(module_name, params_path, result_path):
+    # Runs in a fresh interpreter (see measure())
+    import importlib
+    import contextlib
+    with open(params_path) as f:
+        params = json.load(f)
+
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_time = time.perf_counter() - start
+    rss_after_import = peak_rss_mb()
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    status = 'ok'
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            module.run(params)
+    except BaseException as e:
+        status = f'{type(e).__name__}: {e}'
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    with open(result_path, 'w') as f:
+        json.dump({'status': status, 'wall_s': wall, 'cpu_s': cpu, 'import_s': import_time,
+                   'peak_rss_mb': peak_rss_mb(), 'rss_after_import_mb': rss_after_import}, f)
+
+
+def measure(module_name, params, work_dir):
+    params_path = os.path.join(work_dir, 'params.json')
+    result_path = os.path.join(work_dir, 'result.json')
+    with open(params_path, 'w') as f:
+        json.dump(params, f)
+    # Measure the computation itself, not the result cache, the warm worker or the profiler
+    env = {k: v for k, v in os.environ.items()
+           if k not in ('AIVIA_RECIPE_CACHE', 'AIVIA_RECIPE_WORKER', 'AIVIA_RECIPE_PROFILE')}
+    proc = subprocess.run([sys.executable, '-m', 'Tests.utils.benchmark', '--child',
+                           module_name, params_path, result_path],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0 or not os.path.exists(result_path):
+        return {'status': f'crashed: {proc.stderr.strip().splitlines()[-1:]}'}
+    with open(result_path) as f:
+        return json.load(f)
+
+
+def run_benchmark(configs, scales=(1,), tz_scales=(1,), repeat=1):
+    results = []
+    for module_name, recipe, index, config in configs:
+        for xy_scale in scales:
+            for tz_scale in tz_scales:
+                with tempfile.TemporaryDirectory() as work_dir:
+                    params = prepare_case(config, xy_scale, tz_scale, work_dir)
+                    if params is None:
+                        continue
+                    runs = [measure(module_name, params, work_dir) for _ in range(repeat)]
+
+                ok_runs = [r for r in runs if r['status'] == 'ok']
+                result = {'recipe': recipe, 'config': index, 'xy_scale': xy_scale, 'tz_scale': tz_scale,
+                          'TCount': params.get('TCount'), 'ZCount': params.get('ZCount'),
+                          'status': 'ok' if len(ok_runs) == repeat else runs[-1]['status']}
+                if ok_runs:
+                    # Best of the repetitions, least disturbed by the rest of the machine
+                    best = min(ok_runs, key=lambda r: r['wall_s'])
+                    result.update({key: round(best[key], 4) for key in
+                                   ['wall_s', 'cpu_s', 'import_s', 'peak_rss_mb', 'rss_after_import_mb']})
+                print(format_result(result))
+                results.append(result)
+    return results
+
+
+def result_key(result):
+    return f"{result['recipe']}[{result['config']:02d}] xy{result['xy_scale']} tz{result['tz_scale']}"
+
+
+def format_result(result):
+    if 'wall_s' not in result:
+        return f"{result_key(result):<45} {result['status']}"
+    return (f"{result_key(result):<45} wall {result['wall_s']:8.3f} s   cpu {result['cpu_s']:8.3f} s   "
+            f"peak RSS {result['peak_rss_mb']:8.1f} MB" + ('' if result['status'] == 'ok' else f"   {result['status']}"))
+
+
+def compare(results, baseline_results, tolerance=0.25):
+    """
+    Compares results to a baseline.
+
+    Returns
+    -------
+    list of str
+        Description of every regression.
+    """
+    baseline = {result_key(r): r for r in baseline_results}
+    regressions = []
+    for result in results:
+        reference = baseline.get(result_key(result))
+        if reference is None or 'wall_s' not in reference:
+            continue
+        if 'wall_s' not in result:
+            regressions.append(f"{result_key(result)}: failed ({result['status']})")
+            continue
+        checks = [('wall_s', 's', MIN_TIME_DELTA), ('peak_rss_mb', 'MB', MIN_MEMORY_DELTA)]
+        for key, unit, min_delta in checks:
+            new, old = result[key], reference[key]
+            if new > old * (1 + tolerance) and new - old > min_delta:
+                regressions.append(f'{result_key(result)}: {key} {old:.3f} -> {new:.3f} {unit} '
+                                   f'(+{(new / old - 1) if old else float("inf"):.0%})')
+    return regressions
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the recipes on their test configurations.')
+    parser.add_argument('--recipes', nargs='*', help='Recipe names (all recipes with a test configuration by default)')
+    parser.add_argument('--scales', nargs='*', type=int, default=[1], help='XY area factors (1, 4, 16, 64...)')
+    parser.add_argument('--tz', nargs='*', type=int, default=[1], help='T and Z factors')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per case (the fastest one is kept)')
+    parser.add_argument('--include-interactive', action='store_true', help='Also run the recipes with GUIs')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file for the results')
+    parser.add_argument('--compare', help='Baseline JSON file to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Relative slowdown reported as regression')
+    args = parser.parse_args()
+
+    configs = list_configs(args.recipes, args.include_interactive)
+    results = run_benchmark(configs, args.scales, args.tz, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump({'machine': machine_info(), 'results': results}, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        print(f"Compared to {args.compare} ({baseline['machine']['date']}): {len(regressions)} regression(s)")
+        for regression in regressions:
+            print('  ' + regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        run_child(*sys.argv[2:5])
+    else:
+        main()
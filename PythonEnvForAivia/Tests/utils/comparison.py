@@ -1,30 +1,170 @@
 import tifffile as tif
 import numpy as np
+import functools
+import contextlib
+import hashlib
+import tempfile
 import json
 import os
+from pathlib import Path
 
 
-def isIdentical(image_path1, image_path2):
+"""
+Comparison of recipe outputs with ground truth files.
+
+Images are compared plane by plane (last two axes, plus samples for RGB images), one
+TIFF page decoded at a time, and the comparison stops at the first difference, which
+is reported with its position. Shapes are checked from the headers before any pixel
+is decoded.
+
+With use_hashes=True (or the AIVIA_TEST_GT_HASHES=1 environment variable), the
+ground truth pixels are only decoded once: a hash of each of its planes is stored in
+<temp folder>/aivia_test_hashes and the output planes are compared to these hashes.
+The stored hashes are recomputed when the ground truth file changes (size or
+modification time).
+"""
+
+
+def isIdentical(image_path1, image_path2, atol=0, rtol=0, use_hashes=None):
     """
     Compare two TIFF images to check if they are equal in every value.
-    
+
     Args:
-    image_path1 (str): Path to the first TIFF image
+    image_path1 (str): Path to the first TIFF image (ground truth)
     image_path2 (str): Path to the second TIFF image
-    
+    atol (float): Absolute tolerance, for float outputs (0 = exact comparison)
+    rtol (float): Relative tolerance, for float outputs (0 = exact comparison)
+    use_hashes (bool): Compare with the stored plane hashes of the first image (exact comparison only),
+                       AIVIA_TEST_GT_HASHES environment variable by default
+
+    Returns:
+    bool: True if images are identical (within tolerance), False otherwise
+    """
+    if use_hashes is None:
+        use_hashes = os.environ.get('AIVIA_TEST_GT_HASHES') == '1'
+    identical, message = compare_images(image_path1, image_path2, atol, rtol, use_hashes and not (atol or rtol))
+    print(message)
+    return identical
+
+
+def compare_images(image_path1, image_path2, atol=0, rtol=0, use_hashes=False):
+    """
+    Compare two TIFF images plane by plane, stopping at the first difference.
+
     Returns:
-    bool: True if images are identical, False otherwise
+    tuple: (bool: identical, str: description of the shapes and of the first difference)
+    """
+    with contextlib.ExitStack() as stack:
+        series2 = stack.enter_context(tif.TiffFile(image_path2)).series[0]
+        reference = plane_hashes(image_path1) if use_hashes else None
+        if reference is not None and np.dtype(reference['dtype']) == series2.dtype:
+            shape1, dtype1, planes1 = tuple(reference['shape']), series2.dtype, None
+        else:
+            # Hashes of different data types never match: values are compared instead
+            reference = None
+            series1 = stack.enter_context(tif.TiffFile(image_path1)).series[0]
+            shape1, dtype1, planes1 = series1.shape, series1.dtype, iter_planes(series1)
+
+        message = f"Shape of GT = {shape1}\nShape of OUT = {series2.shape}"
+        if shape1 != series2.shape:
+            return False, message
+        if dtype1 != series2.dtype:
+            message += f"\nData type of GT = {dtype1}, of OUT = {series2.dtype} (values are compared)"
+
+        for i, plane2 in enumerate(iter_planes(series2)):
+            if reference is not None:
+                if _hash_plane(plane2) == reference['planes'][i]:
+                    continue
+                # Only decode the ground truth to locate the difference
+                with tif.TiffFile(image_path1) as tif1:
+                    plane1 = next(p for j, p in enumerate(iter_planes(tif1.series[0])) if j == i)
+            else:
+                plane1 = next(planes1)
+                if _planes_equal(plane1, plane2, atol, rtol):
+                    continue
+            return False, message + _describe_difference(plane1, plane2, i, series2, atol, rtol)
+        return True, message
+
+
+def iter_planes(series):
     """
-    with tif.TiffFile(image_path1) as tif1, tif.TiffFile(image_path2) as tif2:
-        # Read the image data
-        data1 = tif1.asarray()
-        data2 = tif2.asarray()
-        
-        print(f"Shape of GT = {data1.shape}\nShape of OUT = {data2.shape}")
-        
-        # Compare the arrays
-        return np.array_equal(data1, data2)
+    Yields the planes of a TIFF series in order, decoding one page at a time.
 
+    Pages may hold one plane or a whole volume (Aivia writes 3D pages): they are split
+    into planes of the last two axes (and samples axis for RGB images).
+    """
+    plane_shape = series.shape[-_plane_ndim(series):]
+    pages = series.pages
+    if (all(page is not None for page in pages) and getattr(pages[0], 'planarconfig', 1) == 1
+            and sum(int(np.prod(page.shape)) for page in pages) == int(np.prod(series.shape))):
+        for page in pages:
+            data = page.asarray()
+            yield from data.reshape(-1, *plane_shape)
+    else:
+        # Unusual layouts (e.g. separate color planes): the whole series is decoded
+        yield from series.asarray().reshape(-1, *plane_shape)
+
+
+def plane_hashes(image_path):
+    """
+    Returns the stored plane hashes of an image, computing them if needed.
+
+    Returns:
+    dict: {'shape', 'dtype', 'planes': list of hexadecimal hashes, 'size', 'mtime_ns'}
+    """
+    stat = os.stat(image_path)
+    key = hashlib.blake2b(os.path.abspath(image_path).encode(), digest_size=16).hexdigest()
+    hash_path = Path(tempfile.gettempdir()) / 'aivia_test_hashes' / f'{key}.json'
+    try:
+        reference = json.loads(hash_path.read_text())
+        if (reference['size'], reference['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return reference
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with tif.TiffFile(image_path) as tif1:
+        series = tif1.series[0]
+        reference = {'shape': list(series.shape), 'dtype': series.dtype.str,
+                     'planes': [_hash_plane(plane) for plane in iter_planes(series)],
+                     'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    hash_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = hash_path.with_name(f'{key}_{os.getpid()}.tmp')
+    temp_path.write_text(json.dumps(reference))
+    os.replace(temp_path, hash_path)
+    return reference
+
+
+def _plane_ndim(series):
+    return 3 if series.axes.endswith('S') else 2
+
+
+def _lead_shape(series):
+    return series.shape[:-_plane_ndim(series)]
+
+
+def _hash_plane(plane):
+    # Values are hashed, not the encoded bytes: compression and byte order do not matter
+    plane = np.ascontiguousarray(plane, dtype=plane.dtype.newbyteorder('<'))
+    return hashlib.blake2b(plane.tobytes(), digest_size=16).hexdigest()
+
+
+def _planes_equal(plane1, plane2, atol, rtol):
+    if atol or rtol:
+        return np.allclose(plane1, plane2, rtol=rtol, atol=atol, equal_nan=True)
+    return np.array_equal(plane1, plane2)
+
+
+def _describe_difference(plane1, plane2, index, series, atol, rtol):
+    if atol or rtol:
+        different = ~np.isclose(plane1, plane2, rtol=rtol, atol=atol, equal_nan=True)
+    else:
+        different = plane1 != plane2
+    pixel = tuple(int(i) for i in np.argwhere(different)[0])
+    lead_shape = _lead_shape(series)
+    location = tuple(int(i) for i in np.unravel_index(index, lead_shape)) if lead_shape else ()
+    return (f"\nFirst difference at index {location + pixel} ({series.axes}): "
+            f"GT = {plane1[pixel]}, OUT = {plane2[pixel]}"
+            f" ({int(np.count_nonzero(different))} different values in this plane)")
 
 
 def sort_json(data):
@@ -36,9 +176,17 @@ def sort_json(data):
         return data
 
 
+@functools.lru_cache(maxsize=64)
+def _load_json(json_path, size, mtime_ns):
+    # Ground truths are compared with several outputs: parsed once per file version
+    with open(json_path) as f:
+        return json.load(f)
+
+
 def isJsonIdentical(json_path1, json_path2):
-    with open(json_path1) as f1, open(json_path2) as f2:
-        json_data1 = json.load(f1)
+    stat1 = os.stat(json_path1)
+    json_data1 = _load_json(os.path.abspath(json_path1), stat1.st_size, stat1.st_mtime_ns)
+    with open(json_path2) as f2:
         json_data2 = json.load(f2)
     if json_data1 == json_data2:
         return True
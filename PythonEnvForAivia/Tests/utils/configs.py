@@ -0,0 +1,40 @@
+import os
+import re
+import json
+
+
+"""
+Selection of test configurations by input image.
+
+Tests of the shared utilities reuse the inputs (and ground truths) of a recipe's
+Config_*.json. They select its entries by the file name of their input image, never by
+their position, so that adding, removing or reordering the recipe's configurations
+does not silently change what a utility is tested on.
+"""
+
+
+def configs_for_inputs(config_json_path, file_names):
+    """
+    Entries of a Config_*.json file for the given input images.
+
+    Parameters
+    ----------
+    config_json_path : str
+        Path of the Config_*.json file.
+    file_names : list of str
+        File names of the input images (in Tests/_InputImages).
+
+    Returns
+    -------
+    list of dict
+        Copy of the first entry of each input image, in the order of file_names.
+    """
+    with open(config_json_path) as f:
+        configurations = json.load(f)
+    by_input = {}
+    for config in configurations:
+        by_input.setdefault(re.split(r'[\\/]', config['inputImagePath'])[-1], config)
+    missing = [name for name in file_names if name not in by_input]
+    if missing:
+        raise KeyError(f'No configuration in {os.path.basename(config_json_path)} for {missing}')
+    return [dict(by_input[name]) for name in file_names]
@@ -0,0 +1,91 @@
+import subprocess
+import sys
+import csv
+import os
+import functools
+from pathlib import Path
+
+
+ROOT = Path(__file__).parents[2]      # PythonEnvForAivia folder
+RECIPE_FOLDERS = ['Recipes', 'Recipes_NoAutomatedTests']
+
+
+def measure_import_time(module_name):
+    """
+    Measure the cold import time of a recipe module with `python -X importtime`.
+
+    Args:
+    module_name (str): Module to import, e.g. 'Recipes.TransformImages.ZColorCoding'
+
+    Returns:
+    tuple: (cumulative import time in seconds, list of (seconds, module) for the 5 slowest direct imports)
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'Importing {module_name} failed:\n{proc.stderr[-2000:]}')
+
+    total = None
+    children = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1]) / 1e6
+        except ValueError:
+            continue        # Header line
+        name = fields[2].strip()
+        depth = (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2
+        if depth == 0:
+            # Nested imports are listed before the module importing them
+            if name == module_name:
+                total = cumulative
+                break
+            children = []
+        elif depth == 1:
+            children.append((cumulative, name))
+
+    if total is None:
+        raise RuntimeError(f'No import time reported for {module_name}')
+    return total, sorted(children, reverse=True)[:5]
+
+
+@functools.lru_cache(maxsize=None)
+def reference_import_time(module_name='numpy', repeats=3):
+    """
+    Cold import time of a reference module (numpy by default), the best of a few
+    measurements, cached for the session. Import time budgets are multiples of it.
+    """
+    return min(measure_import_time(module_name)[0] for _ in range(repeats))
+
+
+def list_recipe_modules():
+    modules = []
+    for folder in RECIPE_FOLDERS:
+        for path in sorted((ROOT / folder).glob('*/*.py')):
+            if path.parent.name == 'utils':
+                continue
+            modules.append('.'.join(path.relative_to(ROOT).with_suffix('').parts))
+    return modules
+
+
+if __name__ == "__main__":
+    # Records the cold import time of every recipe in import_times.csv
+    output_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'import_times.csv')
+    reference = reference_import_time()
+    print(f'numpy: {reference:.3f} s')
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['recipe', 'import_time_s', 'numpy_imports', 'slowest_imports'])
+        for module_name in list_recipe_modules():
+            try:
+                total, packages = measure_import_time(module_name)
+            except RuntimeError as e:
+                print(f'{module_name}: FAILED ({str(e).splitlines()[-1]})')
+                writer.writerow([module_name, '', '', 'FAILED'])
+                continue
+            slowest = ', '.join(f'{name} {t:.2f}s' for t, name in packages)
+            print(f'{module_name}: {total:.2f} s, {total / reference:.1f} numpy imports ({slowest})')
+            writer.writerow([module_name, f'{total:.3f}', f'{total / reference:.2f}', slowest])
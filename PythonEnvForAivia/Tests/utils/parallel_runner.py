@@ -0,0 +1,229 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+
+"""
+Runs the tests in parallel, one test (one Config entry) at a time per process.
+
+Many configurations of different recipes read the same files of Tests/_InputImages.
+In this mode, tifffile.imread (also used by skimage.io.imread) decodes each of these
+inputs once per session into a .npy file of a session folder, which all processes
+then map in memory (copy-on-write: a recipe modifying its input does not change the
+shared copy).
+
+    python -m Tests.utils.parallel_runner                          all tests, one process per CPU
+    python -m Tests.utils.parallel_runner Tests/ProcessImages -j 4
+    python -m Tests.utils.parallel_runner --durations 20           also lists the 20 slowest tests
+
+Tests are started longest first, using the durations of the previous session. The
+output of a test is only printed when it fails. Test classes measuring timings set
+run_serially = True: they are run one at a time once the pool is done.
+"""
+
+ROOT = Path(__file__).parents[2]      # PythonEnvForAivia folder
+INPUT_FOLDER = ROOT / 'Tests' / '_InputImages'
+DURATIONS_PATH = Path(tempfile.gettempdir()) / 'aivia_test_durations.json'
+_STATUS_CHARACTERS = {'ok': '.', 'fail': 'F', 'error': 'E', 'skip': 's'}
+
+
+def install_input_cache(cache_folder):
+    """
+    Makes tifffile.imread return shared decoded copies of the files of Tests/_InputImages.
+
+    Needs to be called before the recipes (or skimage.io's tifffile plugin) import imread.
+    """
+    import tifffile
+    if getattr(tifffile.imread, 'input_cache', None) is not None:
+        return
+    original_imread = tifffile.imread
+
+    def imread(files=None, **kwargs):
+        path = _input_path(files) if not kwargs else None
+        if path is None:
+            return original_imread(files, **kwargs)
+        return _cached_input(path, Path(cache_folder), original_imread)
+
+    imread.input_cache = cache_folder
+    tifffile.imread = imread
+
+
+def _input_path(files):
+    if not isinstance(files, (str, os.PathLike)):
+        return None
+    path = Path(files).resolve()
+    return path if path.parent == INPUT_FOLDER.resolve() and path.is_file() else None
+
+
+def _cached_input(path, cache_folder, original_imread):
+    stat = path.stat()
+    key = hashlib.blake2b(f'{path}|{stat.st_size}|{stat.st_mtime_ns}'.encode(), digest_size=16).hexdigest()
+    npy_path = cache_folder / f'{key}.npy'
+    if not npy_path.exists():
+        # Concurrent processes may decode the same input once each, the last write wins
+        temp_path = cache_folder / f'{key}_{os.getpid()}.tmp.npy'
+        np.save(temp_path, original_imread(path))
+        os.replace(temp_path, npy_path)
+    return np.load(npy_path, mmap_mode='c').view(np.ndarray)
+
+
+def list_tests(start_dir, pattern='test*.py'):
+    """Discovers the tests, returns (test ids, serial test ids, tests that failed to load)."""
+    suite = unittest.TestLoader().discover(str(start_dir), pattern=pattern, top_level_dir=str(ROOT))
+    test_ids, serial_ids, broken = [], [], []
+
+    def walk(suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                walk(test)
+            elif isinstance(test, unittest.loader._FailedTest):
+                broken.append(test)
+            elif getattr(test, 'run_serially', False):
+                serial_ids.append(test.id())
+            else:
+                test_ids.append(test.id())
+
+    walk(suite)
+    return test_ids, serial_ids, broken
+
+
+def run_test(test_id):
+    """Runs one test in a pool process, returns its outcome as a dict."""
+    output = io.StringIO()
+    result = unittest.TestResult()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            unittest.defaultTestLoader.loadTestsFromName(test_id).run(result)
+        except Exception:
+            import traceback
+            result.errors.append((None, traceback.format_exc()))
+    duration = time.perf_counter() - start
+    return _outcome(test_id, result, duration, output.getvalue())
+
+
+def _outcome(test_id, result, duration, output):
+    if result.errors:
+        status, details = 'error', result.errors[0][1]
+    elif result.failures:
+        status, details = 'fail', result.failures[0][1]
+    elif result.skipped:
+        status, details = 'skip', result.skipped[0][1]
+    else:
+        status, details = 'ok', ''
+    return {'id': test_id, 'status': status, 'duration': duration, 'details': details, 'output': output}
+
+
+def _init_worker(cache_folder):
+    os.chdir(ROOT)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    install_input_cache(cache_folder)
+
+
+def _load_durations():
+    try:
+        return json.loads(DURATIONS_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def run_parallel(start_dir='Tests', workers=None, pattern='test*.py'):
+    """
+    Runs the tests found in start_dir with a process pool.
+
+    Returns:
+    list of dict: outcome of every test ('id', 'status', 'duration', 'details', 'output')
+    """
+    cache_folder = tempfile.mkdtemp(prefix='aivia_test_inputs_')
+    try:
+        # Before the test modules import the recipes
+        _init_worker(cache_folder)
+        test_ids, serial_ids, broken = list_tests(start_dir, pattern)
+        outcomes = []
+        for test in broken:
+            result = unittest.TestResult()
+            test.run(result)
+            outcomes.append(_outcome(test.id(), result, 0.0, ''))
+
+        previous = _load_durations()
+        test_ids.sort(key=lambda test_id: previous.get(test_id, float('inf')), reverse=True)
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(cache_folder,)) as pool:
+            futures = [pool.submit(run_test, test_id) for test_id in test_ids]
+            for future in as_completed(futures):
+                outcome = future.result()
+                outcomes.append(outcome)
+                print(_STATUS_CHARACTERS[outcome['status']], end='', flush=True)
+        for test_id in serial_ids:
+            outcome = run_test(test_id)
+            outcomes.append(outcome)
+            print(_STATUS_CHARACTERS[outcome['status']], end='', flush=True)
+        print()
+
+        previous.update({outcome['id']: round(outcome['duration'], 3) for outcome in outcomes})
+        DURATIONS_PATH.write_text(json.dumps(previous, indent=1))
+        return outcomes
+    finally:
+        shutil.rmtree(cache_folder, ignore_errors=True)
+
+
+def report(outcomes, elapsed, durations=0):
+    for outcome in sorted(outcomes, key=lambda o: o['id']):
+        if outcome['status'] in ('fail', 'error'):
+            print('=' * 70)
+            print(f"{outcome['status'].upper()}: {outcome['id']}")
+            print('-' * 70)
+            print(outcome['details'])
+            if outcome['output'].strip():
+                print('Output:\n' + outcome['output'][-3000:])
+
+    if durations:
+        print(f'\nSlowest {durations} tests:')
+        for outcome in sorted(outcomes, key=lambda o: o['duration'], reverse=True)[:durations]:
+            print(f"{outcome['duration']:8.2f} s  {outcome['id']}")
+        totals = {}
+        for outcome in outcomes:
+            module = outcome['id'].rsplit('.', 2)[0]
+            totals[module] = totals.get(module, 0) + outcome['duration']
+        print(f'\nSlowest {durations} test modules:')
+        for module, total in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:durations]:
+            print(f'{total:8.2f} s  {module}')
+
+    counts = {status: sum(o['status'] == status for o in outcomes) for status in ('fail', 'error', 'skip')}
+    print('-' * 70)
+    print(f'Ran {len(outcomes)} tests in {elapsed:.3f}s\n')
+    if counts['fail'] or counts['error']:
+        print(f"FAILED (failures={counts['fail']}, errors={counts['error']}, skipped={counts['skip']})")
+        return 1
+    print(f"OK (skipped={counts['skip']})" if counts['skip'] else 'OK')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs the tests in parallel with a shared cache of decoded inputs.')
+    parser.add_argument('start_dir', nargs='?', default='Tests', help='Folder of the tests to run (Tests)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of processes (CPU count)')
+    parser.add_argument('-p', '--pattern', default='test*.py', help='Pattern of the test files (test*.py)')
+    parser.add_argument('--durations', type=int, default=0, metavar='N', help='List the N slowest tests and modules')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    outcomes = run_parallel(args.start_dir, args.workers, args.pattern)
+    return report(outcomes, time.perf_counter() - start, args.durations)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import sys
 import os.path
 import numpy as np
-from tifffile import imread, imwrite
+from tifffile import imread, memmap, TiffWriter
 from cellpose import models
 from skimage.exposure import rescale_intensity
 from skimage.util import img_as_ubyte, img_as_uint
@@ -82,14 +82,14 @@ def run_Cellpose(inputImagePath, z_count, t_count, diameter, model_type,
     if not os.path.exists(inputImagePath):
         raise ValueError('Error: {inputImagePath} does not exist')
 
-    # Load input image
-    image_data = imread(inputImagePath)
+    # Load input image (memory-mapped when possible, frames are read when processed)
+    try:
+        image_data = memmap(inputImagePath, mode='r')
+    except ValueError:
+        image_data = imread(inputImagePath)
     image_type = image_data.dtype
     dims = image_data.shape
 
-    confidence = np.empty_like(image_data, dtype=float)
-    mask = np.empty_like(image_data, dtype=image_type)
-
     # Get model type
     if model_type == 0:
         cellpose_model = models.Cellpose(gpu=True, model_type='cyto')
@@ -99,99 +99,81 @@ def run_Cellpose(inputImagePath, z_count, t_count, diameter, model_type,
         raise ValueError('Invalid model selected'
                          '- use 0 for cytoplasm and 1 for nuclei.')
 
-    # Channel to segment: [0, 0] means grey scale image
-    channels = [0, 0]
-
     # 3D+T
     if t_count > 1 and z_count > 1:
         print(f"Applying to 3D+T case with dims: {dims}")
-        for t in range(t_count):
-            mask_i, flow, _, _ = cellpose_model.eval(
-                                    image_data[t],
-                                    channels=channels,
-                                    diameter=diameter,
-                                    do_3D=True,
-                                    cellprob_threshold=mask_threshold,
-                                    flow_threshold=flow_threshold,
-                                    resample=True)
-            confidence[t] = flow[2]
-            mask[t] = mask_i
         axes = 'YXZT'
-
     # 3D
     elif t_count == 1 and z_count > 1:
         print(f"Applying to 3D case with dims: {dims}")
-        mask, flow, _, _ = cellpose_model.eval(
-                                        image_data,
-                                        channels=channels,
-                                        diameter=diameter,
-                                        do_3D=True,
-                                        cellprob_threshold=mask_threshold,
-                                        flow_threshold=flow_threshold,
-                                        resample=True)
-        confidence = flow[2]
         axes = 'YXZ'
-
     # 2D+T
     elif t_count > 1 and z_count == 1:
         print(f"Applying to 2D+T case with dims: {dims}")
-        for t in range(t_count):
-            mask_i, flow, _, _ = cellpose_model.eval(
-                                        image_data[t],
-                                        channels=channels,
-                                        diameter=diameter,
-                                        cellprob_threshold=mask_threshold,
-                                        flow_threshold=flow_threshold,
-                                        resample=True)
-            confidence[t] = flow[2]
-            mask[t] = mask_i.astype(image_type)
         axes = 'YXT'
-
     # 2D
     else:
         print(f"Applying to 2D case with dims: {dims}")
-        mask, flow, _, _ = cellpose_model.eval(
-                                        image_data,
-                                        channels=channels,
-                                        diameter=diameter,
-                                        cellprob_threshold=mask_threshold,
-                                        flow_threshold=flow_threshold,
-                                        resample=True)
-        confidence = flow[2]
-        mask = mask.astype(image_type)
         axes = 'YX'
 
+    # randomize mask output, otherwise the default mask is gradient-like
+    max_label = 65535 if image_type == np.uint16 else 255
+    mask_permute = np.append([0], np.random.permutation(max_label)+1)
+
+    # Each timepoint is written as soon as it is segmented, so only one frame of the
+    # outputs is in memory
+    frames = (image_data[t] for t in range(t_count)) if t_count > 1 else [image_data]
+    bigtiff = image_data.nbytes > 2**32 - 2**25
+    with TiffWriter(conf_map_path, bigtiff=bigtiff) as conf_writer, \
+            TiffWriter(mask_path, bigtiff=bigtiff) as mask_writer:
+        for frame in frames:
+            mask, confidence = segment_frame(cellpose_model, np.asarray(frame), z_count > 1,
+                                             diameter, mask_threshold, flow_threshold)
+            mask, confidence = convert_outputs(mask, confidence, image_type, mask_permute)
+
+            # Save confidence
+            conf_writer.write(confidence,
+                              contiguous=True,
+                              photometric='minisblack',
+                              metadata={'axes': axes})
+
+            # Save mask
+            mask_writer.write(mask,
+                              contiguous=True,
+                              photometric='minisblack',
+                              metadata={'axes': axes})
+
+
+def segment_frame(cellpose_model, frame, do_3D, diameter, mask_threshold, flow_threshold):
+    # Channel to segment: [0, 0] means grey scale image
+    channels = [0, 0]
+    mask, flow, _, _ = cellpose_model.eval(
+                            frame,
+                            channels=channels,
+                            diameter=diameter,
+                            do_3D=do_3D,
+                            cellprob_threshold=mask_threshold,
+                            flow_threshold=flow_threshold,
+                            resample=True)
+    return mask, flow[2]
+
+
+def convert_outputs(mask, confidence, image_type, mask_permute):
     # Convert raw model output to 0-1 using expit
-    confidence = expit(confidence)
+    confidence = expit(confidence.astype(float))
 
     # Re-scale confidence to input image range
-    confidence = rescale_intensity(confidence, in_range=(0.0, 1.0), 
+    confidence = rescale_intensity(confidence, in_range=(0.0, 1.0),
                                    out_range=image_type.name).astype(image_type)
-    
+
+    mask = mask_permute[mask.astype(image_type)]
     if image_type == np.uint16:
-        # randomize mask output, otherwise the default mask is gradient-like
-        mask_permute = np.append([0], np.random.permutation(65535)+1)
-        mask = mask_permute[mask]
         confidence = img_as_uint(confidence)
         mask = img_as_uint(mask)
     else:
-        mask_permute = np.append([0], np.random.permutation(255)+1)
-        mask = mask_permute[mask]
-
         confidence = img_as_ubyte(confidence)
         mask = img_as_ubyte(mask)
-
-    # Save confidence
-    imwrite(conf_map_path,
-            confidence,
-            photometric='minisblack',
-            metadata={'axes': axes})
-
-    # Save mask
-    imwrite(mask_path,
-            mask,
-            photometric='minisblack',
-            metadata={'axes': axes})
+    return mask, confidence
 
 
 def main():